@@ -1,6 +1,7 @@
 import pygame
 
-from engine import load_image, load_sound, scale_frame, load_game_font
+from engine import load_image, scale_frame
+from assets import AssetManager, Asset
 from config import DEFAULT_HOVER_SOUND_VOLUME
 
 
@@ -11,7 +12,7 @@ class Button(pygame.sprite.Sprite):
     PRESS_TYPE = pygame.USEREVENT + 1
     HOVER_TYPE = pygame.USEREVENT + 2
     # Звук при наведении
-    HOVER_SOUND = load_sound("assets/audio/sfx/UI/button_hover.wav")
+    HOVER_SOUND = Asset('menu', AssetManager.sound, "assets/audio/sfx/UI/button_hover.wav")
 
     def __init__(self, position: tuple, text: str, text_size: int,
                  base_button_filename="button.png",
@@ -26,7 +27,7 @@ class Button(pygame.sprite.Sprite):
         self.was_sound_played = False
         # Текст
         self.text = text
-        self.font = load_game_font(text_size)
+        self.font = AssetManager.font(text_size)
         # Базовое изображение
         self.text_surface = self.font.render(text, True, pygame.Color("white"))
         self.base_image = load_image(f"assets/sprites/UI/components/{base_button_filename}")
@@ -74,10 +75,10 @@ class MessageBox:
     при нажатии в любую область экрана
     """
     # Загружаем фоновое изображение
-    background_image = load_image("assets/sprites/UI/components/dialog_box.png")
+    background_image = Asset('menu', AssetManager.image, "assets/sprites/UI/components/dialog_box.png")
 
     def __init__(self, text: str, text_size: int, position: tuple):
-        self.font = load_game_font(text_size)  # шрифт
+        self.font = AssetManager.font(text_size)  # шрифт
         self.image = self.background_image  # фон
         indent = 50  # Отступ
         text = text.strip()
@@ -119,34 +120,32 @@ class SpellContainer:
     """Класс представляет UI элемент с отображением данных о заклинании"""
 
     # В этом случае шрифт всегда будет общий у всех, поэтому это атрибут класса
-    font = load_game_font(32)
-    mini_font = load_game_font(16)
+    font = Asset('game', AssetManager.font, 32)
+    mini_font = Asset('game', AssetManager.font, 16)
     # Задержка курсора на иконке перед показом рамки
     delay_time = 35
     size = (39, 39)  # размер для иконок ниже
     # Иконки кнопок джойстика, чтобы отображать кнопки для вызова заклинаний
-    JOYSTICK_ICONS = {
-        "o": load_image("assets/sprites/UI/icons/joystick_o.png", size),
-        "x": load_image("assets/sprites/UI/icons/joystick_x.png", size),
-        "triangle": load_image("assets/sprites/UI/icons/joystick_triangle.png", size),
-        "square": load_image("assets/sprites/UI/icons/joystick_square.png", size),
-        "L1": load_image("assets/sprites/UI/icons/joystick_L1.png", size),
-        "L2": load_image("assets/sprites/UI/icons/joystick_L2.png", size),
-    }
-    # Поверхность, которая отображается, если заклинание недоступно
-    # (т.е. эффект замедления)
-    LOCKED = pygame.surface.Surface((20, 20)).convert_alpha()
-    LOCKED.fill((0, 0, 0, 180))
+    JOYSTICK_ICONS = Asset('game', AssetManager.images, {
+        "o": "assets/sprites/UI/icons/joystick_o.png",
+        "x": "assets/sprites/UI/icons/joystick_x.png",
+        "triangle": "assets/sprites/UI/icons/joystick_triangle.png",
+        "square": "assets/sprites/UI/icons/joystick_square.png",
+        "L1": "assets/sprites/UI/icons/joystick_L1.png",
+        "L2": "assets/sprites/UI/icons/joystick_L2.png",
+    }, size)
     # Рамка (фон) вокруг иконки с заклинанием
-    FRAME = load_image('assets/sprites/UI/icons/spell_icon_frame.png')
+    FRAME = Asset('game', AssetManager.image, 'assets/sprites/UI/icons/spell_icon_frame.png')
 
     def __init__(self, icon_filename: str, spell_class, player):
         # Иконка заклинания
         self.spell_icon = load_image(f"assets/sprites/UI/icons/{icon_filename}")
         self.rect = self.spell_icon.get_rect()
         self.w, self.h = self.spell_icon.get_size()  # размер иконки
-        # Картинка затемнения
-        self.locked = pygame.transform.scale(self.LOCKED, (self.w, self.h))
+        # Картинка затемнения, которая отображается, если заклинание недоступно
+        # (т.е. эффект замедления)
+        self.locked = pygame.surface.Surface((self.w, self.h)).convert_alpha()
+        self.locked.fill((0, 0, 0, 180))
         self.mana_cost = spell_class.mana_cost    # Стоимость заклинания для игрока
         # ссылка на игрока для получение параметров, связанных с заклинаниями
         self.player = player
@@ -218,16 +217,18 @@ class PlayerIcon:
     или компаньёне
     """
     # В этом случае фонт всегда будет общий у всех, поэтому это атрибут класса
-    font = load_game_font(32)
+    font = Asset('game', AssetManager.font, 32)
     # Изображение с иконкой игрока
-    PLAYER_FACE = pygame.transform.scale2x(load_image('assets/sprites/UI/icons/player_face.png'))
+    PLAYER_FACE = Asset('game', lambda: pygame.transform.scale2x(
+        AssetManager.image('assets/sprites/UI/icons/player_face.png')))
     # Изображение с иконкой помошника
-    ASSISTANT_FACE = pygame.transform.scale2x(load_image('assets/sprites/UI/icons/assistant_face.png'))
+    ASSISTANT_FACE = Asset('game', lambda: pygame.transform.scale2x(
+        AssetManager.image('assets/sprites/UI/icons/assistant_face.png')))
     # Рамка вокруг иконки
-    FRAME = load_image('assets/sprites/UI/icons/player_icon_frame.png')
+    FRAME = Asset('game', AssetManager.image, 'assets/sprites/UI/icons/player_icon_frame.png')
     # Иконка яда
     size = (40, 40)
-    POISON_ICON = load_image('assets/sprites/UI/icons/poison_icon.png', size)
+    POISON_ICON = Asset('game', AssetManager.image, 'assets/sprites/UI/icons/poison_icon.png', size)
 
     def __init__(self, player_or_assistant):
         # Ссылка на игрока (или асистента) для получение необходимоых
@@ -367,7 +368,7 @@ class Message(pygame.sprite.Sprite):
     с каким-либо объектом. Сами колизии и параметр времени последнего столкновения
     обрабатываются вне класса
     """
-    font = load_game_font(32)
+    font = Asset('game', AssetManager.font, 32)
     # Время отрисовки на экране
     DRAWING_TIME = 1000
     # Время угасания, заимствующееся из времени отрисовки
@@ -0,0 +1,352 @@
+import os
+import struct
+from hashlib import md5
+from weakref import WeakKeyDictionary
+
+import pygame
+
+from engine import load_image, load_sound, load_game_font, cut_sheet
+from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
+
+
+class FramesCache:
+    """
+    Кэш нарезанных и отмасштабированных кадров на диске.
+    Кадры хранятся без сжатия (RGBA, подряд друг за другом), поэтому при следующих
+    запусках они читаются одним чтением файла без нарезки и масштабирования.
+    Файл кэша действителен, пока у исходного spritesheet'а не поменялись
+    время изменения и размер файла (иначе кадры создаются заново)
+    """
+    PATH = os.path.join('data', 'cache')
+    MAGIC = b'PXFC'
+    VERSION = 1
+    # Заголовок: сигнатура, версия, время изменения и размер исходного файла,
+    # размер кадра, количество колонок и строк
+    HEADER = struct.Struct('<4sHqQHHHH')
+
+    @staticmethod
+    def get_path(path: str, columns: int, rows: int, size: tuple) -> str:
+        """
+        Метод возвращает путь до файла кэша
+        :return: Путь до файла кэша
+        """
+        key = md5(repr((path, columns, rows, tuple(size))).encode()).hexdigest()
+        return os.path.join(FramesCache.PATH, f'{key}.frames')
+
+    @staticmethod
+    def load(path: str, columns: int, rows: int, size: tuple):
+        """
+        Метод загружает кадры из кэша
+        :param path: Путь до исходного spritesheet'а
+        :param columns: Количество колонок
+        :param rows: Количество строк
+        :param size: Размер кадра
+        :return: Вложенный список с кадрами (поверхности ссылаются на прочитанные данные,
+        поэтому их нужно скопировать, см. Atlas.pack) или None, если кэша нет или он устарел
+        """
+        try:
+            source = os.stat(path)
+            with open(FramesCache.get_path(path, columns, rows, size), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) < FramesCache.HEADER.size:
+            return None
+        header = FramesCache.HEADER.unpack_from(data)
+        if header != (FramesCache.MAGIC, FramesCache.VERSION, source.st_mtime_ns, source.st_size,
+                      size[0], size[1], columns, rows):
+            return None
+        frame_size = size[0] * size[1] * 4
+        if len(data) != FramesCache.HEADER.size + frame_size * columns * rows:
+            return None
+        buffer = memoryview(data)[FramesCache.HEADER.size:]
+        frames = []
+        for row in range(rows):
+            frames.append([])
+            for column in range(columns):
+                start = (row * columns + column) * frame_size
+                frames[-1].append(pygame.image.frombuffer(buffer[start:start + frame_size], size, 'RGBA'))
+        return frames
+
+    @staticmethod
+    def store(path: str, columns: int, rows: int, size: tuple, frames: list) -> None:
+        """
+        Метод записывает кадры в кэш (если записать не удалось, кэш просто не используется)
+        :param path: Путь до исходного spritesheet'а
+        :param columns: Количество колонок
+        :param rows: Количество строк
+        :param size: Размер кадра
+        :param frames: Вложенный список с кадрами
+        """
+        try:
+            source = os.stat(path)
+            os.makedirs(FramesCache.PATH, exist_ok=True)
+            cache_path = FramesCache.get_path(path, columns, rows, size)
+            with open(cache_path + '.tmp', 'wb') as file:
+                file.write(FramesCache.HEADER.pack(FramesCache.MAGIC, FramesCache.VERSION, source.st_mtime_ns,
+                                                   source.st_size, size[0], size[1], columns, rows))
+                for row in frames:
+                    for frame in row:
+                        file.write(pygame.image.tostring(frame, 'RGBA'))
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError:
+            pass
+
+
+class Atlas:
+    """
+    Атлас текстур. Кадры анимаций, тайлы и иконки копируются в несколько больших
+    поверхностей (страниц), а вместо отдельных поверхностей используются их части (subsurface).
+    Так кадры лежат в памяти рядом, а при отрисовке пиксели берутся прямо из страницы
+    (subsurface - это область страницы, а не копия)
+    """
+    # Сторона страницы атласа
+    PAGE_SIZE = 2048
+    # Страницы атласа
+    pages = []
+    # Текущая "полка" страницы (кадры укладываются рядами): x, y, высота полки
+    shelf = (0, 0, 0)
+
+    @staticmethod
+    def pack(frame: pygame.surface.Surface) -> pygame.surface.Surface:
+        """
+        Метод копирует кадр в атлас
+        :param frame: Кадр
+        :return: Кадр из атласа (часть страницы)
+        """
+        width, height = frame.get_size()
+        if width > Atlas.PAGE_SIZE or height > Atlas.PAGE_SIZE:
+            return frame.convert_alpha()
+        x, y, shelf_height = Atlas.shelf
+        # Кадр не помещается на полку - начинается новая полка
+        if x + width > Atlas.PAGE_SIZE:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        # Кадр не помещается на страницу - начинается новая страница
+        if not Atlas.pages or y + height > Atlas.PAGE_SIZE:
+            Atlas.pages.append(pygame.surface.Surface((Atlas.PAGE_SIZE,) * 2, pygame.SRCALPHA))
+            x, y, shelf_height = 0, 0, 0
+        page = Atlas.pages[-1]
+        rect = pygame.Rect(x, y, width, height)
+        # Страница прозрачная, поэтому сложение каналов просто копирует пиксели кадра
+        page.blit(frame.convert_alpha(), rect, special_flags=pygame.BLEND_RGBA_ADD)
+        Atlas.shelf = (x + width, y, max(shelf_height, height))
+        return page.subsurface(rect)
+
+
+class RenderQueue:
+    """
+    Очередь отрисовки. Изображения слоя добавляются в очередь, а рисуются
+    одним вызовом Surface.blits (вместо вызова blit или blits на каждую группу).
+    Если у очереди есть масштаб, то изображения рисуются уменьшенными во столько раз
+    (для отрисовки в поверхность уменьшенного разрешения)
+    """
+    # Уменьшенные копии изображений: изображение -> {масштаб: копия}.
+    # Копии удаляются вместе с изображением (например, с повёрнутыми кадрами заклинания)
+    scaled_images = WeakKeyDictionary()
+
+    def __init__(self, scale: int = 1):
+        """
+        :param scale: Во сколько раз уменьшаются изображения и координаты
+        """
+        self.blits = []
+        self.scale = scale
+
+    @staticmethod
+    def get_scaled_image(image: pygame.surface.Surface, scale: int) -> pygame.surface.Surface:
+        """
+        Метод возвращает уменьшенную копию изображения (копия создаётся один раз)
+        :param image: Изображение
+        :param scale: Во сколько раз уменьшить изображение
+        :return: Уменьшенное изображение
+        """
+        copies = RenderQueue.scaled_images.get(image)
+        if copies is None:
+            copies = RenderQueue.scaled_images[image] = {}
+        if scale not in copies:
+            width, height = image.get_size()
+            copies[scale] = pygame.transform.scale(image, (max(1, width // scale), max(1, height // scale)))
+        return copies[scale]
+
+    def add(self, image: pygame.surface.Surface, position) -> None:
+        """
+        Метод добавляет изображение в очередь
+        :param image: Изображение
+        :param position: Позиция на экране (точка или прямоугольник)
+        """
+        self.blits.append((image, position))
+
+    def flush(self, screen: pygame.surface.Surface) -> None:
+        """
+        Метод рисует все изображения из очереди и очищает её
+        :param screen: Экран
+        """
+        if self.scale != 1:
+            scale = self.scale
+            self.blits = [(RenderQueue.get_scaled_image(image, scale), (position[0] // scale, position[1] // scale))
+                          for image, position in self.blits]
+        if self.blits:
+            screen.blits(self.blits, False)
+            self.blits.clear()
+
+
+def load_frames(path: str, columns: int, rows: int, size: tuple) -> list:
+    """
+    Функция загружает кадры spritesheet'а из кэша на диске,
+    а если его нет, то нарезает spritesheet и записывает кадры в кэш.
+    Загруженные кадры переносятся в атлас
+    :param path: Путь до spritesheet'а
+    :param columns: Количество колонок
+    :param rows: Количество строк
+    :param size: Размер кадра
+    :return: Вложенный список с кадрами
+    """
+    frames = FramesCache.load(path, columns, rows, size)
+    if frames is None:
+        frames = cut_sheet(load_image(path), columns, rows, size)
+        FramesCache.store(path, columns, rows, size, frames)
+    return [[Atlas.pack(frame) for frame in row] for row in frames]
+
+
+class AssetManager:
+    """
+    Менеджер ресурсов (изображений, нарезанных spritesheet'ов, шрифтов и звуков).
+    Ресурс загружается при первом обращении и кэшируется по пути и размеру,
+    поэтому один и тот же файл не загружается дважды.
+    Ресурсы классов (Asset) объединяются в наборы, которые можно загрузить
+    заранее (например, на экране загрузки уровня)
+    """
+    # Загруженные ресурсы по ключу (тип, путь, размер...)
+    cache = {}
+    # Наборы ресурсов классов: название набора -> список Asset
+    bundles = {}
+
+    @staticmethod
+    def get(key: tuple, loader, *args):
+        """
+        Метод возвращает ресурс из кэша, загружая его при первом обращении
+        :param key: Ключ ресурса
+        :param loader: Функция загрузки
+        :param args: Аргументы функции загрузки
+        :return: Ресурс
+        """
+        if key not in AssetManager.cache:
+            AssetManager.cache[key] = loader(*args)
+        return AssetManager.cache[key]
+
+    @staticmethod
+    def image(path: str, size=None, colorkey=None) -> pygame.surface.Surface:
+        """
+        Метод загружает изображение (см. engine.load_image).
+        Отмасштабированные изображения без цветового ключа берутся из кэша на диске
+        """
+        if size is not None and colorkey is None:
+            return AssetManager.get(('image', path, size, colorkey), lambda: load_frames(path, 1, 1, size)[0][0])
+        return AssetManager.get(('image', path, size, colorkey), load_image, path, size, colorkey)
+
+    @staticmethod
+    def images(paths: dict, size=None) -> dict:
+        """
+        Метод загружает изображения по словарю с путями
+        :param paths: Словарь вида *ключ*: *путь до изображения*
+        :param size: Размер для масштабирования
+        :return: Словарь вида *ключ*: *изображение*
+        """
+        return {key: AssetManager.image(path, size) for key, path in paths.items()}
+
+    @staticmethod
+    def sheet(path: str, columns: int, rows: int, size=(TILE_SIZE, TILE_SIZE)) -> list:
+        """
+        Метод загружает кадры spritesheet'а (см. load_frames)
+        :return: Вложенный список с кадрами
+        """
+        return AssetManager.get(('sheet', path, columns, rows, size), load_frames, path, columns, rows, size)
+
+    @staticmethod
+    def frames(*sheets, size=(TILE_SIZE, TILE_SIZE)) -> list:
+        """
+        Метод собирает ряды кадров из нескольких spritesheet'ов в один список
+        :param sheets: Кортежи (путь, количество колонок, количество строк)
+        :param size: Размер кадров
+        :return: Список рядов кадров
+        """
+        frames = []
+        for path, columns, rows in sheets:
+            frames += AssetManager.sheet(path, columns, rows, size)
+        return frames
+
+    @staticmethod
+    def strip(path: str, columns: int, size=(TILE_SIZE, TILE_SIZE)) -> list:
+        """
+        Метод загружает кадры spritesheet'а из одной строки
+        :return: Список кадров
+        """
+        return AssetManager.sheet(path, columns, 1, size)[0]
+
+    @staticmethod
+    def font(font_size: int) -> pygame.font.Font:
+        """
+        Метод загружает игровой шрифт (см. engine.load_game_font)
+        """
+        return AssetManager.get(('font', font_size), load_game_font, font_size)
+
+    @staticmethod
+    def sound(path: str, volume: float = DEFAULT_SOUNDS_VOLUME) -> pygame.mixer.Sound:
+        """
+        Метод загружает звук (см. engine.load_sound)
+        """
+        return AssetManager.get(('sound', path, volume), load_sound, path, volume)
+
+    @staticmethod
+    def sounds(*paths) -> tuple:
+        """
+        Метод загружает несколько звуков (например, для случайного выбора одного из них)
+        :param paths: Пути до файлов со звуками
+        :return: Кортеж звуков
+        """
+        return tuple(AssetManager.sound(path) for path in paths)
+
+    @staticmethod
+    def preload(*bundles, progress=None) -> None:
+        """
+        Метод заранее загружает все ресурсы переданных наборов
+        :param bundles: Названия наборов
+        :param progress: Функция, которая вызывается после каждого ресурса
+        с долей загруженных ресурсов (например, для экрана загрузки)
+        """
+        assets = [asset for bundle in bundles for asset in AssetManager.bundles.get(bundle, ())]
+        for i, asset in enumerate(assets, 1):
+            asset.load()
+            if progress:
+                progress(i / len(assets))
+
+
+class Asset:
+    """
+    Ресурс, который является атрибутом класса (кадры анимации, звуки и т.п.).
+    Загружается при первом обращении к атрибуту (или при загрузке его набора),
+    поэтому импорт модулей с сущностями ничего не загружает
+    """
+    def __init__(self, bundle: str, loader, *args, **kwargs):
+        """
+        :param bundle: Название набора, в который входит ресурс
+        :param loader: Функция загрузки (обычно метод AssetManager)
+        :param args: Аргументы функции загрузки
+        :param kwargs: Именованные аргументы функции загрузки
+        """
+        self.loader = loader
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        AssetManager.bundles.setdefault(bundle, []).append(self)
+
+    def load(self):
+        """
+        Метод загружает ресурс, если он ещё не загружен
+        :return: Ресурс
+        """
+        if self.value is None:
+            self.value = self.loader(*self.args, **self.kwargs)
+        return self.value
+
+    def __get__(self, instance, owner):
+        return self.load()
@@ -47,6 +47,9 @@ CONTROLS = {
     "KEYBOARD_USE": pygame.K_e,
     "KEYBOARD_PAUSE": pygame.K_ESCAPE,
     "KEYBOARD_DASH": pygame.K_LSHIFT,
+    "KEYBOARD_QUICK_SAVE": pygame.K_F5,
+    "KEYBOARD_QUICK_LOAD": pygame.K_F9,
+    "KEYBOARD_PROFILER": pygame.K_F3,
     "KEYBOARD_LEFT": (pygame.K_a, pygame.K_LEFT),
     "KEYBOARD_RIGHT": (pygame.K_d, pygame.K_RIGHT),
     "KEYBOARD_UP": (pygame.K_w, pygame.K_UP),
@@ -62,3 +65,17 @@ CONTROLS = {
 BACKGROUND_COLOR = (20, 10, 20)
 # сторона одного тайла
 TILE_SIZE = 64
+# Во сколько раз уменьшено разрешение, в котором рисуется уровень (тайлы и спрайты).
+# Уровень рисуется в поверхность меньше экрана и один раз за кадр растягивается на экран,
+# а интерфейс, шкалы здоровья и текст рисуются поверх в разрешении экрана.
+# 1 - уровень рисуется сразу на экран, 2 или 4 - тайлы рисуются в своём исходном масштабе
+WORLD_RENDER_SCALE = 1
+# Понижать ли качество (текст урона, эффекты, анимации, разрешение уровня и частоту ИИ),
+# если кадры не укладываются в FPS (см. QualityGovernor в engine.py)
+QUALITY_GOVERNOR = True
+# Профилировщик кадра (см. profiler.py). Оверлей со временем фаз игрового цикла
+# и количеством сущностей (включается и выключается клавишей KEYBOARD_PROFILER)
+PROFILER_OVERLAY = False
+# Файл, в который записывается время фаз каждого кадра: .csv - таблица,
+# .json - трейс для chrome://tracing или Perfetto, None - не записывать
+PROFILER_TRACE_PATH = None
@@ -1,10 +1,11 @@
 import os
-from random import randint, random
+from collections import deque
+from random import Random, randint, random
 
 import pygame
 from PIL import Image
 
-from config import TILE_SIZE, BACKGROUND_COLOR, DEFAULT_SOUNDS_VOLUME
+from config import TILE_SIZE, BACKGROUND_COLOR, DEFAULT_SOUNDS_VOLUME, FPS, WORLD_RENDER_SCALE
 
 
 def check_any_joystick() -> bool:
@@ -25,24 +26,146 @@ def get_joystick() -> pygame.joystick.Joystick:
     return joystick
 
 
-def loading_screen(screen: pygame.surface.Surface) -> None:
+class LoadingScreen:
     """
-    Функция, устанавливающая псевдо загрузочный экран
-    :param screen: Поверхность с экраном, где отрисовывается экран загрузки
+    Экран загрузки с настоящим прогрессом.
+    Загрузка идёт по шагам, после каждого шага вызывается show с долей
+    выполненной работы. Между шагами обрабатываются события, чтоб окно не "зависало"
     """
-    # Центральная точка на экране для вывода текста
-    central_point = (screen.get_width() * 0.5, screen.get_height() * 0.5)
-    # Шрифт для текста
-    font = load_game_font(font_size=48)
-    for i in range(4):
-        text = font.render('Загрузка' + '.' * i, True, (240, 240, 240))
+    # Размер полосы загрузки (доля от ширины экрана и высота в пикселях)
+    BAR_WIDTH = 0.3
+    BAR_HEIGHT = 12
+
+    def __init__(self, screen: pygame.surface.Surface):
+        """
+        :param screen: Поверхность с экраном, где отрисовывается экран загрузки
+        """
+        self.screen = screen
+        # Шрифт для текста
+        self.font = load_game_font(font_size=48)
+        # Последний выведенный процент (экран перерисовывается, только когда он меняется)
+        self.percent = None
+
+    def show(self, progress: float) -> None:
+        """
+        Метод выводит экран загрузки с процентом выполненной работы
+        :param progress: Доля выполненной работы (от 0 до 1)
+        """
+        percent = round(progress * 100)
+        if percent == self.percent:
+            # События всё равно обрабатываются, чтоб окно не "зависало"
+            pygame.event.pump()
+            return
+        self.percent = percent
+        # Центральная точка на экране для вывода текста
+        central_point = (self.screen.get_width() * 0.5, self.screen.get_height() * 0.5)
+        text = self.font.render(f'Загрузка... {percent}%', True, (240, 240, 240))
         # Вывод фона и текста
-        screen.fill(BACKGROUND_COLOR)
-        screen.blit(text, (central_point[0] - text.get_width() * 0.5,
-                           central_point[1] - text.get_height() * 0.5))
+        self.screen.fill(BACKGROUND_COLOR)
+        self.screen.blit(text, (central_point[0] - text.get_width() * 0.5,
+                                central_point[1] - text.get_height() * 0.5))
+        # Полоса загрузки под текстом
+        bar = pygame.Rect(0, 0, self.screen.get_width() * self.BAR_WIDTH, self.BAR_HEIGHT)
+        bar.midtop = central_point[0], central_point[1] + text.get_height()
+        pygame.draw.rect(self.screen, (240, 240, 240), bar, 1)
+        pygame.draw.rect(self.screen, (240, 240, 240), (*bar.topleft, round(bar.width * progress), bar.height))
         pygame.display.flip()
-        # Задержка в милисекундах
-        pygame.time.wait(100)
+        # События остаются в очереди для игрового цикла
+        pygame.event.pump()
+
+    def part(self, start: float, end: float):
+        """
+        Метод возвращает функцию для вывода прогресса шага загрузки, который занимает
+        часть полосы (например, для AssetManager.preload)
+        :param start: Доля полосы в начале шага
+        :param end: Доля полосы в конце шага
+        :return: Функция, принимающая долю выполненной работы шага (от 0 до 1)
+        """
+        return lambda progress: self.show(start + (end - start) * progress)
+
+
+class QualityGovernor:
+    """
+    Регулятор качества по времени кадра.
+    Следит за средним временем работы кадра (без ожидания в clock.tick) за последние
+    WINDOW кадров. Если оно больше бюджета кадра, то отключается следующая
+    необязательная работа из STEPS, а если долго остаётся запас, то она включается обратно
+    (в обратном порядке). Флаги ступеней читаются игровым циклом
+    """
+    # Ступени понижения качества (в порядке отключения)
+    STEPS = ('damage_numbers', 'health_text', 'status_effects',
+             'torch_animation', 'full_render_scale', 'full_ai_rate')
+    # Количество кадров, по которым считается среднее время
+    WINDOW = 30
+    # Доля бюджета, ниже которой качество повышается обратно
+    HEADROOM = 0.6
+    # Сколько кадров с запасом нужно перед повышением качества
+    # (удваивается, если после повышения пришлось снова понизить, чтоб качество не "мигало")
+    UP_DELAY = 180
+    MAX_UP_DELAY = 180 * 16
+    # Один долгий кадр (создание комнаты, сборка мусора) учитывается не больше,
+    # чем столько бюджетов кадра
+    MAX_SAMPLE = 3
+
+    def __init__(self, fps: int = FPS, render_scale: int = WORLD_RENDER_SCALE):
+        """
+        :param fps: Целевое количество кадров в секунду
+        :param render_scale: Масштаб отрисовки уровня на полном качестве
+        """
+        self.budget = 1000 / fps
+        self.base_render_scale = render_scale
+        self.samples = deque(maxlen=QualityGovernor.WINDOW)
+        # Количество отключённых ступеней
+        self.level = 0
+        self.frames_since_change = 0
+        self.up_delay = QualityGovernor.UP_DELAY
+        # Было ли последнее изменение повышением качества
+        self.raised = False
+        self.apply()
+
+    def apply(self) -> None:
+        """
+        Метод выставляет флаги ступеней по текущему уровню понижения
+        """
+        for index, step in enumerate(QualityGovernor.STEPS):
+            setattr(self, step, index >= self.level)
+        # При понижении разрешение уровня уменьшается ещё в 2 раза
+        self.render_scale = self.base_render_scale * (1 if self.full_render_scale else 2)
+
+    def reset(self) -> None:
+        """
+        Метод сбрасывает накопленные замеры (после паузы, загрузки уровня и т.п.,
+        чтобы время, проведённое вне игрового цикла, не считалось временем кадра)
+        """
+        self.samples.clear()
+        self.frames_since_change = 0
+
+    def update(self, frame_time: float) -> bool:
+        """
+        Метод учитывает время кадра и при необходимости меняет качество
+        :param frame_time: Время работы кадра в миллисекундах
+        :return: Изменилось ли качество
+        """
+        self.samples.append(min(frame_time, self.budget * QualityGovernor.MAX_SAMPLE))
+        self.frames_since_change += 1
+        if len(self.samples) < QualityGovernor.WINDOW:
+            return False
+        average = sum(self.samples) / len(self.samples)
+        if average > self.budget and self.level < len(QualityGovernor.STEPS):
+            # Если качество только что повышалось, то запас был обманчивым
+            if self.raised and self.frames_since_change < self.up_delay:
+                self.up_delay = min(self.up_delay * 2, QualityGovernor.MAX_UP_DELAY)
+            self.raised = False
+            self.level += 1
+        elif (average < self.budget * QualityGovernor.HEADROOM and self.level > 0 and
+              self.frames_since_change >= self.up_delay):
+            self.raised = True
+            self.level -= 1
+        else:
+            return False
+        self.apply()
+        self.reset()
+        return True
 
 
 def cut_sheet(sheet: pygame.surface.Surface,
@@ -175,26 +298,148 @@ def scale_frame(image: pygame.surface.Surface,
     return pygame.image.fromstring(new_image.tobytes(), size, 'RGBA')
 
 
+def segment_rect_intersection(start: tuple, end: tuple, rect: pygame.Rect):
+    """
+    Функция находит первое пересечение отрезка с прямоугольником (метод "слэбов").
+    Нужна для "протяжки" быстро летящих объектов, чтобы они не пролетали сквозь
+    тонкие преграды между кадрами
+    :param start: Начало отрезка
+    :param end: Конец отрезка
+    :param rect: Прямоугольник
+    :return: Параметр t (0 <= t <= 1) точки входа в прямоугольник
+    (start + (end - start) * t) или None, если пересечения нет
+    """
+    t_enter, t_exit = 0.0, 1.0
+    for origin, delta, low, high in ((start[0], end[0] - start[0], rect.left, rect.right),
+                                     (start[1], end[1] - start[1], rect.top, rect.bottom)):
+        if delta == 0:
+            # Отрезок параллелен сторонам и находится вне прямоугольника
+            if not low <= origin < high:
+                return None
+            continue
+        t1, t2 = (low - origin) / delta, (high - origin) / delta
+        if t1 > t2:
+            t1, t2 = t2, t1
+        t_enter, t_exit = max(t_enter, t1), min(t_exit, t2)
+        if t_enter > t_exit:
+            return None
+    return t_enter
+
+
+# Символы тайлов стен и тайлов, на которых лежит пол
+WALL_TILES = '1234567890-='
+FLOOR_TILES = 'PMF.BCrbltT'
+
+
+def make_tiles_table(tiles: str) -> bytes:
+    """
+    Функция создаёт таблицу для bytes.translate: код тайла -> 1, если тайл
+    входит в переданные символы, иначе 0
+    :param tiles: Символы тайлов
+    :return: Таблица из 256 байт
+    """
+    return bytes(int(chr(code) in tiles) for code in range(256))
+
+
+class LevelGrid:
+    """
+    Карта уровня: двумерный массив кодов тайлов (по байту на клетку).
+    Код тайла - это код его символа из шаблонов комнат (см. generation_map),
+    поэтому доступ к клетке выглядит как level[x, y] == '.', а для проверок
+    по всей карте сразу есть таблицы (IS_WALL, IS_FLOOR, IS_WALKABLE)
+    """
+    IS_WALL = make_tiles_table(WALL_TILES)
+    IS_FLOOR = make_tiles_table(FLOOR_TILES)
+    # Проходимые клетки: всё, кроме стен и пустоты за ними
+    IS_WALKABLE = bytes(int(chr(code) not in WALL_TILES + ' ') for code in range(256))
+    # Код пустой клетки (пустота за стенами и пустые комнаты)
+    EMPTY = ord(' ')
+
+    def __init__(self, width: int, height: int, fill: str = ' '):
+        self.width = width
+        self.height = height
+        self.codes = bytearray(fill.encode() * (width * height))
+
+    def __getitem__(self, position: tuple) -> str:
+        x, y = position
+        return chr(self.codes[y * self.width + x])
+
+    def __setitem__(self, position: tuple, tile: str):
+        x, y = position
+        self.codes[y * self.width + x] = ord(tile)
+
+    def paste(self, x: int, y: int, rows: list) -> None:
+        """
+        Метод копирует блок тайлов (например, комнату) на карту
+        :param x: Колонка левого верхнего угла блока
+        :param y: Ряд левого верхнего угла блока
+        :param rows: Строки блока в виде байтов (кодов тайлов)
+        """
+        for i, row in enumerate(rows):
+            start = (y + i) * self.width + x
+            self.codes[start:start + len(row)] = row
+
+    def translate(self, table: bytes) -> bytearray:
+        """
+        Метод переводит все коды тайлов по таблице (например, в 0 и 1 для проходимости)
+        :param table: Таблица из 256 байт (см. make_tiles_table)
+        :return: Массив того же размера, что и карта
+        """
+        return self.codes.translate(table)
+
+    def to_rows(self) -> list:
+        """
+        Метод нужен для вывода карты (например, при отладке)
+        :return: Список строк карты
+        """
+        return [self.codes[y * self.width:(y + 1) * self.width].decode() for y in range(self.height)]
+
+
 # Функция, возвращающая случайное булевое значение с переданным шансом
-def true_with_chance(percentage_chance: float = 50.0,
-                     seed: list = None, user_seed: list = None) -> bool:
+def true_with_chance(percentage_chance: float = 50.0, rng: Random = None) -> bool:
     """
     Функция принимает целое число и переводит в коэффицент, 0 <= k <= 1.
     Затем генерирует случайное число с помощью функции рандом.
     Если случайное число меньше либо равно коэффиценту, функция возвращает True.
-    Получившееся значение записывается в переданный сид (в виде числа 1 или 0, для краткости).
     :param percentage_chance: шанс получения значения True, в процентах
-    :param seed: Сид, куда записывается полученное значение
-    :param user_seed: пользовательский сид (если передан, значение берётся
-    из него, по умолчанию None)
+    :param rng: Генератор случайных чисел (если передан, значение берётся из него,
+    чтоб по одному сиду получалась одна и та же последовательность решений)
     :return: True либо False
     """
-    if user_seed and seed:
-        is_true = int(user_seed[0])
-        seed.append(user_seed[0])
-        del user_seed[0]
-    else:
-        is_true = [0, 1][random() * 100 <= percentage_chance]
-        if seed:
-            seed.append(str(is_true))
-    return bool(is_true)
+    return (rng.random() if rng else random()) * 100 <= percentage_chance
+
+
+def seeded_random(seed: int, subsystem: str) -> Random:
+    """
+    Функция создаёт отдельный генератор случайных чисел для части генерации уровня
+    (карта, монстры, ящики). Так количество случайных решений в одной части
+    не сдвигает последовательность в другой
+    :param seed: Сид уровня
+    :param subsystem: Название части генерации
+    :return: Генератор случайных чисел
+    """
+    return Random(f'{seed}:{subsystem}')
+
+
+class DestroyedObjects:
+    """
+    Битовая карта уничтоженных объектов уровня (убитых монстров, разбитых ящиков,
+    открытых сундуков). Объекты нумеруются в порядке обхода карты,
+    бит с номером объекта выставляется, когда объект уничтожен
+    """
+    def __init__(self, data: bytes = b''):
+        self.bits = bytearray(data)
+
+    def add(self, index: int) -> None:
+        """
+        Метод отмечает объект как уничтоженный
+        :param index: Номер объекта
+        """
+        byte = index >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (index & 7)
+
+    def __contains__(self, index: int) -> bool:
+        byte = index >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (index & 7)))
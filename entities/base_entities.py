@@ -1,27 +1,230 @@
+from collections import deque
+from math import dist
 from random import randint
 
 import pygame
 
-from engine import load_image, cut_sheet, load_game_font
+from engine import LevelGrid
+from assets import AssetManager, Asset
 from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
 
 
+class EntityGrid:
+    """
+    Пространственный индекс (равномерная сетка) для подвижных сущностей.
+    В отличие от SpatialGroup он перестраивается каждый кадр, а нужен для
+    быстрого поиска ближайшей цели: проверяются только клетки вокруг точки
+    (кольцами, от ближних к дальним), а не все сущности на уровне
+    """
+    def __init__(self, cell_size=TILE_SIZE * 4):
+        self.cell_size = cell_size
+        # Сетка: словарь типа (колонка, ряд): список сущностей в клетке
+        self.cells = {}
+
+    def rebuild(self, *groups) -> None:
+        """
+        Метод заново раскладывает сущности по клеткам (вызывается раз в кадр)
+        :param groups: Группы (или списки) сущностей
+        """
+        size = self.cell_size
+        cells = {}
+        for group in groups:
+            for sprite in group:
+                x, y = sprite.rect.center
+                cells.setdefault((x // size, y // size), []).append(sprite)
+        self.cells = cells
+
+    def nearest(self, point: tuple, radius: float):
+        """
+        Метод находит ближайшую живую сущность в радиусе от точки
+        :param point: Точка в мировых координатах
+        :param radius: Радиус поиска (сущность должна быть строго ближе)
+        :return: Ближайшая сущность или None
+        """
+        size = self.cell_size
+        column, row = int(point[0] // size), int(point[1] // size)
+        nearest_sprite, nearest_distance = None, radius
+        for ring in range(int(radius // size) + 2):
+            # Все клетки следующего кольца находятся не ближе (ring - 1) * size,
+            # поэтому, если цель уже ближе, дальше искать нет смысла
+            if nearest_distance <= (ring - 1) * size:
+                break
+            for cell in EntityGrid.get_ring(column, row, ring):
+                for sprite in self.cells.get(cell, ()):
+                    if not sprite.alive:
+                        continue
+                    distance = dist(point, sprite.rect.center)
+                    if distance < nearest_distance:
+                        nearest_sprite, nearest_distance = sprite, distance
+        return nearest_sprite
+
+    def get_near_rect(self, rect: pygame.Rect):
+        """
+        Генератор сущностей, которые могут задевать прямоугольник: из клеток,
+        которые он задевает, и соседних с ними (центр большой сущности может быть
+        в соседней клетке, а с перестройки сетки сущности могли немного сдвинуться)
+        :param rect: Прямоугольник в мировых координатах
+        """
+        size = self.cell_size
+        for column in range(rect.left // size - 1, (rect.right - 1) // size + 2):
+            for row in range(rect.top // size - 1, (rect.bottom - 1) // size + 2):
+                yield from self.cells.get((column, row), ())
+
+    @staticmethod
+    def get_ring(column: int, row: int, ring: int):
+        """
+        Генератор клеток, находящихся на расстоянии ring клеток от переданной
+        (т.е. "кольцо" клеток вокруг неё)
+        """
+        if not ring:
+            yield column, row
+            return
+        for i in range(column - ring, column + ring + 1):
+            yield i, row - ring
+            yield i, row + ring
+        for j in range(row - ring + 1, row + ring):
+            yield column - ring, j
+            yield column + ring, j
+
+
+class FlowField:
+    """
+    Общее для всех монстров поле направлений к игроку.
+    Одним поиском в ширину от клетки игрока для каждой клетки окна вокруг него
+    (не дальше MAX_DEPTH клеток) находится соседняя клетка, через которую лежит
+    кратчайший путь к игроку, поэтому монстру достаточно посмотреть в поле, куда идти дальше.
+    Поле пересчитывается только когда игрок переходит в другую клетку
+    (или когда меняются преграды, например разбили ящик), и стоимость пересчёта
+    зависит только от размера окна, а не от размера уровня
+    """
+    # Соседние клетки (сначала прямые, потом диагональные)
+    NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+    # Максимальная длина пути (в клетках), дальше монстры игрока всё равно не видят
+    MAX_DEPTH = 24
+
+    def __init__(self, level_map: LevelGrid, barriers_group: 'SpatialGroup'):
+        """
+        :param level_map: Карта уровня (из generate_new_level)
+        :param barriers_group: Группа преград (стены, ящики, сундуки)
+        """
+        self.width = level_map.width
+        self.height = level_map.height
+        # Клетки, в которых есть пол (стены и пустота за ними непроходимы,
+        # а ящики и сундуки берутся из группы преград при построении поля)
+        self.floor = level_map.translate(LevelGrid.IS_WALKABLE)
+        self.barriers_group = barriers_group
+        # Окно вокруг игрока (в клетках), в котором построено поле
+        self.window = pygame.Rect(0, 0, 0, 0)
+        # Для каждой клетки окна индекс (в окне) следующей клетки пути к игроку (-1 - пути нет)
+        self.next_cells = []
+        self.player_cell = None
+        self.barriers_count = -1
+
+    def update(self, player) -> None:
+        """
+        Метод пересчитывает поле, если игрок перешёл в другую клетку
+        или изменилось количество преград
+        :param player: Игрок
+        """
+        cell = (int(player.rect.centerx // TILE_SIZE), int(player.rect.centery // TILE_SIZE))
+        if cell == self.player_cell and len(self.barriers_group) == self.barriers_count:
+            return
+        self.player_cell = cell
+        self.barriers_count = len(self.barriers_group)
+        self.build(*cell)
+
+    def build(self, start_x: int, start_y: int) -> None:
+        """
+        Метод строит поле поиском в ширину от клетки игрока
+        :param start_x: Колонка клетки игрока
+        :param start_y: Ряд клетки игрока
+        """
+        if not (0 <= start_x < self.width and 0 <= start_y < self.height):
+            self.window = pygame.Rect(0, 0, 0, 0)
+            self.next_cells = []
+            return
+        # Путь не длиннее MAX_DEPTH шагов (в том числе по диагонали) не выходит из этого окна
+        depth = FlowField.MAX_DEPTH
+        left, top = max(start_x - depth, 0), max(start_y - depth, 0)
+        right, bottom = min(start_x + depth + 1, self.width), min(start_y + depth + 1, self.height)
+        self.window = pygame.Rect(left, top, right - left, bottom - top)
+        width, height = self.window.size
+        next_cells = [-1] * (width * height)
+        self.next_cells = next_cells
+
+        # Проходимость клеток окна: пол уровня без клеток с преградами
+        walkable = bytearray()
+        for y in range(top, bottom):
+            walkable += self.floor[y * self.width + left:y * self.width + right]
+        window_rect = pygame.Rect(left * TILE_SIZE, top * TILE_SIZE, width * TILE_SIZE, height * TILE_SIZE)
+        for x, y in self.barriers_group.get_occupied_cells(window_rect):
+            walkable[(y - top) * width + x - left] = 0
+
+        start = (start_y - top) * width + start_x - left
+        next_cells[start] = start
+        queue = deque(((start, 0),))
+        while queue:
+            index, depth = queue.popleft()
+            if depth == FlowField.MAX_DEPTH:
+                continue
+            x, y = index % width, index // width
+            for dx, dy in FlowField.NEIGHBOURS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                neighbour = ny * width + nx
+                if next_cells[neighbour] != -1 or not walkable[neighbour]:
+                    continue
+                # По диагонали нельзя срезать угол стены
+                if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                    continue
+                next_cells[neighbour] = index
+                queue.append((neighbour, depth + 1))
+
+    def get_next_point(self, point: tuple):
+        """
+        Метод возвращает следующую точку пути к игроку
+        :param point: Текущая точка в мировых координатах
+        :return: Центр следующей клетки пути или None, если пути нет
+        (или точка уже в клетке игрока)
+        """
+        x, y = int(point[0] // TILE_SIZE), int(point[1] // TILE_SIZE)
+        if not self.window.collidepoint(x, y):
+            return None
+        width = self.window.width
+        index = (y - self.window.y) * width + x - self.window.x
+        next_cell = self.next_cells[index]
+        if next_cell == -1 or next_cell == index:
+            return None
+        return ((next_cell % width + self.window.x + 0.5) * TILE_SIZE,
+                (next_cell // width + self.window.y + 0.5) * TILE_SIZE)
+
+
 class Entity(pygame.sprite.Sprite):
     """
     Класс, отвечающий за предстовление базовой сущности в игре
     """
 
     # Группа со спрайтами, которые считаются физическими объектами
-    # общими для всех сущностей.
-    collisions_group: pygame.sprite.Group
+    # общими для всех сущностей (с пространственным индексом для коллизий).
+    collisions_group: 'SpatialGroup'
     all_sprites: pygame.sprite.Group
     player = None
+    # Камера (смещение вида), сущности хранят мировые координаты,
+    # а камера применяется только при отрисовке
+    camera = None
 
     # Группа со всеми сущностями (экземплярами этого класса)
     # Нужна в основном для коллизий между существами
     entities_group = pygame.sprite.Group()
     damages_group = pygame.sprite.Group()
     spells_group = pygame.sprite.Group()
+    # Индексы для поиска ближайших целей (перестраиваются каждый кадр):
+    # враги (для асистентов) и игрок с асистентами (для врагов)
+    enemies_grid = EntityGrid()
+    allies_grid = EntityGrid()
+    # Поле направлений к игроку для монстров ближнего боя (своё на каждом уровне)
+    flow_field: FlowField = None
 
     default_speed = TILE_SIZE * 0.2
 
@@ -34,11 +237,11 @@ class Entity(pygame.sprite.Sprite):
     BETWEEN_POISON_DAMAGE = 1000
 
     size = (int(TILE_SIZE),) * 2
-    sleeping_frames = cut_sheet(load_image('assets/sprites/enemies/sleep_icon_spritesheet.png'), 4, 1, size)
-    poison_frames = cut_sheet(load_image('assets/sprites/spells/poison_static.png'), 5, 1, size)[0]
+    sleeping_frames = Asset('game', AssetManager.sheet, 'assets/sprites/enemies/sleep_icon_spritesheet.png', 4, 1, size)
+    poison_frames = Asset('game', AssetManager.strip, 'assets/sprites/spells/poison_static.png', 5, size)
 
-    small_font = load_game_font(15)
-    font = load_game_font(24)
+    small_font = Asset('game', AssetManager.font, 15)
+    font = Asset('game', AssetManager.font, 24)
 
     def __init__(self, x: float, y: float, *args):
         # Конструктор класса Sprite
@@ -104,7 +307,7 @@ class Entity(pygame.sprite.Sprite):
         self.collider.update(*self.rect.center)
 
         # Если сущность врезалась во что-то, возвращаем к исходному x
-        if pygame.sprite.spritecollide(self.collider, Entity.collisions_group, False):
+        if Entity.collisions_group.collide_any(self.collider.rect):
             self.rect.x = pos[0]
             self.dx = 0
             if self.__class__.__name__ == 'Player':
@@ -117,7 +320,7 @@ class Entity(pygame.sprite.Sprite):
         self.collider.update(*self.rect.center)
 
         # Если сущность врезалась во что-то, возвращаем к исходному y
-        if pygame.sprite.spritecollide(self.collider, Entity.collisions_group, False):
+        if Entity.collisions_group.collide_any(self.collider.rect):
             self.rect.y = pos[1]
             self.dy = 0
             if self.__class__.__name__ == 'Player':
@@ -159,19 +362,28 @@ class Entity(pygame.sprite.Sprite):
                 self.FOOTSTEP_SOUND.set_volume(min(DEFAULT_SOUNDS_VOLUME / (self.distance_to_player / TILE_SIZE) * 3, 1))
                 self.sounds_channel.play(self.FOOTSTEP_SOUND)
 
-    def draw_health_bar(self, screen):
+    def draw_health_bar(self, screen, text: bool = True, effects: bool = True):
         """
         Отрисовка полоски здоровья и отрисовка знака сна (Z-Z-Z).
         :param screen: Экран
+        :param text: Выводить ли текст со здоровьем и имя (отключается при нехватке времени кадра)
+        :param effects: Выводить ли эффекты яда и сна (отключается при нехватке времени кадра)
         """
+        # Сущности за пределами экрана не отрисовываются
+        # (в том числе не рендерится текст с именем и здоровьем)
+        if not Entity.camera.is_visible(self.rect):
+            return
         line_width = Entity.HEALTH_LINE_WIDTH  # длинна полоски здоровья
-        x, y = self.rect.center  # текущая позиция сущности
-        width, height = self.rect.size  # текущие размеры сущности
+        # Положение сущности на экране
+        screen_rect = Entity.camera.apply(self.rect)
+        x, y = screen_rect.center  # текущая позиция сущности
+        width, height = screen_rect.size  # текущие размеры сущности
         # Позиция над сущностью
         x1, y1 = x - width * 0.5, y - height * 0.5
         # При получении урона или наведении прицелом выводиться шкала здоровья
+        # (прицел находится в координатах экрана)
         if pygame.time.get_ticks() - self.last_damage_time < Entity.HEALTH_LINE_TIME or \
-                pygame.sprite.collide_rect(self, Entity.player.scope):
+                screen_rect.colliderect(Entity.player.scope.rect):
             # Обводка вокруг шкалы здоровья
             pygame.draw.rect(screen, 'dark grey', (x1 - 1, y1 - 10 - 1, width + 2, line_width + 2))
             # Длинная полоски здоровья
@@ -181,21 +393,22 @@ class Entity(pygame.sprite.Sprite):
             # Сама полоска здоровья
             pygame.draw.rect(screen, color, (x1, y1 - 10, health_length, line_width))
             # Текст с текущем здоровьем
-            health_text = f'{round(self.health + 0.5)}/{self.full_health}'
-            health = self.small_font.render(health_text, True, (255, 255, 255))
-            # Отцентровка текста по середине
-            rect = health.get_rect()
-            rect.center = (x1 + width // 2, y1 - 5)
-            # Вывод на экран
-            screen.blit(health, rect.topleft)
+            if text:
+                health_text = f'{round(self.health + 0.5)}/{self.full_health}'
+                health = self.small_font.render(health_text, True, (255, 255, 255))
+                # Отцентровка текста по середине
+                rect = health.get_rect()
+                rect.center = (x1 + width // 2, y1 - 5)
+                # Вывод на экран
+                screen.blit(health, rect.topleft)
         # Для всех сущностей кроме игрока выводиться их название
-        if self.__class__.__name__ not in ('Player',):
+        if text and self.__class__.__name__ not in ('Player',):
             name = self.font.render(self.name, True, (255, 255, 255))
             rect = name.get_rect()
             rect.center = (x1 + width // 2, y1 - 12 - line_width)
             screen.blit(name, rect.topleft)
 
-        if not self.alive:
+        if not self.alive or not effects:
             return
         # Отрисовка эффетка яда и обновление параметров
         ticks = pygame.time.get_ticks()
@@ -203,13 +416,13 @@ class Entity(pygame.sprite.Sprite):
             if ticks - self.poison_static_time > Entity.UPDATE_TIME:
                 self.poison_static_time = ticks
                 self.cur_poison_frame = (self.cur_poison_frame + 1) % len(Entity.poison_frames)
-            screen.blit(Entity.poison_frames[self.cur_poison_frame], (self.rect.x, self.rect.y))
+            screen.blit(Entity.poison_frames[self.cur_poison_frame], screen_rect.topleft)
         # Отрисовка анимации сна и обновление параметров
         if self.__class__.__name__ not in ('Player',) and not self.target_observed:
             if not self.sleeping_time or ticks - self.sleeping_time >= 250:
                 self.cur_sleeping_frame = (self.cur_sleeping_frame + 1) % len(self.sleeping_frames[0])
                 self.sleeping_time = ticks
-            screen.blit(self.sleeping_frames[0][self.cur_sleeping_frame], (self.rect.centerx + 10, self.rect.y - 35))
+            screen.blit(self.sleeping_frames[0][self.cur_sleeping_frame], (screen_rect.centerx + 10, screen_rect.y - 35))
 
     def get_damage(self, damage, spell_type='', action_time=0):
         """
@@ -280,7 +493,7 @@ class Entity(pygame.sprite.Sprite):
             self.image = self.__class__.frames[look][self.cur_frame]
 
     @staticmethod
-    def set_global_groups(collisions_group: pygame.sprite.Group, all_sprites: pygame.sprite.Group):
+    def set_global_groups(collisions_group: 'SpatialGroup', all_sprites: pygame.sprite.Group):
         """
         Метод устанавливает группу со спрайтами, которые будут считаться
         физическими объектами для всех сущностей на уровне.
@@ -293,6 +506,167 @@ class Entity(pygame.sprite.Sprite):
         Entity.collisions_group = collisions_group
         Entity.all_sprites = all_sprites
 
+    @staticmethod
+    def set_global_flow_field(flow_field: FlowField):
+        """
+        Метод устанавливает поле направлений к игроку для текущего уровня.
+        Метод нужен при инициализации
+        :param flow_field: Поле направлений
+        """
+        Entity.flow_field = flow_field
+
+    @staticmethod
+    def set_global_camera(camera):
+        """
+        Метод устанавливает камеру, через которую сущности переводят
+        свои мировые координаты в экранные (и обратно для прицела).
+        Метод нужен при инициализации
+        :param camera: Камера
+        """
+        Entity.camera = camera
+
+
+class SpatialGroup(pygame.sprite.Group):
+    """
+    Группа спрайтов с пространственным индексом (равномерной сеткой).
+    Каждый спрайт при добавлении записывается во все клетки сетки, которые
+    он задевает, поэтому поиск пересечений проверяет только соседние клетки,
+    а не всю группу (и не зависит от размера уровня).
+    Подходит только для спрайтов, которые не двигаются, пока находятся в группе
+    (стены, ящики, сундуки и т.д.)
+    """
+    def __init__(self, *sprites, cell_size=TILE_SIZE):
+        # Сетка: словарь типа (колонка, ряд): список спрайтов в клетке
+        self.cells = {}
+        self.cell_size = cell_size
+        # Спрайты, которые ещё не записаны в сетку. Они индексируются при
+        # первом запросе, т.к. спрайт добавляется в группу в конструкторе
+        # Sprite, когда у него ещё нет rect
+        self.not_indexed = {}
+        super().__init__(*sprites)
+
+    def get_cells(self, rect: pygame.Rect):
+        """
+        Генератор клеток сетки, которые задевает прямоугольник
+        :param rect: Прямоугольник в мировых координатах
+        """
+        size = self.cell_size
+        for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for column in range(rect.left // size, (rect.right - 1) // size + 1):
+                yield column, row
+
+    def get_cells_on_segment(self, start: tuple, end: tuple):
+        """
+        Генератор клеток сетки, через которые проходит отрезок, в порядке
+        их прохождения (обход сетки по алгоритму DDA)
+        :param start: Начало отрезка в мировых координатах
+        :param end: Конец отрезка в мировых координатах
+        """
+        size = self.cell_size
+        column, row = int(start[0] // size), int(start[1] // size)
+        end_column, end_row = int(end[0] // size), int(end[1] // size)
+        step_x = 1 if end_column > column else -1
+        step_y = 1 if end_row > row else -1
+        delta_x, delta_y = end[0] - start[0], end[1] - start[1]
+        # Параметр отрезка (от 0 до 1), на котором будет пересечена следующая
+        # граница клетки по x (или y), и его приращение на одну клетку
+        if delta_x:
+            t_max_x = ((column + (step_x > 0)) * size - start[0]) / delta_x
+            t_delta_x = size / abs(delta_x)
+        else:
+            t_max_x = t_delta_x = float('inf')
+        if delta_y:
+            t_max_y = ((row + (step_y > 0)) * size - start[1]) / delta_y
+            t_delta_y = size / abs(delta_y)
+        else:
+            t_max_y = t_delta_y = float('inf')
+
+        yield column, row
+        for _ in range(abs(end_column - column) + abs(end_row - row)):
+            if (t_max_x < t_max_y or row == end_row) and column != end_column:
+                column += step_x
+                t_max_x += t_delta_x
+            else:
+                row += step_y
+                t_max_y += t_delta_y
+            yield column, row
+
+    def add_internal(self, sprite, *args):
+        super().add_internal(sprite, *args)
+        self.not_indexed[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.not_indexed:
+            del self.not_indexed[sprite]
+            return
+        # Спрайт убирается из индекса (например, когда ломается ящик)
+        for cell in self.get_cells(sprite.rect):
+            cell_sprites = self.cells.get(cell)
+            if cell_sprites and sprite in cell_sprites:
+                cell_sprites.remove(sprite)
+                if not cell_sprites:
+                    del self.cells[cell]
+
+    def index_new_sprites(self) -> None:
+        """Метод записывает в сетку спрайты, добавленные после прошлого запроса"""
+        for sprite in self.not_indexed:
+            for cell in self.get_cells(sprite.rect):
+                self.cells.setdefault(cell, []).append(sprite)
+        self.not_indexed.clear()
+
+    def get_occupied_cells(self, rect: pygame.Rect = None):
+        """
+        Метод возвращает клетки сетки, в которых есть хоть один спрайт
+        (например, для построения карты проходимости уровня)
+        :param rect: Прямоугольник в мировых координатах, клетки которого нужны
+        (если не передан, то возвращаются все занятые клетки)
+        :return: Набор клеток вида (колонка, ряд)
+        """
+        if self.not_indexed:
+            self.index_new_sprites()
+        if rect is None:
+            return self.cells.keys()
+        size = self.cell_size
+        left, top = rect.left // size, rect.top // size
+        right, bottom = (rect.right - 1) // size, (rect.bottom - 1) // size
+        # Перебирается то, что меньше: занятые клетки или клетки прямоугольника,
+        # поэтому время не больше, чем на перебор клеток прямоугольника
+        if len(self.cells) < (right - left + 1) * (bottom - top + 1):
+            return [(column, row) for column, row in self.cells
+                    if left <= column <= right and top <= row <= bottom]
+        return [cell for cell in self.get_cells(rect) if cell in self.cells]
+
+    def collide(self, rect: pygame.Rect) -> list:
+        """
+        Метод находит все спрайты группы, пересекающиеся с прямоугольником
+        (аналог pygame.sprite.spritecollide, но без перебора всей группы)
+        :param rect: Прямоугольник в мировых координатах
+        :return: Список спрайтов
+        """
+        if self.not_indexed:
+            self.index_new_sprites()
+        result = []
+        for cell in self.get_cells(rect):
+            for sprite in self.cells.get(cell, ()):
+                if sprite.rect.colliderect(rect) and sprite not in result:
+                    result.append(sprite)
+        return result
+
+    def collide_any(self, rect: pygame.Rect) -> bool:
+        """
+        Метод проверяет, пересекается ли прямоугольник хоть с одним спрайтом группы
+        :param rect: Прямоугольник в мировых координатах
+        :return: True, если есть пересечение
+        """
+        if self.not_indexed:
+            self.index_new_sprites()
+        for cell in self.get_cells(rect):
+            for sprite in self.cells.get(cell, ()):
+                if sprite.rect.colliderect(rect):
+                    return True
+        return False
+
 
 class Collider(pygame.sprite.Sprite):
     """
@@ -316,7 +690,7 @@ class ReceivingDamage(pygame.sprite.Sprite):
 
     def __init__(self, x: float, y: float, damage: float, *groups, color=(255, 255, 255)):
         super().__init__(*groups)
-        self.font = load_game_font(min(round(24 + abs(damage) / 3), 64))
+        self.font = AssetManager.font(min(round(24 + abs(damage) / 3), 64))
         self.last_update_time = 0
 
         self.damage = abs(round(damage))
@@ -5,6 +5,7 @@ from entities.base_entities import Entity
 from entities.items import *
 from entities.spells import *
 from engine import *
+from assets import AssetManager, Asset
 from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
 
 
@@ -14,10 +15,20 @@ class Monster(Entity):
     Если игрок дальше их видимости, они ходят вокруг точки спавна.
     Если они видят игрока, они идут к нему
     """
-    def __init__(self, x, y, level, seed, *args):
+    def __init__(self, x, y, level, destroyed_objects, *args):
         super().__init__(x, y, *args)
         self.level = level
-        self.seed = seed
+        # Битовая карта убитых монстров уровня (у призванных монстров её нет)
+        self.destroyed_objects = destroyed_objects
+        # Учёт пропущенных обновлений (см. MonstersScheduler)
+        self.skipped_frames = 0
+        self.catch_up_frames = 1
+
+    def update(self) -> None:
+        # Лёд спадает покадрово, поэтому за пропущенные кадры списываем его разом
+        if self.ice_buff:
+            self.ice_buff = max(self.ice_buff - (self.catch_up_frames - 1), 0)
+        super().update()
 
     def death(self):
         if not self.alive:
@@ -29,22 +40,32 @@ class Monster(Entity):
             spawn_item(*pos, all_sprites=Entity.all_sprites,
                        k=randint(1, [2, 3][isinstance(self, (VoidWizard, DirtySlime))]))
 
-        if self.seed:
-            self.seed[self.index_in_seed] = '0'
+        if self.destroyed_objects is not None:
+            self.destroyed_objects.add(self.index_on_level)
         self.alive = False
         self.cur_frame = 0
         self.speed = 0.0001
 
+    def find_target(self, player):
+        """
+        Поиск цели: ближайший живой союзник игрока (сам игрок или асистент)
+        в пределах видимости монстра. Если никого рядом нет, целью остаётся игрок
+        :param player: Игрок
+        :return: Цель
+        """
+        target = Entity.allies_grid.nearest(self.rect.center, self.visibility_range)
+        return target if target else player
+
 
 class WalkingMonster(Monster):
     """
     Класс монстров ближнего боя.
     Умом они не блещут, ИИ пока такой:
     Если игрок дальше их видимости, они ходят вокруг точки спавна.
-    Если они видят игрока, они идут к нему
+    Если они видят игрока, они идут к нему в обход стен (по общему FlowField)
     """
-    def __init__(self, x: float, y: float, level: int, seed, *args):
-        super().__init__(x, y, level, seed, *args)
+    def __init__(self, x: float, y: float, level: int, destroyed_objects, *args):
+        super().__init__(x, y, level, destroyed_objects, *args)
 
         self.target_observed = False
         # Значения по-умолчанию
@@ -61,14 +82,7 @@ class WalkingMonster(Monster):
             super().update_frame_state()
             return
 
-        if dist(self.rect.center, player.rect.center) > TILE_SIZE * 25:
-            return
-
-        target = player
-        min_dist = dist(self.rect.center, player.rect.center)
-        for assistant in player.assistants:
-            if dist(self.rect.center, assistant.rect.center) < min_dist and assistant.alive:
-                target = assistant
+        target = self.find_target(player)
 
         # Сокращаем написание координат объекта
         self_x, self_y = self.rect.center
@@ -95,7 +109,7 @@ class WalkingMonster(Monster):
             # Находим расстояние до точки
             line = max(((point_x - self_x) ** 2 + (point_y - self_y) ** 2) ** 0.5, self.speed)
 
-            part_move = max(line / self.speed, 0.5)
+            part_move = max(line / (self.speed * self.catch_up_frames), 0.5)
             self.dx = round((point_x - self_x) / part_move)
             self.dy = round((point_y - self_y) / part_move)
             # Если монстр ушел далеко от точки, то надо быстрее идти обратно, а то слишком долго
@@ -105,7 +119,14 @@ class WalkingMonster(Monster):
             self.target_observed = False
 
         else:
-            part_move = max(line / self.speed, 1)
+            # К игроку идём по полю направлений (в обход стен),
+            # а если уже в его клетке (или цель - асистент), то напрямую
+            if target is player:
+                next_point = Entity.flow_field.get_next_point(self.rect.center)
+                if next_point:
+                    point_x, point_y = next_point
+                    line = max(dist(next_point, self.rect.center), self.speed)
+            part_move = max(line / (self.speed * self.catch_up_frames), 1)
             self.dx = (point_x - self_x) * 4 / part_move
             self.dy = (point_y - self_y) * 4 / part_move
             self.target_observed = True
@@ -167,9 +188,9 @@ class ShootingMonster(Monster):
     Если игрок подходит слишком близко, отходим, разрываем дистанцию.
     (В этот момент если монстр не сдвинулся, значит преграда, так что снова стреляем)
     """
-    def __init__(self, x: float, y: float, level: int, seed, *args):
+    def __init__(self, x: float, y: float, level: int, destroyed_objects, *args):
         # Конструктор класса Sprite
-        super().__init__(x, y, level, seed, *args)
+        super().__init__(x, y, level, destroyed_objects, *args)
 
         # Значения по-умолчанию
         self.visibility_range = TILE_SIZE * 13
@@ -181,6 +202,8 @@ class ShootingMonster(Monster):
         self.last_shot_time = pygame.time.get_ticks()
         self.reload_time = 1500
         self.assistants = pygame.sprite.Group()
+        # Группа врагов всегда передаётся последней (self.groups() не сохраняет порядок групп)
+        self.enemies_group = args[-1]
 
         self.stopping_time = pygame.time.get_ticks() + randint(-500, 500)
 
@@ -192,17 +215,11 @@ class ShootingMonster(Monster):
             return
 
         super().update()
-        if dist(self.rect.center, player.rect.center) > TILE_SIZE * 25:
-            return
 
         self_x, self_y = self.rect.center
         delta = 0
 
-        target = player
-        min_dist = dist(self.rect.center, player.rect.center)
-        for assistant in player.assistants:
-            if dist(self.rect.center, assistant.rect.center) < min_dist and assistant.alive:
-                target = assistant
+        target = self.find_target(player)
 
         point_x, point_y = target.rect.centerx, target.rect.centery
         # Расстояние между врагом и игроком
@@ -221,7 +238,7 @@ class ShootingMonster(Monster):
             point_x, point_y = self.point
             line = max(((point_x - self_x) ** 2 + (point_y - self_y) ** 2) ** 0.5, self.speed)
 
-            part_move = max(line / self.speed, 0.5)
+            part_move = max(line / (self.speed * self.catch_up_frames), 0.5)
             self.dx = round((point_x - self_x) / part_move)
             self.dy = round((point_y - self_y) / part_move)
             if line > 1.5 * TILE_SIZE:
@@ -235,7 +252,7 @@ class ShootingMonster(Monster):
                 assistant.point = target.rect.center
                 assistant.target_observed = True
 
-            part_move = max(line / self.speed, 1)
+            part_move = max(line / (self.speed * self.catch_up_frames), 1)
             self.dx = -(point_x - self_x) * 4 / part_move
             self.dy = -(point_y - self_y) * 4 / part_move
             self.target_observed = True
@@ -246,7 +263,7 @@ class ShootingMonster(Monster):
                 assistant.point = target.rect.center
                 assistant.target_observed = True
 
-            part_move = max(line / self.speed, 1)
+            part_move = max(line / (self.speed * self.catch_up_frames), 1)
             self.dx = (point_x - self_x) * 4 / part_move
             self.dy = (point_y - self_y) * 4 / part_move
             self.target_observed = True
@@ -295,7 +312,7 @@ class ShootingMonster(Monster):
     def shoot(self, player):
         if not self.alive:
             return
-        enemies_group = self.groups()[-1]
+        enemies_group = self.enemies_group
         enemies_group.remove(self)
         for assistant in self.assistants:
             if assistant in enemies_group:
@@ -312,7 +329,7 @@ class ShootingMonster(Monster):
         elif isinstance(self, VoidWizard):
             if len(self.assistants) < 7 and true_with_chance(15):
                 spell = CallZombiesSpell
-                args = (self.level, [], Entity.all_sprites, self.assistants, enemies_group)
+                args = (self.level, None, Entity.all_sprites, self.assistants, enemies_group)
                 for m in [(-1, 0), (0, -1), (1, 0), (0, 1)]:
                     i, j = m
                     if true_with_chance(75):
@@ -325,7 +342,7 @@ class ShootingMonster(Monster):
                             zombie.rect.center = (self.rect.centerx + randint(-TILE_SIZE, TILE_SIZE),
                                                   self.rect.centery + randint(-TILE_SIZE, TILE_SIZE))
                             zombie.collider.update(*zombie.rect.center)
-                            if not pygame.sprite.spritecollideany(zombie.collider, Entity.collisions_group):
+                            if not Entity.collisions_group.collide_any(zombie.collider.rect):
                                 break
 
                         zombie.point = self.rect.centerx + i * TILE_SIZE, self.rect.centery + j * TILE_SIZE
@@ -353,11 +370,12 @@ class Demon(WalkingMonster):
     name = "Демон"
     damage = 50
     size = (int(TILE_SIZE // 8 * 5),) * 2
-    frames = cut_sheet(load_image("assets/sprites/enemies/demon_run.png"), 4, 2, size)
-    frames += cut_sheet(load_image("assets/sprites/enemies/demon_idle.png"), 4, 2, size)
+    frames = Asset('Demon', AssetManager.frames, ("assets/sprites/enemies/demon_run.png", 4, 2),
+                                                 ("assets/sprites/enemies/demon_idle.png", 4, 2),
+                                                 size=size)
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/demon_get_damage.png"), 2, 1, size)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/demon_dying.png"), 16, 1, size)[0]
+    get_damage_frames = Asset('Demon', AssetManager.strip, "assets/sprites/enemies/demon_get_damage.png", 2, size)
+    death_frames = Asset('Demon', AssetManager.strip, "assets/sprites/enemies/demon_dying.png", 16, size)
 
     UPDATE_TIME = 60
     default_speed = TILE_SIZE * 0.03
@@ -374,10 +392,10 @@ class Demon(WalkingMonster):
         (1, 1):   0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('Demon', pygame.mixer.Channel, 3)
 
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/little_steps.mp3")
+    FOOTSTEP_SOUND = Asset('Demon', AssetManager.sound, "assets/audio/sfx/enemies/little_steps.mp3")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -402,11 +420,11 @@ class GreenSlime(WalkingMonster):
     """
     name = "Слизень"
     damage = 60
-    frames = cut_sheet(load_image("assets/sprites/enemies/green_slime_any.png"), 4, 2)
-    frames += cut_sheet(load_image("assets/sprites/enemies/green_slime_any.png"), 4, 2)
+    frames = Asset('GreenSlime', AssetManager.frames, ("assets/sprites/enemies/green_slime_any.png", 4, 2),
+                                                      ("assets/sprites/enemies/green_slime_any.png", 4, 2))
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/green_slime_get_damage.png"), 2, 1)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/green_slime_dying.png"), 16, 1)[0]
+    get_damage_frames = Asset('GreenSlime', AssetManager.strip, "assets/sprites/enemies/green_slime_get_damage.png", 2)
+    death_frames = Asset('GreenSlime', AssetManager.strip, "assets/sprites/enemies/green_slime_dying.png", 16)
 
     default_speed = TILE_SIZE * 0.015
     look_directions = {
@@ -421,10 +439,10 @@ class GreenSlime(WalkingMonster):
         (1, 1): 0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(4)
+    sounds_channel = Asset('GreenSlime', pygame.mixer.Channel, 4)
 
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/slime_sound.mp3")
+    FOOTSTEP_SOUND = Asset('GreenSlime', AssetManager.sound, "assets/audio/sfx/enemies/slime_sound.mp3")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -449,11 +467,11 @@ class DirtySlime(WalkingMonster):
     """
     name = "Грязный слизень"
     damage = 90
-    frames = cut_sheet(load_image("assets/sprites/enemies/dirty_slime_any.png"), 4, 2)
-    frames += cut_sheet(load_image("assets/sprites/enemies/dirty_slime_any.png"), 4, 2)
+    frames = Asset('DirtySlime', AssetManager.frames, ("assets/sprites/enemies/dirty_slime_any.png", 4, 2),
+                                                      ("assets/sprites/enemies/dirty_slime_any.png", 4, 2))
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/dirty_slime_get_damage.png"), 2, 1)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/dirty_slime_dying.png"), 16, 1)[0]
+    get_damage_frames = Asset('DirtySlime', AssetManager.strip, "assets/sprites/enemies/dirty_slime_get_damage.png", 2)
+    death_frames = Asset('DirtySlime', AssetManager.strip, "assets/sprites/enemies/dirty_slime_dying.png", 16)
 
     default_speed = TILE_SIZE * 0.02
     look_directions = {
@@ -468,9 +486,9 @@ class DirtySlime(WalkingMonster):
         (1, 1): 0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(4)
+    sounds_channel = Asset('DirtySlime', pygame.mixer.Channel, 4)
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/slime_sound_1.ogg")
+    FOOTSTEP_SOUND = Asset('DirtySlime', AssetManager.sound, "assets/audio/sfx/enemies/slime_sound_1.ogg")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -496,11 +514,11 @@ class Zombie(WalkingMonster):
     """
     name = "Зомби"
     damage = 30
-    frames = cut_sheet(load_image("assets/sprites/enemies/zombie_run.png"), 4, 2)
-    frames += cut_sheet(load_image("assets/sprites/enemies/zombie_idle.png"), 4, 2)
+    frames = Asset('Zombie', AssetManager.frames, ("assets/sprites/enemies/zombie_run.png", 4, 2),
+                                                  ("assets/sprites/enemies/zombie_idle.png", 4, 2))
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/zombie_get_damage.png"), 2, 1)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/zombie_dying.png"), 16, 1)[0]
+    get_damage_frames = Asset('Zombie', AssetManager.strip, "assets/sprites/enemies/zombie_get_damage.png", 2)
+    death_frames = Asset('Zombie', AssetManager.strip, "assets/sprites/enemies/zombie_dying.png", 16)
 
     default_speed = TILE_SIZE * 0.02
     look_directions = {
@@ -515,10 +533,10 @@ class Zombie(WalkingMonster):
         (1, 1): 0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('Zombie', pygame.mixer.Channel, 3)
 
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/stone_steps_1.mp3")
+    FOOTSTEP_SOUND = Asset('Zombie', AssetManager.sound, "assets/audio/sfx/enemies/stone_steps_1.mp3")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -542,11 +560,12 @@ class FireWizard(ShootingMonster):
     """
     name = "Маг огня"
     size = (TILE_SIZE // 8 * 7,) * 2
-    frames = cut_sheet(load_image("assets/sprites/enemies/wizard_run.png"), 4, 2, size)
-    frames += cut_sheet(load_image("assets/sprites/enemies/wizard_idle.png"), 4, 2, size)
+    frames = Asset('FireWizard', AssetManager.frames, ("assets/sprites/enemies/wizard_run.png", 4, 2),
+                                                      ("assets/sprites/enemies/wizard_idle.png", 4, 2),
+                                                      size=size)
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/wizard_get_damage.png"), 2, 1, size)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/wizard_dying.png"), 16, 1, size)[0]
+    get_damage_frames = Asset('FireWizard', AssetManager.strip, "assets/sprites/enemies/wizard_get_damage.png", 2, size)
+    death_frames = Asset('FireWizard', AssetManager.strip, "assets/sprites/enemies/wizard_dying.png", 16, size)
 
     default_speed = TILE_SIZE * 0.012
     look_directions = {
@@ -561,10 +580,10 @@ class FireWizard(ShootingMonster):
         (1, 1): 0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('FireWizard', pygame.mixer.Channel, 3)
 
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/wizard_rustle.mp3")
+    FOOTSTEP_SOUND = Asset('FireWizard', AssetManager.sound, "assets/audio/sfx/enemies/wizard_rustle.mp3")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -590,11 +609,11 @@ class VoidWizard(ShootingMonster):
     """
     name = "Древний маг"
     damage = 20
-    frames = cut_sheet(load_image("assets/sprites/enemies/long_wizard_run.png"), 4, 2)
-    frames += cut_sheet(load_image("assets/sprites/enemies/long_wizard_idle.png"), 4, 2)
+    frames = Asset('VoidWizard', AssetManager.frames, ("assets/sprites/enemies/long_wizard_run.png", 4, 2),
+                                                      ("assets/sprites/enemies/long_wizard_idle.png", 4, 2))
 
-    get_damage_frames = cut_sheet(load_image("assets/sprites/enemies/long_wizard_get_damage.png"), 2, 1)[0]
-    death_frames = cut_sheet(load_image("assets/sprites/enemies/long_wizard_dying.png"), 16, 1)[0]
+    get_damage_frames = Asset('VoidWizard', AssetManager.strip, "assets/sprites/enemies/long_wizard_get_damage.png", 2)
+    death_frames = Asset('VoidWizard', AssetManager.strip, "assets/sprites/enemies/long_wizard_dying.png", 16)
 
     default_speed = TILE_SIZE * 0.01
     look_directions = {
@@ -609,10 +628,10 @@ class VoidWizard(ShootingMonster):
         (1, 1): 0
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(2)
+    sounds_channel = Asset('VoidWizard', pygame.mixer.Channel, 2)
 
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/enemies/wizard_rustle.mp3")
+    FOOTSTEP_SOUND = Asset('VoidWizard', AssetManager.sound, "assets/audio/sfx/enemies/wizard_rustle.mp3")
 
     def __init__(self, x, y, level, *args):
         super().__init__(x, y, level, *args)
@@ -627,34 +646,128 @@ class VoidWizard(ShootingMonster):
         self.reload_time = self.reload_time * 4 / 3
 
 
-def random_monster(x, y, level, all_sprites, enemies_group, seed, user_seed):
-    if user_seed:
-        n = int(user_seed.pop(0))
-    else:
-        n = randint(1, round(35 - level * 2))
+class MonstersScheduler:
+    """
+    Планировщик обновлений монстров (уровни детализации ИИ):
+    - монстры в комнате игрока, а также проснувшиеся (в любой комнате)
+      и умирающие монстры обновляются каждый кадр;
+    - спящие монстры в соседних комнатах обновляются раз в REDUCED_RATE кадров,
+      но не больше UPDATES_BUDGET таких обновлений за кадр
+      (первыми обновляются те, кто ждал дольше);
+    - спящие монстры в остальных комнатах не обновляются вовсе.
+    Пропущенные кадры копятся у монстра в skipped_frames, а при обновлении
+    передаются в catch_up_frames, чтобы монстр прошёл путь за все эти кадры
+    """
+    REDUCED_RATE = 4
+    UPDATES_BUDGET = 8
+    # Ограничение на догоняемые кадры (чтобы не проскакивать сквозь стены)
+    MAX_CATCH_UP_FRAMES = REDUCED_RATE * 2
+
+    def __init__(self):
+        self.reduced_rate = MonstersScheduler.REDUCED_RATE
+        self.updates_budget = MonstersScheduler.UPDATES_BUDGET
+
+    def set_full_rate(self, full_rate: bool) -> None:
+        """
+        Метод меняет частоту обновления спящих монстров в соседних комнатах.
+        При нехватке времени кадра (см. QualityGovernor) они обновляются вдвое реже
+        и вдвое меньшими порциями. Монстры в комнате игрока всегда обновляются каждый кадр
+        :param full_rate: Обновлять ли с обычной частотой
+        """
+        factor = 1 if full_rate else 2
+        self.reduced_rate = MonstersScheduler.REDUCED_RATE * factor
+        self.updates_budget = MonstersScheduler.UPDATES_BUDGET // factor
+
+    def update(self, enemies_group: pygame.sprite.Group, player, rooms_graph) -> None:
+        """
+        Метод обновляет монстров в соответствии с их уровнем детализации
+        :param enemies_group: Группа врагов
+        :param player: Игрок
+        :param rooms_graph: Граф комнат уровня (с активными комнатами)
+        """
+        waiting = []
+        for monster in enemies_group.sprites():
+            # Умирающие монстры доигрывают анимацию смерти где бы они ни были
+            if not monster.alive:
+                self.update_monster(monster, player)
+                continue
+            # Проснувшиеся монстры преследуют игрока, в какой бы комнате они ни были
+            if monster.target_observed:
+                self.update_monster(monster, player)
+                continue
+            room = rooms_graph.get_room(monster.rect.center)
+            if room not in rooms_graph.active_rooms:
+                # Спящие монстры в дальних комнатах просто замирают, догонять им нечего
+                monster.skipped_frames = 0
+            elif room is rooms_graph.current_room:
+                self.update_monster(monster, player)
+            else:
+                monster.skipped_frames += 1
+                if monster.skipped_frames >= self.reduced_rate:
+                    waiting.append(monster)
+
+        waiting.sort(key=lambda m: m.skipped_frames, reverse=True)
+        for monster in waiting[:self.updates_budget]:
+            # Текущий кадр уже учтён в skipped_frames
+            monster.skipped_frames -= 1
+            self.update_monster(monster, player)
+
+    @staticmethod
+    def update_monster(monster: Monster, player) -> None:
+        """
+        Метод обновляет монстра с учётом пропущенных им кадров
+        :param monster: Монстр
+        :param player: Игрок
+        """
+        monster.catch_up_frames = min(monster.skipped_frames + 1, MonstersScheduler.MAX_CATCH_UP_FRAMES)
+        monster.skipped_frames = 0
+        monster.update(player)
+        monster.catch_up_frames = 1
+
+
+def random_monster_type(level, rng) -> int:
+    """
+    Функция выбирает тип монстра генератором монстров комнаты.
+    Тип выбирается для каждой клетки монстра (даже убитого), чтоб
+    последовательность выборов в комнате не менялась
+    :param level: Номер уровня
+    :param rng: Генератор случайных чисел монстров комнаты
+    :return: Тип монстра (0 - монстра нет)
+    """
+    n = rng.randint(1, round(35 - level * 2))
+    # Специально, чтоб монстры спавнились в этом месте не со 100% шансом
+    if not 1 <= n <= 10:
+        n = 0
+    return n
+
+
+# Классы монстров по типу (см. random_monster_type)
+MONSTER_CLASSES = (None, Demon, Demon, GreenSlime, GreenSlime, DirtySlime,
+                   Zombie, Zombie, FireWizard, FireWizard, VoidWizard)
+
+
+def monster_bundles(monster_types) -> list:
+    """
+    Функция возвращает наборы ресурсов (см. AssetManager) для переданных типов монстров
+    :param monster_types: Типы монстров уровня
+    :return: Названия наборов
+    """
+    classes = {MONSTER_CLASSES[n] for n in monster_types if n}
+    # Тёмный маг призывает зомби и демонов
+    if VoidWizard in classes:
+        classes |= {Zombie, Demon}
+    return [monster_class.__name__ for monster_class in classes]
+
+
+def spawn_monster(n, x, y, level, destroyed_objects, index_on_level, all_sprites, enemies_group):
     args = (x * TILE_SIZE + TILE_SIZE * 0.5, y * TILE_SIZE + TILE_SIZE * 0.5,
-            level - 1, seed, all_sprites, enemies_group)
-
-    if n in (1, 2):
-        monster = Demon(*args)
-    elif n in (3, 4):
-        monster = GreenSlime(*args)
-    elif n in (5,):
-        monster = DirtySlime(*args)
-    elif n in (6, 7):
-        monster = Zombie(*args)
-    elif n in (8, 9):
-        monster = FireWizard(*args)
-    elif n in (10,):
-        monster = VoidWizard(*args)
-    else:
-        # Специально, чтоб монстры спавнились в этом месте не со 100% шансом
-        seed.append('0')
+            level - 1, destroyed_objects, all_sprites, enemies_group)
+
+    if not 1 <= n < len(MONSTER_CLASSES):
         return None
+    monster = MONSTER_CLASSES[n](*args)
 
-    # Запишем получившееся значение в сид
-    seed.append(str(n))
-    monster.index_in_seed = len(seed) - 1
-    # Возвращаем монстра, записав ему параметр Индекс в сиде,
-    # Чтоб после его смерти удалить его из save.txt
+    monster.index_on_level = index_on_level
+    # Возвращаем монстра, записав ему его номер на уровне,
+    # Чтоб после его смерти отметить его в битовой карте убитых (и не создавать при загрузке)
     return monster
@@ -2,7 +2,8 @@ from random import randint
 
 import pygame
 
-from engine import load_image, load_sound, load_game_font, true_with_chance
+from engine import true_with_chance
+from assets import AssetManager, Asset
 from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
 from entities.base_entities import Collider
 
@@ -11,18 +12,18 @@ class GroundItem(pygame.sprite.Sprite):
     sprites_group: pygame.sprite.Group
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(1)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 1)
     # Звуки
-    SOUNDS = {
-        "meat": load_sound("assets/audio/sfx/items/meat_sound_1.mp3"),
-        "money": load_sound("assets/audio/sfx/items/money_sound.mp3"),
-    }
+    SOUNDS = Asset('game', lambda: {
+        "meat": AssetManager.sound("assets/audio/sfx/items/meat_sound_1.mp3"),
+        "money": AssetManager.sound("assets/audio/sfx/items/money_sound.mp3"),
+    })
     # Изображения
     size = (int(TILE_SIZE * 0.6),) * 2
-    IMAGES = {
-        "meat":  load_image("assets/sprites/items/meat.png", size),
-        "money": load_image("assets/sprites/items/money.png", size),
-    }
+    IMAGES = Asset('game', AssetManager.images, {
+        "meat":  "assets/sprites/items/meat.png",
+        "money": "assets/sprites/items/money.png",
+    }, size)
 
     def __init__(self, item_type: str, count: int, x: float, y: float, all_sprites, *groups):
         super().__init__(all_sprites, GroundItem.sprites_group, *groups)
@@ -46,7 +47,7 @@ class GroundItem(pygame.sprite.Sprite):
                 self.count = self.count + other.count
                 other.kill()
 
-        font = load_game_font(32)
+        font = AssetManager.font(32)
 
         if self.count > 1:
             count_text = font.render(str(self.count), True, (255, 255, 255))
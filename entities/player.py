@@ -3,6 +3,7 @@ from math import dist
 from entities.enemies import *
 from entities.base_entities import *
 from engine import *
+from assets import AssetManager, Asset
 from config import *
 
 
@@ -38,13 +39,13 @@ class Player(Entity):
     delta_changer = 0.3
     size = (TILE_SIZE * 7 // 8, TILE_SIZE)  # размер для анимаций ниже
     # Кадры анимации передвижений игрока
-    frames = cut_sheet(load_image("assets/sprites/player/player.png"), 4, 4, size)
+    frames = Asset('game', AssetManager.sheet, "assets/sprites/player/player.png", 4, 4, size)
     # Кадры анимации использования заклинаний игроком
-    cast_frames = cut_sheet(load_image("assets/sprites/player/player_cast.png"), 5, 4, size)
+    cast_frames = Asset('game', AssetManager.sheet, "assets/sprites/player/player_cast.png", 5, 4, size)
     # Кадры анимации получения урона игроком
-    get_damage_frames = cut_sheet(load_image("assets/sprites/player/player_get_damage.png"), 4, 1, size)[0]
+    get_damage_frames = Asset('game', AssetManager.strip, "assets/sprites/player/player_get_damage.png", 4, size)
     # Кадры анимации смерти игрока
-    death_frames = cut_sheet(load_image("assets/sprites/player/player_death.png"), 28, 1, size)[0]
+    death_frames = Asset('game', AssetManager.strip, "assets/sprites/player/player_death.png", 28, size)
     # Словарь типа (направлениями взгляда): *индекс ряда в frames для анимации*
     look_directions = {
         (-1, -1): 3,
@@ -58,11 +59,11 @@ class Player(Entity):
         (1, 1): 2
     }
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(1)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 1)
     # Звуки
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/player/footstep.ogg")
-    DASH_SOUND = load_sound("assets/audio/sfx/player/dash.wav")
-    NO_MANA_SOUND = load_sound("assets/audio/sfx/player/no_mana_sound.ogg")
+    FOOTSTEP_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/player/footstep.ogg")
+    DASH_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/player/dash.wav")
+    NO_MANA_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/player/no_mana_sound.ogg")
 
     def __init__(self, x: float, y: float, level: int, all_sprites: pygame.sprite.Group,
                  health=0, mana=0, money=0):
@@ -122,18 +123,6 @@ class Player(Entity):
         # Установка начального состояния джойстика
         self.joystick = get_joystick() if check_any_joystick() else None
 
-    def __str__(self):
-        # Разница
-        delta_pos = self.rect.centerx - self.start_position[0], self.rect.centery - self.start_position[1]
-        # Аргументы игрока для строковых данных
-        player_args = [*delta_pos, self.level, self.health, self.mana, self.money, len(self.assistants)]
-        args = [" ".join(map(str, player_args))]
-        # Аргументы асистентов
-        for assistant in self.assistants:
-            assistant: PlayerAssistant
-            args.append(str(assistant))
-        return "\n".join(args)
-
     def update(self):
         if self.alive:
             # Увеличение параметров маны и здоровья
@@ -335,8 +324,8 @@ class Player(Entity):
         # Обновление прицела
         self.scope.update(new_scope_x, new_scope_y)
 
-    def draw(self, screen):
-        screen.blit(self.image, self.rect.topleft)
+    def draw(self, render_queue):
+        render_queue.add(self.image, Entity.camera.apply(self.rect))
 
     def add_assistant(self, assistant) -> None:
         self.assistants.add(assistant)
@@ -350,10 +339,12 @@ class Player(Entity):
         if current_ticks - Player.between_shoots_range < self.shoot_last_time:
             return
 
+        # Прицел находится в координатах экрана, а заклинания - в мировых
+        scope_x, scope_y = Entity.camera.screen_to_world(self.scope.rect.center)
         # Получение угла относительно прицела и оружия
-        dx, dy = self.rect.centerx - self.scope.rect.centerx, self.rect.centery - self.scope.rect.centery
+        dx, dy = self.rect.centerx - scope_x, self.rect.centery - scope_y
         angle = (degrees(atan2(dx, 0.00001 if not dy else dy)) + 360) % 360
-        args_for_spell = (*self.rect.center, *self.scope.rect.center, self.extra_damage, group, Entity.all_sprites)
+        args_for_spell = (*self.rect.center, scope_x, scope_y, self.extra_damage, group, Entity.all_sprites)
         # Получение класса заклинания взависимости от типа заклинания.
         # (Сам класс нужен чтобы получить параметры и инициализировать заклинание)
         if spell_type == Spell.FIRE:
@@ -370,7 +361,7 @@ class Player(Entity):
             CurrentSpellClass = TeleportSpell
             # Для телепорта параметры отличаются, т.к. само заклинание
             # телепорта отличается от всех остальных
-            args_for_spell = (*self.rect.center, *self.scope.rect.center, self.extra_damage, [self], Entity.all_sprites)
+            args_for_spell = (*self.rect.center, scope_x, scope_y, self.extra_damage, [self], Entity.all_sprites)
         else:
             return
         # Если достаточно маны заклинание появится
@@ -378,8 +369,8 @@ class Player(Entity):
             # Если заклинание телепорт, то нельзя позволить игроку
             # переместиться куда не надо, например в текстуры
             if spell_type == Spell.TELEPORT:
-                self.collider.update(*self.scope.rect.center)
-                if (pygame.sprite.spritecollideany(self.collider, Entity.collisions_group)
+                self.collider.update(scope_x, scope_y)
+                if (Entity.collisions_group.collide_any(self.collider.rect)
                         or not pygame.sprite.spritecollideany(self.collider, group)):
                     # Если препятствие не даёт телепортироваться, то звук
                     # тот же, что и при нехватке маны
@@ -505,13 +496,13 @@ class PlayerAssistant(Player):
     # Размер помошника игрока
     size = (TILE_SIZE * 6 // 8, TILE_SIZE * 7 // 8)
     # Кадры перемещения
-    frames = cut_sheet(load_image("assets/sprites/assistant/assistant.png"), 4, 4, size)
+    frames = Asset('game', AssetManager.sheet, "assets/sprites/assistant/assistant.png", 4, 4, size)
     # Кадры атаки заклинанием
-    cast_frames = cut_sheet(load_image("assets/sprites/assistant/assistant_cast.png"), 5, 4, size)
+    cast_frames = Asset('game', AssetManager.sheet, "assets/sprites/assistant/assistant_cast.png", 5, 4, size)
     # Кадры получения урона
-    get_damage_frames = cut_sheet(load_image("assets/sprites/assistant/assistant_get_damage.png"), 4, 1, size)[0]
+    get_damage_frames = Asset('game', AssetManager.strip, "assets/sprites/assistant/assistant_get_damage.png", 4, size)
     # Кадры смерти
-    death_frames = cut_sheet(load_image("assets/sprites/assistant/assistant_death.png"), 28, 1, size)[0]
+    death_frames = Asset('game', AssetManager.strip, "assets/sprites/assistant/assistant_death.png", 28, size)
     # Переменные добавляющие эти значения к здоровью и мане каждую итерацию update()
     MANA_UP = 0.4
     HEALTH_UP = 0.1
@@ -575,11 +566,11 @@ class PlayerAssistant(Player):
     # сила с которой асистент будет набирать/уменьшать свою скорость
     DELTA_CHANGER = 0.3
     # Шрифт
-    font = load_game_font(32)
+    font = Asset('game', AssetManager.font, 32)
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(7)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 7)
     # Звук ходьбы
-    FOOTSTEP_SOUND = load_sound("assets/audio/sfx/assistant/footstep.ogg")
+    FOOTSTEP_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/assistant/footstep.ogg")
 
     def __init__(self, x, y, player, all_sprites, health=0, mana=0, name=()):
         # Получение параметров и приведение к нужному типу (т.к. на вход могут
@@ -628,10 +619,6 @@ class PlayerAssistant(Player):
         self.last_hit_time = 0
         self.last_target_update = 0
 
-    def __str__(self):
-        args = [*self.rect.center, self.health, self.mana, self.name]
-        return " ".join(map(str, args))
-
     def update(self, *args):
         if self.alive:
             # Регенерация здоровья и маны
@@ -776,18 +763,8 @@ class PlayerAssistant(Player):
     def update_target(self, enemies_group) -> Monster:
         self.last_target_update = pygame.time.get_ticks() + randint(-10, 10)
 
-        min_dist_to_enemy = self.visible_range + 1
-        nearest_enemy = None
-        for enemy in enemies_group:
-            if not enemy.alive:
-                continue
-
-            dist_to_enemy = dist(self.rect.center, enemy.rect.center)
-            if dist_to_enemy < min_dist_to_enemy:
-                min_dist_to_enemy = dist_to_enemy
-                nearest_enemy = enemy
-
-        return nearest_enemy
+        # Поиск по сетке врагов (перестраивается каждый кадр в игровом цикле)
+        return Entity.enemies_grid.nearest(self.rect.center, self.visible_range + 1)
 
     # Метод по обработке смерти асистента
     def death(self):
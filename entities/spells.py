@@ -3,7 +3,8 @@ from random import randint, choice
 
 import pygame
 
-from engine import load_image, load_sound, cut_sheet
+from engine import segment_rect_intersection
+from assets import AssetManager, Asset
 from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
 
 from entities.base_entities import Collider, Entity
@@ -22,8 +23,8 @@ class Spell(pygame.sprite.Sprite):
 
     # Номер кадра анимации, на котором происходит действие (телепортация, урон, хил)
     damage_frame = 0
-
-    start_position = None
+    # Дальность полёта заклинания (чтобы оно летело далеко за пределы экрана)
+    FLIGHT_DISTANCE = 5000
 
     def __init__(self, subject_x: float, subject_y: float, object_x: float, object_y: float, extra_damage: float,
                  object_group, all_spites, *groups):
@@ -32,11 +33,12 @@ class Spell(pygame.sprite.Sprite):
         dy = object_y - subject_y
         # Увеличиваем расстояние пропорционально
         # Чтобы заклинание летело далеко за пределы экрана, а не просто к курсору
-        while (abs(dx) < 5000 and abs(dy) < 5000) and (self.spell_type != Spell.FLASH and
-                                                       self.spell_type != Spell.TELEPORT):
-            dx *= 2
-            dy *= 2
-            dy += 1
+        if self.spell_type != Spell.FLASH and self.spell_type != Spell.TELEPORT:
+            if not dx and not dy:
+                dy = 1
+            k = Spell.FLIGHT_DISTANCE / max(abs(dx), abs(dy))
+            dx *= k
+            dy *= k
         self.point = (subject_x + dx, subject_y + dy)
 
         # Увеличения урона/времени действия в зависимости от уровня существа
@@ -53,6 +55,11 @@ class Spell(pygame.sprite.Sprite):
             self.angle = 180 - degrees(atan(dy / min(dx, -0.00001)))
 
         self.object_group = object_group
+        # Цели для быстрой проверки принадлежности (object_group может быть списком)
+        if isinstance(object_group, pygame.sprite.AbstractGroup):
+            self.targets = object_group
+        else:
+            self.targets = set(object_group)
         self.cur_frame = 0
         self.cur_list = 0
         self.last_update_time = pygame.time.get_ticks()
@@ -93,8 +100,11 @@ class Spell(pygame.sprite.Sprite):
                         self.collider.update(*self.rect.center, size)
 
                     # Убиваем все заклинание-ломаемые вещи, которые задеваем
-                    pygame.sprite.spritecollide(self.collider, Spell.furniture_group, True)
-                    pygame.sprite.spritecollide(self.collider, Spell.doors_group, True)
+                    # (поиск идёт только по соседним клеткам сетки уровня)
+                    for obj in Spell.furniture_group.collide(self.collider.rect):
+                        obj.kill()
+                    for obj in Spell.doors_group.collide(self.collider.rect):
+                        obj.kill()
 
                     # Наносим урон группе объектов, на которых направлено заклинание
                     for obj in self.object_group:
@@ -134,29 +144,17 @@ class Spell(pygame.sprite.Sprite):
             self.rect.x = self.rect.x + dx
             self.rect.y = self.rect.y + dy
 
+            # Проверяем путь за этот кадр на всевозможные соприкосновения, от которых
+            # заклинание может умереть (молния и телепорт летят сквозь всё)
+            if self.spell_type != Spell.FLASH and self.spell_type != Spell.TELEPORT:
+                hit = self.sweep((self_x, self_y), self.rect.center)
+                if hit is not None:
+                    # Заклинание останавливается точно в месте попадания
+                    self.rect.center = (round(self_x + (self.rect.centerx - self_x) * hit),
+                                        round(self_y + (self.rect.centery - self_y) * hit))
+                    self.point = self.rect.center
             # Обновляем позицию коллайдера
             self.collider.update(*self.rect.center)
-            do_kill = False
-            # Проверяем на всевозможные соприкосновения, от которых заклинание может умереть
-            for obj in pygame.sprite.spritecollide(self.collider, self.object_group, False):
-                if obj.alive:
-                    do_kill = True
-            for obj in pygame.sprite.spritecollide(self.collider, Spell.barrier_group, False):
-                obj.collider.update(*obj.rect.center)
-                if pygame.sprite.collide_rect(self.collider, obj.collider):
-                    do_kill = True
-
-            for obj in pygame.sprite.spritecollide(self.collider, Spell.doors_group, False):
-                obj.collider.update(*obj.rect.center)
-                if not obj.opened:
-                    do_kill = True
-            for obj in pygame.sprite.spritecollide(self.collider, Spell.furniture_group, False):
-                obj.collider.update(*obj.rect.center)
-                if pygame.sprite.collide_rect(self.collider, obj.collider):
-                    do_kill = True
-
-            if do_kill and self.spell_type != Spell.FLASH and self.spell_type != Spell.TELEPORT:
-                self.point = self.rect.center
 
             # Проверяем, достигли ли объекта
             if self.rect.center == self.point:
@@ -177,6 +175,58 @@ class Spell(pygame.sprite.Sprite):
             if isinstance(self, TeleportSpell):
                 self.start_sprite.image = self.image
 
+    def sweep(self, start: tuple, end: tuple):
+        """
+        Метод "протягивает" коллайдер заклинания по отрезку пути за кадр и находит
+        первое столкновение с целью, стеной, закрытой дверью или ящиком.
+        Стены и двери ищутся обходом сетки уровня вдоль отрезка (SpatialGroup),
+        поэтому проверяются только клетки на пути заклинания, а быстрые
+        заклинания не пролетают сквозь тонкие преграды.
+        Ящики и сундуки тоже находятся в группе преград, поэтому отдельно не проверяются.
+        Цели берутся из сеток сущностей (Entity.enemies_grid и Entity.allies_grid)
+        только рядом с путём заклинания
+        :param start: Центр заклинания в начале кадра
+        :param end: Центр заклинания в конце кадра
+        :return: Параметр t (от 0 до 1) первого столкновения на отрезке или None
+        """
+        width, height = self.collider.rect.size
+        nearest_hit = None
+        # Область, которую заметает коллайдер за кадр (ограничивает запросы к сеткам)
+        swept_area = self.collider.rect.copy()
+        swept_area.center = start
+        swept_area.union_ip(swept_area.move(end[0] - start[0], end[1] - start[1]))
+        # Цели (сущности) двигаются, поэтому ищутся в сетках, которые перестраиваются каждый кадр.
+        # Заклинания магов задевают и врагов, и союзников, поэтому проверяются обе сетки
+        for grid in (Entity.enemies_grid, Entity.allies_grid):
+            for obj in grid.get_near_rect(swept_area):
+                if obj.alive and obj in self.targets:
+                    t = segment_rect_intersection(start, end, obj.rect.inflate(width, height))
+                    if t is not None and (nearest_hit is None or t < nearest_hit):
+                        nearest_hit = t
+        size = Spell.barrier_group.cell_size
+        checked = set()
+        for column, row in Spell.barrier_group.get_cells_on_segment(start, end):
+            # Клетка расширяется на размер коллайдера, чтобы учесть преграды,
+            # мимо которых заклинание пролетает вплотную
+            area = pygame.Rect(column * size, row * size, size, size).inflate(width, height).clip(swept_area)
+            for obj in Spell.barrier_group.collide(area):
+                if obj in checked:
+                    continue
+                checked.add(obj)
+                # Преграда задевается, если задет и её тайл, и её коллайдер
+                hitbox = obj.rect.clip(obj.collider.rect)
+                t = segment_rect_intersection(start, end, hitbox.inflate(width, height))
+                if t is not None and (nearest_hit is None or t < nearest_hit):
+                    nearest_hit = t
+            for obj in Spell.doors_group.collide(area):
+                if obj in checked or obj.opened:
+                    continue
+                checked.add(obj)
+                t = segment_rect_intersection(start, end, obj.rect.inflate(width, height))
+                if t is not None and (nearest_hit is None or t < nearest_hit):
+                    nearest_hit = t
+        return nearest_hit
+
     @staticmethod
     def set_global_collisions_group(barrier_group: pygame.sprite.Group):
         """
@@ -185,7 +235,7 @@ class Spell(pygame.sprite.Sprite):
         (Кроме индивидуальных спрайтов у конкретных объектов,
         например у врагов будет отдельное взаимодействие с игроком).
         Метод нужен при инициализации
-        :param barrier_group: Новая группа
+        :param barrier_group: Новая группа (SpatialGroup)
         """
         Spell.barrier_group = barrier_group
 
@@ -193,8 +243,8 @@ class Spell(pygame.sprite.Sprite):
     def set_global_breaking_group(doors_group, furniture_group):
         """
         Метод устанавливает группы со спрайтами, которые ломаются от соприкосновений с заклинанием
-        :param doors_group: Группа дверей
-        :param furniture_group: Группа ящиков и бочек
+        :param doors_group: Группа дверей (SpatialGroup)
+        :param furniture_group: Группа ящиков и бочек (SpatialGroup)
         :return: None
         """
         Spell.doors_group = doors_group
@@ -218,21 +268,23 @@ class FireSpell(Spell):
     action_time = 0
 
     size = (TILE_SIZE // 4 * 3,) * 2
-    frames = cut_sheet(load_image("assets/sprites/spells/fire_laser.png"), 6, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/fire_explosion.png"), 7, 9, size)
+    frames = Asset('game', AssetManager.frames, ("assets/sprites/spells/fire_laser.png", 6, 1),
+                                                ("assets/sprites/spells/fire_explosion.png", 7, 9),
+                                                size=size)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
 
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/cast_sound_2.ogg")
-    SPELL_SOUNDS = (
-        load_sound("assets/audio/sfx/spells/spell_sound_1.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_3.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_4.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_5.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_14.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_24.ogg"),
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/cast_sound_2.ogg")
+    SPELL_SOUNDS = Asset(
+        'game', AssetManager.sounds,
+        "assets/audio/sfx/spells/spell_sound_1.ogg",
+        "assets/audio/sfx/spells/spell_sound_3.ogg",
+        "assets/audio/sfx/spells/spell_sound_4.ogg",
+        "assets/audio/sfx/spells/spell_sound_5.ogg",
+        "assets/audio/sfx/spells/spell_sound_14.ogg",
+        "assets/audio/sfx/spells/spell_sound_24.ogg",
     )
 
 
@@ -254,22 +306,24 @@ class IceSpell(Spell):
     action_time = 500
 
     size = (TILE_SIZE // 4 * 3,) * 2
-    frames = cut_sheet(load_image("assets/sprites/spells/ice_laser.png"), 30, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/ice_explosion.png"), 28, 1, size)
+    frames = Asset('game', AssetManager.frames, ("assets/sprites/spells/ice_laser.png", 30, 1),
+                                                ("assets/sprites/spells/ice_explosion.png", 28, 1),
+                                                size=size)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/cast_sound_1.ogg")
-    SPELL_SOUNDS = (
-        load_sound("assets/audio/sfx/spells/spell_sound_2.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_12.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_18.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_19.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_20.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_21.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_22.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_26.ogg"),
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/cast_sound_1.ogg")
+    SPELL_SOUNDS = Asset(
+        'game', AssetManager.sounds,
+        "assets/audio/sfx/spells/spell_sound_2.ogg",
+        "assets/audio/sfx/spells/spell_sound_12.ogg",
+        "assets/audio/sfx/spells/spell_sound_18.ogg",
+        "assets/audio/sfx/spells/spell_sound_19.ogg",
+        "assets/audio/sfx/spells/spell_sound_20.ogg",
+        "assets/audio/sfx/spells/spell_sound_21.ogg",
+        "assets/audio/sfx/spells/spell_sound_22.ogg",
+        "assets/audio/sfx/spells/spell_sound_26.ogg",
     )
 
 
@@ -292,24 +346,26 @@ class PoisonSpell(Spell):
     acceleration = 0.5
 
     size = (TILE_SIZE // 4 * 3,) * 2
-    frames = cut_sheet(load_image("assets/sprites/spells/poison_laser.png"), 7, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/poison_explosion.png"), 11, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/poison_explosion_1.png"), 25, 1, size)
+    frames = Asset('game', AssetManager.frames, ("assets/sprites/spells/poison_laser.png", 7, 1),
+                                                ("assets/sprites/spells/poison_explosion.png", 11, 1),
+                                                ("assets/sprites/spells/poison_explosion_1.png", 25, 1),
+                                                size=size)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
 
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/cast_sound_3.ogg")
-    SPELL_SOUNDS = (
-        load_sound("assets/audio/sfx/spells/spell_sound_1.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_12.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_13.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_17.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_23.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_24.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_26.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_27.ogg"),
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/cast_sound_3.ogg")
+    SPELL_SOUNDS = Asset(
+        'game', AssetManager.sounds,
+        "assets/audio/sfx/spells/spell_sound_1.ogg",
+        "assets/audio/sfx/spells/spell_sound_12.ogg",
+        "assets/audio/sfx/spells/spell_sound_13.ogg",
+        "assets/audio/sfx/spells/spell_sound_17.ogg",
+        "assets/audio/sfx/spells/spell_sound_23.ogg",
+        "assets/audio/sfx/spells/spell_sound_24.ogg",
+        "assets/audio/sfx/spells/spell_sound_26.ogg",
+        "assets/audio/sfx/spells/spell_sound_27.ogg",
     )
 
 
@@ -331,24 +387,27 @@ class VoidSpell(Spell):
     action_time = 0
 
     size = (TILE_SIZE * 3,) * 2
-    frames = cut_sheet(load_image("assets/sprites/spells/void_laser.png"), 10, 1)
-    frames += cut_sheet(load_image("assets/sprites/spells/void_explosion.png"), 12, 2, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/void_explosions.png"), 10, 5, size)
+    # Лазер в размер тайла, взрывы в размер size (переменные класса не видны в lambda)
+    frames = Asset('game', lambda: AssetManager.sheet("assets/sprites/spells/void_laser.png", 10, 1) +
+                   AssetManager.frames(("assets/sprites/spells/void_explosion.png", 12, 2),
+                                       ("assets/sprites/spells/void_explosions.png", 10, 5),
+                                       size=(TILE_SIZE * 3,) * 2))
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
 
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/cast_sound_5.ogg")
-    SPELL_SOUNDS = (
-        load_sound("assets/audio/sfx/spells/spell_sound_2.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_5.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_14.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_15.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_16.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_17.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_18.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_25.ogg"),
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/cast_sound_5.ogg")
+    SPELL_SOUNDS = Asset(
+        'game', AssetManager.sounds,
+        "assets/audio/sfx/spells/spell_sound_2.ogg",
+        "assets/audio/sfx/spells/spell_sound_5.ogg",
+        "assets/audio/sfx/spells/spell_sound_14.ogg",
+        "assets/audio/sfx/spells/spell_sound_15.ogg",
+        "assets/audio/sfx/spells/spell_sound_16.ogg",
+        "assets/audio/sfx/spells/spell_sound_17.ogg",
+        "assets/audio/sfx/spells/spell_sound_18.ogg",
+        "assets/audio/sfx/spells/spell_sound_25.ogg",
     )
 
 
@@ -370,26 +429,28 @@ class FlashSpell(Spell):
     action_time = 0
 
     size = (TILE_SIZE // 2 * 2, TILE_SIZE // 2 * 5)
-    frames = cut_sheet(load_image("assets/sprites/tiles/EMPTY.png"), 1, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/light.png"), 15, 1, size)
+    frames = Asset('game', AssetManager.frames, ("assets/sprites/tiles/EMPTY.png", 1, 1),
+                                                ("assets/sprites/spells/light.png", 15, 1),
+                                                size=size)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
 
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/cast_sound_4.ogg")
-    SPELL_SOUNDS = (
-        load_sound("assets/audio/sfx/spells/spell_sound_3.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_4.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_5.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_6.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_7.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_8.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_9.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_10.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_11.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_14.ogg"),
-        load_sound("assets/audio/sfx/spells/spell_sound_26.ogg"),
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/cast_sound_4.ogg")
+    SPELL_SOUNDS = Asset(
+        'game', AssetManager.sounds,
+        "assets/audio/sfx/spells/spell_sound_3.ogg",
+        "assets/audio/sfx/spells/spell_sound_4.ogg",
+        "assets/audio/sfx/spells/spell_sound_5.ogg",
+        "assets/audio/sfx/spells/spell_sound_6.ogg",
+        "assets/audio/sfx/spells/spell_sound_7.ogg",
+        "assets/audio/sfx/spells/spell_sound_8.ogg",
+        "assets/audio/sfx/spells/spell_sound_9.ogg",
+        "assets/audio/sfx/spells/spell_sound_10.ogg",
+        "assets/audio/sfx/spells/spell_sound_11.ogg",
+        "assets/audio/sfx/spells/spell_sound_14.ogg",
+        "assets/audio/sfx/spells/spell_sound_26.ogg",
     )
 
 
@@ -407,23 +468,22 @@ class TeleportSpell(Spell):
     action_time = 0
 
     size = (TILE_SIZE // 4 * 7,) * 2
-    frames = cut_sheet(load_image("assets/sprites/tiles/EMPTY.png"), 1, 1, size)
-    frames += cut_sheet(load_image("assets/sprites/spells/teleport_puf.png"), 8, 1, size)
+    frames = Asset('game', AssetManager.frames, ("assets/sprites/tiles/EMPTY.png", 1, 1),
+                                                ("assets/sprites/spells/teleport_puf.png", 8, 1),
+                                                size=size)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
 
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/teleport_sound.ogg")
-    SPELL_SOUNDS = (load_sound("assets/audio/sfx/spells/teleport_sound.ogg"), )
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/teleport_sound.ogg")
+    SPELL_SOUNDS = Asset('game', AssetManager.sounds, "assets/audio/sfx/spells/teleport_sound.ogg")
 
     def __init__(self, subject_x: float, subject_y: float, object_x: float, object_y: float, extra_damage: float,
                  object_group, *groups):
         super().__init__(subject_x, subject_y, object_x, object_y, extra_damage, object_group, *groups)
 
         self.start_sprite = pygame.sprite.Sprite()
-        self.start_sprite.start_position = None
-        self.start_sprite.point = None
         self.start_sprite.image = TeleportSpell.frames[0][0]
         self.start_sprite.rect = self.start_sprite.image.get_rect()
         self.start_sprite.rect.center = object_group[0].rect.center
@@ -435,7 +495,7 @@ class CallZombiesSpell(Spell):
     это просто спецэффект (в данном случае звуки)
     """
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(3)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 3)
     # Звуки
-    CAST_SOUND = load_sound("assets/audio/sfx/spells/call_zombies.ogg",
-                            volume=DEFAULT_SOUNDS_VOLUME * 1.5)
+    CAST_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/spells/call_zombies.ogg",
+                       volume=DEFAULT_SOUNDS_VOLUME * 1.5)
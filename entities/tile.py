@@ -3,8 +3,9 @@ from math import dist
 
 import pygame
 
-from engine import cut_sheet, load_image, load_sound, true_with_chance
-from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME
+from engine import true_with_chance
+from assets import AssetManager, Asset
+from config import TILE_SIZE, DEFAULT_SOUNDS_VOLUME, BACKGROUND_COLOR
 from entities.base_entities import Entity, Collider
 from entities.items import spawn_item
 
@@ -16,33 +17,40 @@ def load_tile(filename: str) -> pygame.surface.Surface:
     :param filename: Имя файла с тайлом
     :return: Поверхность, растянутого изображение
     """
-    image = load_image(f'assets/sprites/tiles/{filename}')
-    image = pygame.transform.scale(image, (TILE_SIZE, TILE_SIZE))
-    return image
+    return AssetManager.image(f'assets/sprites/tiles/{filename}', (TILE_SIZE, TILE_SIZE))
+
+
+def load_tiles(filenames: dict) -> dict:
+    """
+    Функция загружает тайлы по словарю с именами файлов
+    :param filenames: Словарь вида *тип тайла*: *имя файла*
+    :return: Словарь вида *тип тайла*: *поверхность тайла*
+    """
+    return {tile_type: load_tile(filename) for tile_type, filename in filenames.items()}
 
 
 class Tile(pygame.sprite.Sprite):
-    IMAGES = {
-        '1':  load_tile('RIGHT_WALL.png'),
-        '2':  load_tile('TOP_RIGHT_WALL_FLAT.png'),
-        '3':  load_tile('WALL.png'),
-        '4':  load_tile('TOP_LEFT_WALL_FLAT.png'),
-        '5':  load_tile('LEFT_WALL.png'),
-        '6':  load_tile('DOWN_LEFT_WALL.png'),
-        '7':  load_tile('DOWN_WALL.png'),
-        '8':  load_tile('DOWN_RIGHT_WALL.png'),
-        '9':  load_tile('TOP_RIGHT_WALL.png'),
-        '0':  load_tile('TOP_LEFT_WALL.png'),
-        '-':  load_tile('DOWN_LEFT_WALL_FLAT.png'),
-        '=':  load_tile('DOWN_RIGHT_WALL_FLAT.png'),
-        'P':  load_tile('UPSTAIRS.png'),
-        'E':  load_tile('DOWNSTAIRS.png'),
-        '.':  load_tile('FLOOR.png'),
-        '.0': load_tile('FLOOR_CRACKED_0.png'),
-        '.1': load_tile('FLOOR_CRACKED_1.png'),
-        '.2': load_tile('FLOOR_CRACKED_2.png'),
-        '.3': load_tile('FLOOR_CRACKED_3.png')
-    }
+    IMAGES = Asset('game', load_tiles, {
+        '1':  'RIGHT_WALL.png',
+        '2':  'TOP_RIGHT_WALL_FLAT.png',
+        '3':  'WALL.png',
+        '4':  'TOP_LEFT_WALL_FLAT.png',
+        '5':  'LEFT_WALL.png',
+        '6':  'DOWN_LEFT_WALL.png',
+        '7':  'DOWN_WALL.png',
+        '8':  'DOWN_RIGHT_WALL.png',
+        '9':  'TOP_RIGHT_WALL.png',
+        '0':  'TOP_LEFT_WALL.png',
+        '-':  'DOWN_LEFT_WALL_FLAT.png',
+        '=':  'DOWN_RIGHT_WALL_FLAT.png',
+        'P':  'UPSTAIRS.png',
+        'E':  'DOWNSTAIRS.png',
+        '.':  'FLOOR.png',
+        '.0': 'FLOOR_CRACKED_0.png',
+        '.1': 'FLOOR_CRACKED_1.png',
+        '.2': 'FLOOR_CRACKED_2.png',
+        '.3': 'FLOOR_CRACKED_3.png'
+    })
 
     def __init__(self, tile_type: str, x: float, y: float, *groups):
         super().__init__(*groups)
@@ -74,28 +82,108 @@ class Tile(pygame.sprite.Sprite):
 
         else:
             self.collider = Collider(x, y)
+        # Тайлы не двигаются, поэтому коллайдер сразу ставится в центр тайла
+        # (в мировых координатах) и больше не обновляется
+        self.collider.update(*self.rect.center)
+
+
+class StaticLayer:
+    """
+    Класс, представляющий статичный слой уровня (пол и стены).
+    Эти тайлы не меняются после создания, поэтому они один раз
+    "запекаются" в большие поверхности (чанки), а каждый кадр отрисовываются
+    только те чанки, которые попадают в область видимости камеры
+    """
+    # Сторона одного чанка (в тайлах)
+    CHUNK_TILES = 8
+
+    def __init__(self, *groups):
+        """
+        Инициализация (запекание слоя)
+        :param groups: Группы с тайлами в порядке отрисовки (сначала пол, потом стены).
+        Спрайты, которые не являются тайлами (ящики, сундуки), пропускаются
+        """
+        self.chunk_size = StaticLayer.CHUNK_TILES * TILE_SIZE
+        # Словарь типа (колонка чанка, ряд чанка): поверхность чанка.
+        # Чанки без тайлов не создаются (например, пустые комнаты)
+        self.chunks = {}
+        # Уменьшенные копии чанков (для отрисовки в уменьшенном разрешении):
+        # (колонка чанка, ряд чанка): {масштаб: копия}
+        self.scaled_chunks = {}
+        for group in groups:
+            self.bake(group)
+
+    def bake(self, tiles) -> None:
+        """
+        Метод дорисовывает тайлы в чанки (например, когда создаётся новая комната)
+        :param tiles: Группа (или список) тайлов
+        """
+        for tile in tiles:
+            if not isinstance(tile, Tile):
+                continue
+            key = tile.rect.x // self.chunk_size, tile.rect.y // self.chunk_size
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                # Чанк непрозрачный, т.к. под тайлами всё равно фон,
+                # а непрозрачные поверхности рисуются быстрее
+                chunk = pygame.surface.Surface((self.chunk_size, self.chunk_size)).convert()
+                chunk.fill(BACKGROUND_COLOR)
+                self.chunks[key] = chunk
+            chunk.blit(tile.image, (tile.rect.x - key[0] * self.chunk_size,
+                                    tile.rect.y - key[1] * self.chunk_size))
+            # Уменьшенные копии чанка устарели
+            self.scaled_chunks.pop(key, None)
+
+    def get_scaled_chunk(self, key: tuple, scale: int) -> pygame.surface.Surface:
+        """
+        Метод возвращает уменьшенную копию чанка (копия создаётся один раз)
+        :param key: Колонка и ряд чанка
+        :param scale: Во сколько раз уменьшить чанк
+        :return: Уменьшенный чанк
+        """
+        copies = self.scaled_chunks.setdefault(key, {})
+        if scale not in copies:
+            copies[scale] = pygame.transform.scale(self.chunks[key], (self.chunk_size // scale,) * 2)
+        return copies[scale]
+
+    def draw(self, screen: pygame.surface.Surface, scale: int = 1) -> None:
+        """
+        Отрисовка чанков, пересекающихся с областью видимости камеры
+        :param screen: Экран (или поверхность уменьшенного разрешения)
+        :param scale: Во сколько раз уменьшено разрешение поверхности
+        """
+        view = Entity.camera.get_view_rect()
+        size = self.chunk_size
+        blits = []
+        for chunk_y in range(view.top // size, (view.bottom - 1) // size + 1):
+            for chunk_x in range(view.left // size, (view.right - 1) // size + 1):
+                key = chunk_x, chunk_y
+                if key in self.chunks:
+                    chunk = self.chunks[key] if scale == 1 else self.get_scaled_chunk(key, scale)
+                    blits.append((chunk, ((chunk_x * size - view.x) // scale, (chunk_y * size - view.y) // scale)))
+        screen.blits(blits, False)
 
 
 class Furniture(pygame.sprite.Sprite):
-    IMAGES = {
-        'B1':  load_tile('BARREL.png'),
-        'B2': load_tile('BOX.png'),
-        'B3':  load_tile('BOX_1.png'),
-    }
+    IMAGES = Asset('game', load_tiles, {
+        'B1':  'BARREL.png',
+        'B2': 'BOX.png',
+        'B3':  'BOX_1.png',
+    })
 
-    def __init__(self, tile_type: str, x: float, y: float, new_boxes_seed, index, *groups):
+    def __init__(self, tile_type: str, x: float, y: float, destroyed_objects, index, *groups):
         super().__init__(*groups)
-        # Сохраняем ссылку на сид и индекс, чтоб потом удалить по индексу из сида этот ящик,
-        # если он будет разрушен
-        self.seed = new_boxes_seed
+        # Сохраняем ссылку на битовую карту уничтоженных объектов и номер ящика,
+        # чтоб отметить его, если он будет разрушен
+        self.destroyed_objects = destroyed_objects
         self.index = index
         self.image = Furniture.IMAGES[tile_type]
         self.rect = self.image.get_rect().move(x * TILE_SIZE, y * TILE_SIZE)
-        self.collider = Collider(x, y)
+        self.collider = Collider(*self.rect.center)
 
     def kill(self):
-        # Убираем из сида, чтоб в следующей игре они не появились
-        self.seed[self.index] = '0'
+        # Отмечаем как уничтоженный, чтоб в следующей игре он не появился
+        self.destroyed_objects.add(self.index)
 
         # С малым щансом выпадают вещи
         if true_with_chance(5):
@@ -104,16 +192,15 @@ class Furniture(pygame.sprite.Sprite):
 
 
 class Torch(pygame.sprite.Sprite):
-    frames = cut_sheet(load_image("assets/sprites/tiles/TORCH.png"), 8, 1, (round(TILE_SIZE / 4 * 3),) * 2)[0]
+    frames = Asset('game', AssetManager.strip, "assets/sprites/tiles/TORCH.png", 8, (round(TILE_SIZE / 4 * 3),) * 2)
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(0)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 0)
     min_distance_to_player = 100
     update_sounds_channel = 0
 
     # Звуки
-    BURNING_SOUND = load_sound("assets/audio/sfx/world/torch_sound.mp3")
-    BURNING_SOUND.set_volume(DEFAULT_SOUNDS_VOLUME)
+    BURNING_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/world/torch_sound.mp3")
 
     def __init__(self, x: float, y: float, *groups):
         super().__init__(*groups)
@@ -123,14 +210,15 @@ class Torch(pygame.sprite.Sprite):
         self.cur_frame = 0
         self.update_time = pygame.time.get_ticks()
 
-    def update(self, player=None) -> None:
+    def update(self, player=None, animate: bool = True) -> None:
         ticks = pygame.time.get_ticks()
         # Через каждые назначенные промежутки времени обновляем минимальное расстояние до игрока
         if ticks - Torch.update_sounds_channel > 100:
             Torch.update_sounds_channel = ticks + randint(-20, 20)
             Torch.min_distance_to_player = 100
             return
-        if ticks - self.update_time > 100:
+        # Анимация отключается при нехватке времени кадра (см. QualityGovernor)
+        if animate and ticks - self.update_time > 100:
             self.update_time = pygame.time.get_ticks()
             while 1:
                 n = randint(0, len(self.frames) - 1)
@@ -148,25 +236,34 @@ class Torch(pygame.sprite.Sprite):
 
 
 class Door(pygame.sprite.Sprite):
-    frames = [load_tile('DOOR.png'), load_tile('EMPTY.png')]
+    frames = Asset('game', lambda: [load_tile('DOOR.png'), load_tile('EMPTY.png')])
 
     # Канал для звуков
-    sounds_channel = pygame.mixer.Channel(0)
+    sounds_channel = Asset('game', pygame.mixer.Channel, 0)
     min_distance_to_player = 100
     update_sounds_channel = 0
 
     # Звуки
-    OPEN_SOUND = load_sound("assets/audio/sfx/world/door_open.mp3")
-    CLOSE_SOUND = load_sound("assets/audio/sfx/world/door_close.mp3")
+    OPEN_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/world/door_open.mp3")
+    CLOSE_SOUND = Asset('game', AssetManager.sound, "assets/audio/sfx/world/door_close.mp3")
 
-    def __init__(self, x: float, y: float, *groups):
+    def __init__(self, x: float, y: float, destroyed_objects, index, *groups):
         super().__init__(*groups)
+        # Сохраняем ссылку на битовую карту уничтоженных объектов и номер двери,
+        # чтоб отметить её, если она будет сломана заклинанием
+        self.destroyed_objects = destroyed_objects
+        self.index = index
         self.image = Door.frames[0]
         self.rect = self.image.get_rect().move(x * TILE_SIZE, y * TILE_SIZE)
-        self.collider = Collider(x, y)
+        self.collider = Collider(*self.rect.center)
 
         self.opened = False
 
+    def kill(self):
+        # Отмечаем как уничтоженную, чтоб в следующей игре она не появилась
+        self.destroyed_objects.add(self.index)
+        super().kill()
+
     def update(self, player=None, enemies_group=None, player_group=None) -> None:
         ticks = pygame.time.get_ticks()
         if ticks - Door.update_sounds_channel > 100:
@@ -206,15 +303,15 @@ class Door(pygame.sprite.Sprite):
 
 class Chest(pygame.sprite.Sprite):
     size = (TILE_SIZE, TILE_SIZE)
-    frames = cut_sheet(load_image("assets/sprites/tiles/CHEST.png"), 8, 1, size)[0]
-    back_of_chest = load_tile('back_of_chest.png')
+    frames = Asset('game', AssetManager.strip, "assets/sprites/tiles/CHEST.png", 8, size)
+    back_of_chest = Asset('game', load_tile, 'back_of_chest.png')
     chest_group: pygame.sprite.Group
     UPDATE_TIME = 40
 
-    def __init__(self, x, y, new_boxes_seed, index, *args):
+    def __init__(self, x, y, destroyed_objects, index, *args):
         super().__init__(Chest.chest_group, *args)
-        # Сохраняем индекс и сид, чтоб потом убрать из сида сундук, как открытый
-        self.seed = new_boxes_seed
+        # Сохраняем номер и битовую карту, чтоб потом отметить сундук, как открытый
+        self.destroyed_objects = destroyed_objects
         self.index = index
         self.opened = False
         self.last_update_time = 0
@@ -225,10 +322,11 @@ class Chest(pygame.sprite.Sprite):
         self.back_image = self.back_of_chest.copy()
         self.rect = self.image.get_rect().move(x * TILE_SIZE, y * TILE_SIZE)
         self.back_image_rect = self.back_image.get_rect()
-        self.collider = Collider(x, y)
+        self.collider = Collider(*self.rect.center)
 
-    def draw_back_image(self, screen):
-        screen.blit(self.back_image, self.rect)
+    def draw_back_image(self, render_queue):
+        if Entity.camera.is_visible(self.rect):
+            render_queue.add(self.back_image, Entity.camera.apply(self.rect))
 
     def open(self):
         self.opened = True
@@ -245,10 +343,10 @@ class Chest(pygame.sprite.Sprite):
             # Чтоб анимация замедлялась
             self.update_time *= 1.2
 
-            # Если первый фрейм, убираем из сида и спавним предмет
+            # Если первый фрейм, отмечаем как открытый и спавним предмет
             if self.current_frame == 0:
                 spawn_item(*self.rect.center, all_sprites=Entity.all_sprites, k=5)
-                self.seed[self.index] = '0'
+                self.destroyed_objects.add(self.index)
 
             # Если изображения кончились, убиваем
             if self.current_frame >= len(self.frames):
@@ -1,97 +1,159 @@
-import os
 import time
 
 from config import *
-from engine import load_image, load_game_font, loading_screen, \
-    get_joystick, check_any_joystick
+from engine import LoadingScreen, QualityGovernor, get_joystick, check_any_joystick
+from assets import AssetManager, RenderQueue
 
 from entities.base_entities import *
-from entities.enemies import Monster
+from entities.enemies import Monster, MonstersScheduler, monster_bundles
 from entities.items import GroundItem
 from entities.player import Player, PlayerAssistant
 from entities.spells import *
-from entities.tile import Chest, load_tile
+from entities.tile import Chest, StaticLayer, load_tile
 
 from UI import end_screen, game_menu
 from UI.UI_components import SpellContainer, PlayerIcon, Message
 
-from generation_map import initialise_level, generate_new_level
+from generation_map import initialise_level, generate_new_level, level_monster_types, LevelPregenerator
+from saves import SaveData, pack_save, restore_world, save
+from profiler import frame_profiler
 
 
-# Функция записи сохранения
-def save(current_seed: str) -> None:
+class Camera:
     """
-    Функция записывает файл сохранения в data/save.txt
-    (Если папки data нет, то она создаётся)
-    :param current_seed: Данные о текущей игре
+    Класс, представляющий камеру.
+    Объекты на уровне хранят мировые координаты, а камера - это только
+    смещение вида, которое применяется в момент отрисовки
     """
-    if 'data' not in os.listdir():
-        os.mkdir('data')
-    with open('data/save.txt', 'w', encoding='utf-8') as file:
-        file.write(current_seed)
-
+    # Отступ вокруг экрана, в пределах которого объекты ещё отрисовываются
+    # (нужен, чтобы шкалы здоровья, имена и т.д. не пропадали у края экрана)
+    CULLING_MARGIN = TILE_SIZE
 
-class Camera:
-    """Класс, представляющий камеру"""
     def __init__(self, screen_size, speed_coefficient=0.5):
         """
         Инициализация
         :param screen_size: Размеры экрана
         :param speed_coefficient: Коэфицент скорости камеры
         """
-        # Сдвиг камеры (будет меняться при обновлении)
+        # Смещение камеры (накапливается при обновлении)
         self.dx = 0
         self.dy = 0
 
         self.screen_width, self.screen_height = screen_size
         self.speed_coefficient = speed_coefficient
+        # Видимая область с отступом (пересчитывается при обновлении)
+        self.visible_area = self.get_view_rect(Camera.CULLING_MARGIN)
+
+    def apply(self, rect: pygame.Rect) -> pygame.Rect:
+        """
+        Метод переводит прямоугольник из мировых координат в экранные
+        :param rect: Прямоугольник в мировых координатах
+        :return: Новый прямоугольник в экранных координатах
+        """
+        return rect.move(self.dx, self.dy)
+
+    def apply_point(self, point) -> tuple:
+        """
+        Метод переводит точку из мировых координат в экранные
+        :param point: Точка в мировых координатах
+        :return: Точка в экранных координатах
+        """
+        return point[0] + self.dx, point[1] + self.dy
 
-    def apply(self, sprite) -> None:
+    def screen_to_world(self, point) -> tuple:
         """
-        Метод сдвигает спрайт на смещение камеры
-        :param sprite: Спрайт, который надо сдвинуть
-        (к спрайтам относятся и внутреигровые объекты)
+        Метод переводит точку из экранных координат в мировые
+        (нужно, например, для прицела, который живёт в координатах экрана)
+        :param point: Точка в экранных координатах
+        :return: Точка в мировых координатах
         """
-        # Смещение
-        sprite.rect.x += self.dx
-        sprite.rect.y += self.dy
-        # Учёт сущностьей, которые могут менять своё положение в пространстве
-        if isinstance(sprite, (Entity, Spell)):
-            self.apply_point(sprite)
+        return point[0] - self.dx, point[1] - self.dy
 
-    def apply_point(self, obj) -> None:
+    def get_view_rect(self, margin: int = 0) -> pygame.Rect:
         """
-        Метод сдвигает точку спавна объекта и точку, к которой он движется
-        :param obj: Движущийся объект
+        Метод возвращает видимую область уровня (в мировых координатах)
+        :param margin: Дополнительный отступ со всех сторон
+        :return: Прямоугольник видимой области
         """
-        # Смещение точки спавна и точки движения, если они не заданы
-        if obj.start_position:
-            obj.start_position = obj.start_position[0] + self.dx, obj.start_position[1] + self.dy
-        if obj.point:
-            obj.point = obj.point[0] + self.dx, obj.point[1] + self.dy
+        return pygame.Rect(-self.dx - margin, -self.dy - margin,
+                           self.screen_width + margin * 2, self.screen_height + margin * 2)
+
+    def is_visible(self, rect: pygame.Rect) -> bool:
+        """
+        Метод проверяет, попадает ли объект в видимую область (с отступом)
+        :param rect: Прямоугольник объекта в мировых координатах
+        :return: True, если объект нужно отрисовывать
+        """
+        return self.visible_area.colliderect(rect)
+
+    def draw_group(self, render_queue: RenderQueue, group) -> None:
+        """
+        Метод добавляет группу спрайтов в очередь отрисовки со смещением камеры
+        (замена Group.draw, который рисует спрайты по их мировым координатам).
+        Спрайты за пределами видимой области пропускаются
+        :param render_queue: Очередь отрисовки слоя
+        :param group: Группа спрайтов
+        """
+        dx, dy = self.dx, self.dy
+        visible_area = self.visible_area
+        render_queue.blits += [(sprite.image, sprite.rect.move(dx, dy)) for sprite in group
+                               if visible_area.colliderect(sprite.rect)]
 
     def update(self, target) -> None:
         """
-        Метод позиционирует камеру на объекте target
+        Метод плавно позиционирует камеру на объекте target
         (т.е. подстраивает смещение под него)
         :param target: Объект относительно которого позиционируется камера
         """
-        self.dx = -round((target.rect.centerx - self.screen_width // 2) * self.speed_coefficient)
-        self.dy = -round((target.rect.centery - self.screen_height // 2) * self.speed_coefficient)
+        self.dx -= round((target.rect.centerx + self.dx - self.screen_width // 2) * self.speed_coefficient)
+        self.dy -= round((target.rect.centery + self.dy - self.screen_height // 2) * self.speed_coefficient)
+        self.visible_area = self.get_view_rect(Camera.CULLING_MARGIN)
+
+
+def get_world_screen(screen: pygame.surface.Surface, scale: int) -> pygame.surface.Surface:
+    """
+    Функция создаёт поверхность, в которую рисуется уровень (см. WORLD_RENDER_SCALE)
+    :param screen: Экран
+    :param scale: Во сколько раз разрешение уровня меньше разрешения экрана
+    :return: Поверхность уменьшенного разрешения (или сам экран, если масштаб 1)
+    """
+    if scale == 1:
+        return screen
+    width, height = screen.get_size()
+    return pygame.surface.Surface((width // scale, height // scale)).convert()
+
+
+def upscale_world(world_screen: pygame.surface.Surface, screen: pygame.surface.Surface, scale: int) -> None:
+    """
+    Функция растягивает уровень на экран ровно в scale раз, чтобы он совпадал
+    с тем, что рисуется поверх в разрешении экрана (шкалы здоровья, текст урона)
+    :param world_screen: Поверхность уменьшенного разрешения с уровнем
+    :param screen: Экран
+    :param scale: Во сколько раз разрешение уровня меньше разрешения экрана
+    """
+    width, height = world_screen.get_width() * scale, world_screen.get_height() * scale
+    pygame.transform.scale(world_screen, (width, height), screen.subsurface((0, 0, width, height)))
+    # Если разрешение не делится на масштаб, справа и снизу остаются полосы меньше scale пикселей
+    screen_width, screen_height = screen.get_size()
+    if width < screen_width:
+        screen.fill(BACKGROUND_COLOR, (width, 0, screen_width - width, screen_height))
+    if height < screen_height:
+        screen.fill(BACKGROUND_COLOR, (0, height, width, screen_height - height))
 
 
 def play(screen: pygame.surface.Surface,
-         level_number: int = 1, user_seed: str = None) -> int:
+         level_number: int = 1, save_data: SaveData = None) -> int:
     """
     Функция запуска игрового процесса
     :param screen: Экран для отрисовки
     :param level_number: Номер текущего уровня
-    :param user_seed: Сид карты. Если он есть, по нему создаются уровни,
-    раставляются враги и прочее
+    :param save_data: Данные сохранения. Если они есть, по ним создаётся уровень,
+    раставляются враги, восстанавливается игрок и прочее
     :return: Код завершения игры (значения описаны в main.py)
     """
-    # Псевдо загрузочный экран (для красоты)
-    loading_screen(screen)
+    # Экран загрузки (прогресс выводится по мере инициализации уровня)
+    loading = LoadingScreen(screen)
+    loading.show(0)
     # Размеры экрана
     screen_width, screen_height = screen.get_size()
     # Группа со всеми спрайтами
@@ -100,13 +162,16 @@ def play(screen: pygame.surface.Surface,
     tiles_group = pygame.sprite.Group()
     # Группа со спрайтами ящиков и бочек
     # (они отдельно, т.к. это разрушаемые объекты)
-    furniture_group = pygame.sprite.Group()
-    # Группа со спрайтами преград (т.е. все физические объекты)
-    collidable_tiles_group = pygame.sprite.Group()
+    furniture_group = SpatialGroup()
+    # Группа со спрайтами преград (т.е. все физические объекты).
+    # У неё есть пространственный индекс для быстрой проверки столкновений
+    collidable_tiles_group = SpatialGroup()
     # Группа со спрайтами врагов
     enemies_group = pygame.sprite.Group()
+    # Планировщик обновлений врагов (далёкие обновляются реже или не обновляются)
+    monsters_scheduler = MonstersScheduler()
     # Группа со спрайтами дверей
-    doors_group = pygame.sprite.Group()
+    doors_group = SpatialGroup()
     # Группа со спрайтами факелов
     torches_group = pygame.sprite.Group()
     # Группа со спрайтом конца уровня (т.е. с лестницой перехода вниз)
@@ -115,60 +180,99 @@ def play(screen: pygame.surface.Surface,
     GroundItem.sprites_group = pygame.sprite.Group()
     # Группа с сундуками
     Chest.chest_group = pygame.sprite.Group()
+    # Заклинания прошлой игры (если она была) не должны попасть в новую
+    Entity.spells_group.empty()
 
     is_open = True
     # Поверхность для эффекта затемнения
     transparent_grey = pygame.surface.Surface((screen_width, screen_height),
                                               pygame.SRCALPHA).convert_alpha()
     clock = pygame.time.Clock()  # Часы
-    current_seed = user_seed  # текущий сид
     # Создаем уровень с помощью функции из generation_map
-    level, level_seed = generate_new_level(current_seed.split('\n')[0].split() if current_seed else 0)
+    level, level_seed, level_rooms = generate_new_level(save_data.level_seed if save_data else None)
+    loading.show(0.1)
+    # Ресурсы игры и монстров этого уровня загружаются заранее
+    # (остальные, например у призванных монстров, загрузятся при первом обращении).
+    # Это самый долгий шаг при первом запуске, поэтому прогресс выводится по каждому ресурсу
+    monster_types = level_monster_types(level, level_rooms, level_seed, level_number)
+    AssetManager.preload('game', *monster_bundles(monster_types), progress=loading.part(0.1, 0.7))
     # Игрок (None, т.к. будет переопределён либо при инициализации, либо при по)
     player = None
-    if current_seed:
-        data = current_seed.split('\n')  # Данные из сида
-        # Получение данных об игроке из сида и создание игрока
-        _, _, player_level, health, mana, money = data[3].split()[:-1]
+    if save_data:
+        # Получение данных об игроке из сохранения и создание игрока
+        _, _, player_level, health, mana, money = save_data.player
         player = Player(0, 0, player_level, all_sprites, health, mana, money)
         # Получение данных об асистентах игрока
-        for n in range(int(data[3].split()[-1])):
-            # Получениев параметров асистента и его создание
-            x1, y1, health, mana, *name = data[4 + n].split()
-            assistant = PlayerAssistant(0, 0, player, all_sprites, health, mana, name)
+        for x, y, health, mana, name in save_data.assistants:
+            assistant = PlayerAssistant(x, y, player, all_sprites, health, mana, name.split())
             # Добавление асистента
             player.add_assistant(assistant)
     # Необходимые аргументы для инициализации уровня
-    args = (level, level_number, all_sprites, tiles_group, furniture_group, collidable_tiles_group, enemies_group,
-            doors_group, torches_group, end_of_level, current_seed.split('\n')[1].split() if current_seed else [],
-            current_seed.split('\n')[2].split() if current_seed else [], player)
-    # Инициализация уровня и получение данных об игроке и частях сида
-    player, monsters_seed, boxes_seed = initialise_level(*args)
-    if current_seed:
-        # Если сид был передан, сдвигаем игрока на расстояние от начала уровня (лестницы)
-        # Которое было записано в сид
-        x_from_start, y_from_start = map(float, current_seed.split('\n')[3].split()[:2])
+    args = (level, level_rooms, level_number, all_sprites, tiles_group, furniture_group, collidable_tiles_group,
+            enemies_group, doors_group, torches_group, end_of_level, level_seed,
+            save_data.destroyed_monsters if save_data else None,
+            save_data.destroyed_objects if save_data else None, player)
+    # Инициализация уровня и получение данных об игроке и уничтоженных объектах
+    player, destroyed_monsters, destroyed_objects = initialise_level(*args)
+    loading.show(0.75)
+    # Пол и стены не меняются, поэтому они запекаются в один статичный слой
+    # (по мере создания комнат)
+    static_layer = StaticLayer()
+    if save_data:
+        # Если сохранение было передано, сдвигаем игрока на расстояние от начала уровня (лестницы)
+        # Которое было записано в сохранение
+        x_from_start, y_from_start = save_data.player[:2]
         player.rect.center = player.rect.centerx + x_from_start, player.rect.centery + y_from_start
-    # Смещение всех асистентов игрока
-    for assistant in player.assistants:
-        assistant.rect.center = player.rect.center
-    # Обновление и сохранение сида после инициализации уровня
-    current_seed = '\n'.join([' '.join(level_seed), ' '.join(monsters_seed), ' '.join(boxes_seed),
-                              str(player), str(level_number)])
-    save(current_seed)
+        # Восстановление созданных комнат, монстров, предметов на полу и заклинаний
+        static_layer.bake(restore_world(save_data, level_rooms, player, enemies_group, all_sprites))
+    else:
+        # Смещение всех асистентов игрока
+        for assistant in player.assistants:
+            assistant.rect.center = player.rect.center
+    loading.show(0.85)
+    # Комната игрока и соседние создаются во время загрузки, чтоб первые кадры не ждали их создания
+    start_room = level_rooms.get_room(player.rect.center)
+    static_layer.bake(level_rooms.build({start_room} | start_room.neighbours))
+    loading.show(0.95)
+    # Карта следующего уровня генерируется в фоне, пока проходится текущий
+    next_level = LevelPregenerator()
+
+    def quick_save() -> None:
+        """
+        Запись сохранения с полным состоянием текущего уровня (переменные уровня
+        берутся на момент вызова, т.е. после перехода на новый уровень - уже его)
+        """
+        save(pack_save(level_number, level_seed, level_rooms, destroyed_monsters, destroyed_objects,
+                       player, enemies_group))
+
+    # Обновление и запись сохранения после инициализации уровня
+    quick_save()
     camera = Camera(screen.get_size())  # камера
+    # Уровень рисуется в поверхность уменьшенного разрешения (см. WORLD_RENDER_SCALE),
+    # которая растягивается на экран один раз за кадр
+    render_scale = WORLD_RENDER_SCALE
+    world_screen = get_world_screen(screen, render_scale)
+    # Очереди отрисовки спрайтов уровня и того, что рисуется поверх него в разрешении экрана
+    render_queue = RenderQueue(render_scale)
+    overlay_queue = RenderQueue()
+    # Регулятор качества: при нехватке времени кадра отключает необязательную работу
+    governor = QualityGovernor()
+    # Камера нужна сущностям для перевода координат прицела и отрисовки
+    Entity.set_global_camera(camera)
     # Инициализация начальной позиции прицела игрока
     player.scope.init_scope_position((screen_width * 0.5, screen_height * 0.5))
     # Шрифт для вывода фпс в левом верхнем углу
-    fps_font = load_game_font(48)
+    fps_font = AssetManager.font(48)
     # Иконка рядом с номером уровня (в правом верхнем углу)
     level_number_icon = load_tile('DOWNSTAIRS.png')
     # Иконка рядом с количеством врагов на уровне (в правом верхнем углу)
-    monster_number_icon = load_image('assets/sprites/UI/icons/monster_number.png', (TILE_SIZE,) * 2)
+    monster_number_icon = AssetManager.image('assets/sprites/UI/icons/monster_number.png', (TILE_SIZE,) * 2)
     # Шрифт для вывода номера уровня и количества врагов
-    level_and_enemies_font = load_game_font(64)
+    level_and_enemies_font = AssetManager.font(64)
     # Сообщение, которое будет появлятся при приближении игрока к сундуку
     chest_title = Message(screen, 'Нажмите Е (или L2), чтобы открыть сундук', screen.get_height() * 0.1)
+    # Сообщение, которое будет появлятся после быстрого сохранения
+    quick_save_title = Message(screen, 'Игра сохранена', screen.get_height() * 0.1)
     # Сообщение, которое будет появлятся при приближении игрока к спуску вниз
     downstairs_title = Message(screen, 'Нажмите Е (или L2), чтобы перейти на следующий уровень',
                                screen.get_height() * 0.1)
@@ -187,6 +291,7 @@ def play(screen: pygame.surface.Surface,
     assistants_height = 180
     # Отступ для вывода иконки игрока и его ассистентов
     indent = 20
+    loading.show(1)
     # Фоновая музыка
     pygame.mixer.music.load("assets/audio/music/game_bg.ogg")
     pygame.mixer.music.play(-1)
@@ -197,7 +302,10 @@ def play(screen: pygame.surface.Surface,
     pygame.event.set_allowed((pygame.QUIT, pygame.MOUSEBUTTONUP, pygame.KEYDOWN, ))
     # Игровой цикл
     while is_open:
+        # Время фаз кадра отмечается профилировщиком (см. profiler.py)
+        frame_profiler.begin_frame()
         was_pause_activated = False  # была ли активирована пауза
+        was_quick_load_activated = False  # была ли нажата быстрая загрузка
         keys = pygame.key.get_pressed()  # нажатые клавиши
         buttons = pygame.mouse.get_pressed(5)  # нажатые кнопки мыши
         for event in pygame.event.get():
@@ -206,6 +314,14 @@ def play(screen: pygame.surface.Surface,
             if event.type == pygame.KEYDOWN:
                 if event.key == CONTROLS["KEYBOARD_PAUSE"]:
                     was_pause_activated = True
+                # Быстрое сохранение полного состояния игры
+                if event.key == CONTROLS["KEYBOARD_QUICK_SAVE"] and player.alive:
+                    quick_save()
+                    quick_save_title.last_collide_time = pygame.time.get_ticks()
+                if event.key == CONTROLS["KEYBOARD_QUICK_LOAD"]:
+                    was_quick_load_activated = True
+                if event.key == CONTROLS["KEYBOARD_PROFILER"]:
+                    frame_profiler.toggle_overlay()
         # Провверка использования заклинаний с джойстика
         if player.joystick:
             if player.joystick.get_button(CONTROLS["JOYSTICK_UI_PAUSE"]):
@@ -245,8 +361,6 @@ def play(screen: pygame.surface.Surface,
             # Запуск меню паузы
             code = game_menu.execute(screen)
             if code == 1:
-                # Псевдо экран загрузки перед следующими действиями (для красоты)
-                loading_screen(screen)
                 # Очищаем все группы со спрайтами
                 all_sprites.empty()
                 tiles_group.empty()
@@ -260,11 +374,15 @@ def play(screen: pygame.surface.Surface,
                 GroundItem.sprites_group.empty()
                 Entity.damages_group.empty()
                 # Сохранение данных перед выходом
-                save('')
+                save(b'')
                 return 2
             if code is not None:
-                # Ставим экран загрузки перед следующими действиями
-                loading_screen(screen)
+                # Сохранение данных перед выходом (до очистки групп,
+                # иначе в сохранение не попадут монстры и предметы на полу)
+                if player.alive:
+                    quick_save()
+                else:
+                    save(b'')
                 # Очищаем все группы со спрайтами
                 all_sprites.empty()
                 tiles_group.empty()
@@ -277,18 +395,29 @@ def play(screen: pygame.surface.Surface,
                 Chest.chest_group.empty()
                 GroundItem.sprites_group.empty()
                 Entity.damages_group.empty()
-                # Сохранение данных перед выходом
-                if player.alive:
-                    current_seed = '\n'.join([' '.join(level_seed), ' '.join(monsters_seed), ' '.join(boxes_seed),
-                                              str(player), str(level_number)])
-                    save(current_seed)
-                else:
-                    save('')
                 return -1
             # Возвращение звука и мызыки так, как было до паузы
             pygame.mixer.unpause()
             pygame.mixer.music.unpause()
-        screen.fill(BACKGROUND_COLOR)  # Очистка экрана
+            # Время в меню паузы не считается временем кадра
+            governor.reset()
+        # Обработка быстрой загрузки (сохранение загружается в main.py)
+        if was_quick_load_activated:
+            # Очищаем все группы со спрайтами
+            all_sprites.empty()
+            tiles_group.empty()
+            furniture_group.empty()
+            collidable_tiles_group.empty()
+            enemies_group.empty()
+            doors_group.empty()
+            torches_group.empty()
+            end_of_level.empty()
+            Chest.chest_group.empty()
+            GroundItem.sprites_group.empty()
+            Entity.damages_group.empty()
+            return 3
+        frame_profiler.mark('input')
+        world_screen.fill(BACKGROUND_COLOR)  # Очистка экрана
         player.update()  # Обновление игрока
         # Если игрок умер, то открывается экран конца игры
         if player.destroyed:
@@ -314,16 +443,34 @@ def play(screen: pygame.surface.Surface,
                  player.joystick.get_axis(CONTROLS['JOYSTICK_USE']) > JOYSTICK_SENSITIVITY)
                     or (keys[CONTROLS['KEYBOARD_USE']])):
                 pygame.sprite.spritecollide(player, Chest.chest_group, False)[0].open()
+        frame_profiler.mark('player')
 
-        enemies_group.update(player)  # обновление врагов
+        # Обновление индексов для поиска ближайших целей
+        Entity.enemies_grid.rebuild(enemies_group)
+        Entity.allies_grid.rebuild((player,), player.assistants)
+        Entity.flow_field.update(player)
+        # Обновляется только комната игрока и соседние с ней,
+        # набор таких комнат меняется, когда игрок проходит через дверь
+        room_changed = level_rooms.update(player.rect.center)
+        # Объекты комнат создаются, когда игрок к ним подходит
+        static_layer.bake(level_rooms.build_rooms(camera.get_view_rect(TILE_SIZE * 2)))
+        if room_changed:
+            active_torches = pygame.sprite.Group(level_rooms.select(torches_group))
+            active_doors = pygame.sprite.Group(level_rooms.select(doors_group))
+        frame_profiler.mark('rooms')
+        monsters_scheduler.update(enemies_group, player, level_rooms)  # обновление врагов
+        frame_profiler.mark('enemies')
         player.assistants.update(enemies_group)  # обновление асистентов
+        frame_profiler.mark('assistants')
         Entity.spells_group.update()  # обновление заклинаний
+        frame_profiler.mark('spells')
         # Обновление факелов (для звука огня по расстоянию до факела)
-        torches_group.update(player)
-        # Обновление всех дверей
-        doors_group.update(player, enemies_group, [player] + list(player.assistants))
+        active_torches.update(player, governor.torch_animation)
+        # Обновление дверей
+        active_doors.update(player, enemies_group, [player] + list(player.assistants))
         Chest.chest_group.update()  # обновление сундуков
         Entity.damages_group.update()  # обновление текста с выводом урона
+        frame_profiler.mark('doors_torches')
         # Проверка перехода на следующий уровень, при соприкосновении с лестницой вниз
         if pygame.sprite.spritecollideany(player.collider, end_of_level):
             # Обновление времени столкновения с лестницой вниз для
@@ -335,8 +482,9 @@ def play(screen: pygame.surface.Surface,
                 # Затухание музыки и звуком
                 pygame.mixer.fadeout(1000)
                 pygame.mixer.music.fadeout(1000)
-                # Псевдо загрузочный экран для красоты
-                loading_screen(screen)
+                # Экран загрузки (прогресс выводится по мере создания нового уровня)
+                loading = LoadingScreen(screen)
+                loading.show(0)
                 # Если игрок прошёл 10 уровней, то это победа
                 if level_number == 10:
                     # Подсчёт количества живых асистентов у игрока (для вывода статистики)
@@ -363,23 +511,36 @@ def play(screen: pygame.surface.Surface,
                     GroundItem.sprites_group.empty()
                     Entity.damages_group.empty()
                     level_number += 1  # увеличение номер уровня
-                    # Создание целиком нового уровень функцией из generation_map
-                    level, level_seed = generate_new_level(0)
+                    # Карта нового уровня уже сгенерирована в фоне (см. LevelPregenerator)
+                    level, level_seed, level_rooms = next_level.get()
+                    next_level = LevelPregenerator()
+                    loading.show(0.1)
+                    # Загрузка ресурсов монстров нового уровня
+                    monster_types = level_monster_types(level, level_rooms, level_seed, level_number)
+                    AssetManager.preload(*monster_bundles(monster_types), progress=loading.part(0.1, 0.7))
                     # Необходимые аргументы для инициализации уровня
-                    args = (level, level_number, all_sprites, tiles_group, furniture_group, collidable_tiles_group,
-                            enemies_group, doors_group, torches_group, end_of_level, [], [])
-                    # Инициализация уровня и получение данных об игроке и частях сида
-                    player, monsters_seed, boxes_seed = initialise_level(*args, player=player)
+                    args = (level, level_rooms, level_number, all_sprites, tiles_group, furniture_group,
+                            collidable_tiles_group, enemies_group, doors_group, torches_group, end_of_level,
+                            level_seed, None, None)
+                    # Инициализация уровня и получение данных об игроке и уничтоженных объектах
+                    player, destroyed_monsters, destroyed_objects = initialise_level(*args, player=player)
+                    static_layer = StaticLayer()
+                    loading.show(0.8)
                     # Добавление игрока и асистентов
                     all_sprites.add(player)
                     all_sprites.add(player.assistants)
                     # Смещение асистентов к игроку
                     for assistant in player.assistants:
                         assistant.rect.center = player.rect.center
-                    # Изменение текущего сида и файла сохранения
-                    current_seed = '\n'.join([' '.join(level_seed), ' '.join(monsters_seed), ' '.join(boxes_seed),
-                                              str(player), str(level_number)])
-                    save(current_seed)
+                    # Комната игрока и соседние создаются во время загрузки
+                    start_room = level_rooms.get_room(player.rect.center)
+                    static_layer.bake(level_rooms.build({start_room} | start_room.neighbours))
+                    loading.show(0.95)
+                    # Запись сохранения в начале нового уровня
+                    quick_save()
+                    # Новая камера, чтобы вид не "доезжал" с места прошлого уровня
+                    camera = Camera(screen.get_size())
+                    Entity.set_global_camera(camera)
                     # Установка начальной позиции приуела
                     player.scope.init_scope_position((screen_width * 0.5, screen_height * 0.5))
                     # Иконки для отображения иконок (контейнеров) с заклинаниями внизу экрана
@@ -391,37 +552,57 @@ def play(screen: pygame.surface.Surface,
                         SpellContainer("light_spell.png", FlashSpell, player),
                         SpellContainer("teleport_spell.png", TeleportSpell, player),
                     )
+                    loading.show(1)
                     # Включение музыки после обновления параметров
                     pygame.mixer.music.play(-1)
+                    governor.reset()
                     continue
-        # Применение смещения камеры относительно игрока
+        # Обновление смещения камеры относительно игрока
+        # (сами объекты остаются в мировых координатах)
         camera.update(player)
-        for sprite in all_sprites:
-            camera.apply(sprite)
+        frame_profiler.mark('camera')
         # Отрисовка спрайтов в определённом порядке,
         # чтобы они не перекрывали друг друга
-        tiles_group.draw(screen)  # тайлы пола
-        torches_group.draw(screen)  # факеда
+        static_layer.draw(world_screen, render_scale)  # тайлы пола и стены
+        frame_profiler.mark('draw_static')
+        # Спрайты уровня добавляются в очередь и рисуются одним вызовом blits
+        camera.draw_group(render_queue, torches_group)  # факеда
         # Сундуки
         for chest in Chest.chest_group:
-            chest.draw_back_image(screen)
+            chest.draw_back_image(render_queue)
         # предметы на земле (мясо и деньги)
-        GroundItem.sprites_group.draw(screen)
-        collidable_tiles_group.draw(screen)  # физические объекты не являющиеся стенами
-        doors_group.draw(screen)  # двери
-        enemies_group.draw(screen)  # враги
-        player.assistants.draw(screen)  # асистенты
+        camera.draw_group(render_queue, GroundItem.sprites_group)
+        # физические объекты не являющиеся стенами
+        camera.draw_group(render_queue, furniture_group)
+        camera.draw_group(render_queue, Chest.chest_group)
+        camera.draw_group(render_queue, doors_group)  # двери
+        camera.draw_group(render_queue, enemies_group)  # враги
+        camera.draw_group(render_queue, player.assistants)  # асистенты
+        player.draw(render_queue)  # игрок
+        camera.draw_group(render_queue, Entity.spells_group)  # заклинания
+        frame_profiler.count('n_sprites', len(render_queue.blits))
+        render_queue.flush(world_screen)
+        frame_profiler.mark('draw_sprites')
+        # Единственное растягивание уровня на экран за кадр
+        if world_screen is not screen:
+            upscale_world(world_screen, screen, render_scale)
+        frame_profiler.mark('upscale')
+        # Далее всё рисуется поверх уровня в разрешении экрана
         # Шкалы здоровья у асистентов
         for assistant in player.assistants:
-            assistant.draw_health_bar(screen)
-        player.draw(screen)  # игрок
-        Entity.spells_group.draw(screen)  # заклинания
-        player.draw_health_bar(screen)  # шкала здоровья у игрока
+            assistant.draw_health_bar(screen, governor.health_text, governor.status_effects)
+        player.draw_health_bar(screen, governor.health_text, governor.status_effects)  # шкала здоровья у игрока
         # Шкала здоровья у врагов
         for enemy in enemies_group:
-            enemy.draw_health_bar(screen)
-        Entity.damages_group.draw(screen)  # текст с уроном
+            enemy.draw_health_bar(screen, governor.health_text, governor.status_effects)
+        frame_profiler.mark('draw_bars')
+        # текст с уроном
+        if governor.damage_numbers:
+            camera.draw_group(overlay_queue, Entity.damages_group)
+            overlay_queue.flush(screen)
+        frame_profiler.mark('draw_damages')
         chest_title.draw(screen)  # сообщение по мере приближении к сундуку
+        quick_save_title.draw(screen)  # сообщение после быстрого сохранения
         # сообщение по мере приближении к лестнице вниз
         downstairs_title.draw(screen)
         # Значения для определения того, какие иконки текст,
@@ -458,10 +639,27 @@ def play(screen: pygame.surface.Surface,
         screen.blit(level_number_text, (screen_width - 120, 10))
         # Прицел игрока
         player.scope.draw(screen)
+        frame_profiler.mark('draw_ui')
+        # Количество сущностей и оверлей профилировщика
+        frame_profiler.count('n_enemies', len(enemies_group))
+        frame_profiler.count('n_assistants', len(player.assistants))
+        frame_profiler.count('n_spells', len(Entity.spells_group))
+        frame_profiler.count('n_all_sprites', len(all_sprites))
+        frame_profiler.count('quality_level', governor.level)
+        frame_profiler.draw(screen, (screen_width - 10, 150))
 
         clock.tick(FPS)
+        frame_profiler.mark('tick')
+        # Регулятор качества получает время работы кадра (без ожидания в tick)
+        if QUALITY_GOVERNOR and governor.update(clock.get_rawtime()):
+            monsters_scheduler.set_full_rate(governor.full_ai_rate)
+            if governor.render_scale != render_scale:
+                render_scale = render_queue.scale = governor.render_scale
+                world_screen = get_world_screen(screen, render_scale)
         pygame.display.flip()
+        frame_profiler.mark('flip')
+        frame_profiler.end_frame()
 
     # Запись сохранения после закрытия игры
-    save(current_seed)
+    quick_save()
     return 0
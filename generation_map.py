@@ -1,13 +1,14 @@
-from random import choice
+import threading
+from random import choice, randrange
 
-from entities.base_entities import Entity
+from entities.base_entities import Entity, FlowField
 from entities.tile import *
 from entities.player import Player, PlayerAssistant
-from entities.enemies import random_monster
+from entities.enemies import random_monster_type, spawn_monster
 from entities.spells import Spell
 
 from config import TILE_SIZE
-from engine import true_with_chance
+from engine import true_with_chance, seeded_random, DestroyedObjects, LevelGrid
 
 
 # Шансы появления длинных и коротнких блоков
@@ -28,8 +29,36 @@ CRACKED_FLOOR_CHANCE = 15
 # B - Бочка, либо коробка
 
 
+class RoomTemplate:
+    """
+    Шаблон комнаты. Разбирается один раз при импорте модуля, а при генерации
+    уровня строки шаблона просто копируются на карту (см. LevelGrid.paste)
+    """
+    def __init__(self, room: str):
+        rows = room.strip('\n').split('\n')
+        self.width = len(rows[0])
+        self.height = len(rows)
+        # Строки шаблона в виде байтов (кодов тайлов)
+        self.rows = [row.encode() for row in rows]
+        # Позиции дверей внутри комнаты: словарь типа символ двери: список (колонка, ряд)
+        self.doors = {door: [] for door in 'rtlb'}
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell in self.doors:
+                    self.doors[cell].append((x, y))
+
+
+def compile_rooms(rooms: dict) -> dict:
+    """
+    Функция разбирает группу шаблонов комнат
+    :param rooms: Словарь типа название: строка с картой комнаты
+    :return: Словарь типа название: RoomTemplate
+    """
+    return {name: RoomTemplate(room) for name, room in rooms.items()}
+
+
 # Карты комнат
-START_ROOM = '''
+START_ROOM = RoomTemplate('''
 03338t63339
 5.........1
 5.........1
@@ -41,7 +70,7 @@ l..T.P.T..r
 5.........1
 5.........1
 -7772b4777=
-'''
+''')
 
 EVIL_ROOM_1 = '''
 03338t63339
@@ -589,11 +618,11 @@ l.B......B.......B...r
 -7772b4777777772b4777=
 '''
 
-EMPTY_ROOM = '''           \n           \n           
+EMPTY_ROOM = RoomTemplate('''           \n           \n           
            \n           \n           \n           
-           \n           \n           \n           '''
+           \n           \n           \n           ''')
 
-END_ROOM = '''
+END_ROOM = RoomTemplate('''
 03338t63339
 5.........1
 5.........1
@@ -605,7 +634,7 @@ l....E....r
 5.........1
 5.........1
 -7772b4777=
-'''
+''')
 
 COVERT_ROOM_1 = '''
            
@@ -748,7 +777,7 @@ COVERT_ROOM_10 = '''
 '''
 
 # Группы комнат по использованию
-STANDARD_ROOMS = {
+STANDARD_ROOMS = compile_rooms({
       'E1':  EVIL_ROOM_1,
       'E2':  EVIL_ROOM_2,
       'E3':  EVIL_ROOM_3,
@@ -781,9 +810,9 @@ STANDARD_ROOMS = {
       'E30': EVIL_ROOM_30,
       'E31': EVIL_ROOM_31,
       'E32': EVIL_ROOM_32,
-}
+})
 
-DOUBLE_ROOMS = {
+DOUBLE_ROOMS = compile_rooms({
     'D1': DOUBLE_EVIL_ROOM_1,
     'D2': DOUBLE_EVIL_ROOM_2,
     'D3': DOUBLE_EVIL_ROOM_3,
@@ -791,9 +820,9 @@ DOUBLE_ROOMS = {
     'D5': DOUBLE_EVIL_ROOM_5,
     'D6': DOUBLE_EVIL_ROOM_6,
     'D7': DOUBLE_EVIL_ROOM_7,
-}
+})
 
-SECRET_ROOMS = {
+SECRET_ROOMS = compile_rooms({
     'C1':  COVERT_ROOM_1,
     'C2':  COVERT_ROOM_2,
     'C3':  COVERT_ROOM_3,
@@ -804,7 +833,139 @@ SECRET_ROOMS = {
     'C8':  COVERT_ROOM_8,
     'C9':  COVERT_ROOM_9,
     'C10': COVERT_ROOM_10,
-}
+})
+
+
+# Размер комнаты в тайлах (двойная комната занимает две клетки формы уровня)
+ROOM_SIZE = 11
+
+
+class Room:
+    """
+    Комната уровня: её тип (символ из формы уровня), границы (в тайлах)
+    и соседние комнаты, в которые из неё ведут двери
+    """
+    def __init__(self, room_type: str, x: int, y: int, width: int, height: int):
+        self.room_type = room_type
+        self.rect = pygame.Rect(x, y, width, height)
+        self.neighbours = set()
+        # Объекты комнаты (см. build_room) создаются только когда игрок подходит к комнате
+        self.built = False
+
+
+class RoomsGraph:
+    """
+    Граф комнат уровня (создаётся генератором вместе с картой).
+    Нужен, чтобы обновлять только то, что рядом с игроком:
+    комнату игрока и соседние с ней (через двери) комнаты.
+    Активные комнаты пересчитываются, когда игрок проходит через дверь
+    """
+    def __init__(self):
+        self.rooms = []
+        # Словарь типа (колонка, ряд) клетки формы уровня: комната
+        self.cells = {}
+        self.current_room = None
+        self.active_rooms = set()
+        # Функция, создающая объекты комнаты по её содержимому
+        self.builder = None
+        self.not_built_count = 0
+
+    def add_room(self, room_type: str, column: int, row: int, width: int = 1) -> None:
+        """
+        Метод добавляет комнату
+        :param room_type: Символ комнаты в форме уровня
+        :param column: Колонка клетки формы уровня
+        :param row: Ряд клетки формы уровня
+        :param width: Ширина комнаты в клетках формы уровня
+        """
+        room = Room(room_type, column * ROOM_SIZE, row * ROOM_SIZE, width * ROOM_SIZE, ROOM_SIZE)
+        self.rooms.append(room)
+        self.not_built_count += 1
+        for i in range(width):
+            self.cells[column + i, row] = room
+
+    def connect(self, tile_a: tuple, tile_b: tuple) -> None:
+        """
+        Метод соединяет комнаты по обе стороны двери
+        :param tile_a: Тайл двери в первой комнате (колонка, ряд)
+        :param tile_b: Тайл двери во второй комнате (колонка, ряд)
+        """
+        room_a = self.cells.get((tile_a[0] // ROOM_SIZE, tile_a[1] // ROOM_SIZE))
+        room_b = self.cells.get((tile_b[0] // ROOM_SIZE, tile_b[1] // ROOM_SIZE))
+        if room_a and room_b and room_a is not room_b:
+            room_a.neighbours.add(room_b)
+            room_b.neighbours.add(room_a)
+
+    def set_builder(self, builder) -> None:
+        """
+        Метод устанавливает функцию, создающую объекты комнаты
+        :param builder: Функция, принимающая комнату
+        и возвращающая созданные тайлы
+        """
+        self.builder = builder
+
+    def build_rooms(self, view_rect: pygame.Rect) -> list:
+        """
+        Метод создаёт объекты ещё не созданных комнат рядом с игроком:
+        активных и попадающих в область видимости
+        :param view_rect: Область видимости в мировых координатах
+        :return: Созданные тайлы
+        """
+        if not self.not_built_count:
+            return []
+        size = TILE_SIZE * ROOM_SIZE
+        rooms = set(self.active_rooms)
+        for row in range(view_rect.top // size, (view_rect.bottom - 1) // size + 1):
+            for column in range(view_rect.left // size, (view_rect.right - 1) // size + 1):
+                if (column, row) in self.cells:
+                    rooms.add(self.cells[column, row])
+        return self.build(rooms)
+
+    def build(self, rooms) -> list:
+        """
+        Метод создаёт объекты переданных комнат (уже созданные пропускаются)
+        :param rooms: Комнаты
+        :return: Созданные тайлы
+        """
+        tiles = []
+        for room in rooms:
+            if room.built:
+                continue
+            tiles += self.builder(room)
+            room.built = True
+            self.not_built_count -= 1
+        return tiles
+
+    def get_room(self, point: tuple):
+        """
+        Метод находит комнату, в которой находится точка
+        :param point: Точка в мировых координатах
+        :return: Комната или None
+        """
+        size = TILE_SIZE * ROOM_SIZE
+        return self.cells.get((int(point[0] // size), int(point[1] // size)))
+
+    def update(self, point: tuple) -> bool:
+        """
+        Метод обновляет активные комнаты, если игрок перешёл в другую комнату
+        :param point: Позиция игрока в мировых координатах
+        :return: True, если активные комнаты изменились
+        """
+        room = self.get_room(point)
+        if not room or room is self.current_room:
+            return False
+        self.current_room = room
+        self.active_rooms = {room} | room.neighbours
+        return True
+
+    def select(self, sprites) -> list:
+        """
+        Метод отбирает спрайты, находящиеся в активных комнатах
+        (для неподвижных объектов, вроде дверей и факелов)
+        :param sprites: Группа (или список) спрайтов
+        :return: Список спрайтов
+        """
+        return [sprite for sprite in sprites if self.get_room(sprite.rect.center) in self.active_rooms]
 
 
 # Карты комнат в уровнях
@@ -1119,46 +1280,49 @@ FORMS = {
     'L29': LEVEL_29,
     'L30': LEVEL_30,
 }
+# Формы уровней тоже разбираются один раз (в список рядов комнат)
+FORMS = {name: form.strip('\n').split('\n') for name, form in FORMS.items()}
+# Таблица для замены начала и конца уровня местами
+SWAP_START_AND_END = str.maketrans('SE', 'ES')
 
 
 # Сама функция генерации
-def generate_new_level(user_seed=None) -> [str, ..., str]:
+def generate_new_level(seed: int = None) -> (LevelGrid, int, RoomsGraph):
     """
-    Создаёт список строк, каждый символ в строке означает определенный тайл
+    Создаёт карту уровня (LevelGrid), каждый символ (код) в ней означает определенный тайл
     Генерация происходит псевдорандомно, выбирая случайный шаблон уровня,
     а затем для каждого символа формы выбирает случайную комнату. 
     С некоторым шансом из двух комнат может быть создана одна большая.
     Вместо дверей ставится либо стена, либо, если возможно, с некоторым шансом, "блок".
-    Если генерация уже происходила и у вас есть сид, вы можете передать его этой функции,
-    тогда карта будет сгенерирована по тем же параметрам. 
+    Все случайные решения берутся из генератора, созданного по сиду уровня (одно число),
+    поэтому по тому же сиду карта будет сгенерирована по тем же параметрам.
     Совпадение будет по форме уровня, каждой комнате и блоках из стен в комнатах.
 
-    :param user_seed: Если есть, генерация происходит с установленными в нем параметрами
-    :return: Сгенерированный (случайно/по сиду) уровень, его сид
+    :param seed: Сид уровня. Если его нет, он выбирается случайно
+    :return: Сгенерированный (случайно/по сиду) уровень, его сид и граф комнат
     """
-    level = []
-    seed = []
-    if user_seed:
-        seed.append(user_seed.pop(0))
-    else:
-        seed.append(choice(list(FORMS)))
-    level_form = FORMS[seed[-1]]
-
-    if true_with_chance(50, seed, user_seed):
-        level_form = level_form.replace('S', '@').replace('E', 'S').replace('@', 'E')
-
-    level_form = level_form.strip('\n').split('\n')
+    if seed is None:
+        seed = randrange(2 ** 32)
+    rng = seeded_random(seed, 'level')
+    rooms_graph = RoomsGraph()
+    level_form = FORMS[rng.choice(list(FORMS))]
+
+    if true_with_chance(50, rng):
+        level_form = [row.translate(SWAP_START_AND_END) for row in level_form]
+
+    level = LevelGrid(max(map(len, level_form)) * ROOM_SIZE, len(level_form) * ROOM_SIZE)
+    # Места дверей на карте: список из (ряд, колонка, символ двери)
+    door_sites = []
     doubled = False
     for i in range(len(level_form)):
         room_row = list(level_form[i])
-        rooms = []
         for j in range(len(room_row)):
             if doubled:
                 doubled = False
                 continue
 
             if j + 1 < len(room_row):
-                if room_row[j] == room_row[j + 1] == 'R' and true_with_chance(15, seed, user_seed):
+                if room_row[j] == room_row[j + 1] == 'R' and true_with_chance(15, rng):
                     room_row[j] = room_row[j + 1] = 'D'
 
             if room_row[j] == 'S':
@@ -1166,190 +1330,208 @@ def generate_new_level(user_seed=None) -> [str, ..., str]:
             elif room_row[j] == 'E':
                 room = END_ROOM
             elif room_row[j] == 'D':
-                if user_seed:
-                    seed.append(user_seed[0])
-                    del user_seed[0]
-                else:
-                    seed.append(choice(list(DOUBLE_ROOMS)))
-                room = DOUBLE_ROOMS[seed[-1]]
+                room = DOUBLE_ROOMS[rng.choice(list(DOUBLE_ROOMS))]
                 doubled = True
             elif room_row[j] == 'R':
-                if user_seed:
-                    seed.append(user_seed[0])
-                    del user_seed[0]
-                else:
-                    seed.append(choice(list(STANDARD_ROOMS)))
-                room = STANDARD_ROOMS[seed[-1]]
+                room = STANDARD_ROOMS[rng.choice(list(STANDARD_ROOMS))]
             elif room_row[j] == 'C':
-                if user_seed:
-                    seed.append(user_seed[0])
-                    del user_seed[0]
-                else:
-                    seed.append(choice(list(SECRET_ROOMS)))
-                room = SECRET_ROOMS[seed[-1]]
+                room = SECRET_ROOMS[rng.choice(list(SECRET_ROOMS))]
             else:
                 room = EMPTY_ROOM
-            rooms.append(room.strip('\n').split('\n'))
-
-        for number_row in range(len(rooms[0])):
-            row = []
-            for room_a in rooms:
-                row += list(room_a[number_row])
-            level.append(row)
-
-    for i in range(len(level)):
-        for j in range(len(level[i])):
-            if level[i][j] not in ['r', 't', 'l', 'b']:
-                continue
-
-            # Убираем двери там, где они не нужны
-            # И строим блоки из стен на их месте с некоторым шансом
-            if level[i][j] == 'r':     # ДВЕРЬ СПРАВА
-                if j + 1 >= len(level[i]) or level[i][j + 1] != 'l':
-                    if level[i + 2][j - 2] == level[i - 1][j - 1] == '.' and \
-                            (j + 1 == len(level[i]) or level[i][j + 1] != 'F') and \
-                            true_with_chance(SHORT_BLOCK_CHANCE, seed, user_seed):
-                        level[i - 1][j] = '='
-                        level[i + 1][j] = '9'
-                        level[i][j] = ' '
-
-                        if true_with_chance(LONG_BLOCK_CHANCE, seed, user_seed) and \
-                                level[i][j - 3] == '.' == level[i - 1][j - 3]:
-                            level[i][j - 1] = ' '
-                            level[i - 1][j - 1] = '7'
-                            level[i + 1][j - 1] = '3'
-                            level[i][j - 2] = '1'
-                            level[i - 1][j - 2] = '4'
-                            level[i + 1][j - 2] = '6'
-                        else:
-                            level[i][j - 1] = '1'
-                            level[i - 1][j - 1] = '4'
-                            level[i + 1][j - 1] = '6'
+            if room is not EMPTY_ROOM:
+                rooms_graph.add_room(room_row[j], j, i, room.width // ROOM_SIZE)
+                level.paste(j * ROOM_SIZE, i * ROOM_SIZE, room.rows)
+                for door, positions in room.doors.items():
+                    door_sites += [(i * ROOM_SIZE + y, j * ROOM_SIZE + x, door) for x, y in positions]
+
+    # Обходим только места дверей, собранные при расстановке комнат, но в том же порядке,
+    # что и при обходе всей карты по рядам (от порядка зависят случайные решения).
+    # Дверь уже могла быть заменена стеной при обработке соседней двери
+    for i, j, door in sorted(door_sites):
+        if level[j, i] != door:
+            continue
+
+        # Убираем двери там, где они не нужны
+        # И строим блоки из стен на их месте с некоторым шансом
+        if door == 'r':     # ДВЕРЬ СПРАВА
+            if j + 1 < level.width and level[j + 1, i] == 'l':
+                rooms_graph.connect((j, i), (j + 1, i))
+            else:
+                if level[j - 2, i + 2] == level[j - 1, i - 1] == '.' and \
+                        (j + 1 == level.width or level[j + 1, i] != 'F') and \
+                        true_with_chance(SHORT_BLOCK_CHANCE, rng):
+                    level[j, i - 1] = '='
+                    level[j, i + 1] = '9'
+                    level[j, i] = ' '
+
+                    if true_with_chance(LONG_BLOCK_CHANCE, rng) and \
+                            level[j - 3, i] == '.' == level[j - 3, i - 1]:
+                        level[j - 1, i] = ' '
+                        level[j - 1, i - 1] = '7'
+                        level[j - 1, i + 1] = '3'
+                        level[j - 2, i] = '1'
+                        level[j - 2, i - 1] = '4'
+                        level[j - 2, i + 1] = '6'
                     else:
-                        level[i][j] = level[i - 1][j] = level[i + 1][j] = '1'
-                        if level[i + 2][j] == ' ':
-                            level[i + 1][j] = '='
-                        if level[i - 2][j] == ' ':
-                            level[i - 1][j] = '9'
-
-            elif level[i][j] == 't':     # ДВЕРЬ СВЕРХУ
-                if i == 0 or level[i - 1][j] != 'b':
-                    if level[i + 2][j - 1] == '.' and level[i + 1][j + 1] == '.' and \
-                            (i == 0 or level[i - 1][j] != 'F') and \
-                            true_with_chance(SHORT_BLOCK_CHANCE, seed, user_seed):
-                        level[i][j - 1] = '9'
-                        level[i][j + 1] = '0'
-                        level[i][j] = ' '
-
-                        if true_with_chance(LONG_BLOCK_CHANCE, seed, user_seed) and \
-                                level[i + 3][j + 2] == '.' and level[i + 2][j - 1] == '.' and \
-                                level[i + 2][j + 1] == '.':
-                            level[i + 2][j] = '3'
-                            level[i + 2][j - 1] = '6'
-                            level[i + 2][j + 1] = '8'
-                            level[i + 1][j] = ' '
-                            level[i + 1][j - 1] = '1'
-                            level[i + 1][j + 1] = '5'
-                        else:
-                            level[i + 1][j] = '3'
-                            level[i + 1][j - 1] = '6'
-                            level[i + 1][j + 1] = '8'
+                        level[j - 1, i] = '1'
+                        level[j - 1, i - 1] = '4'
+                        level[j - 1, i + 1] = '6'
+                else:
+                    level[j, i] = level[j, i - 1] = level[j, i + 1] = '1'
+                    if level[j, i + 2] == ' ':
+                        level[j, i + 1] = '='
+                    if level[j, i - 2] == ' ':
+                        level[j, i - 1] = '9'
+
+        elif door == 't':     # ДВЕРЬ СВЕРХУ
+            if i == 0 or level[j, i - 1] != 'b':
+                if level[j - 1, i + 2] == '.' and level[j + 1, i + 1] == '.' and \
+                        (i == 0 or level[j, i - 1] != 'F') and \
+                        true_with_chance(SHORT_BLOCK_CHANCE, rng):
+                    level[j - 1, i] = '9'
+                    level[j + 1, i] = '0'
+                    level[j, i] = ' '
+
+                    if true_with_chance(LONG_BLOCK_CHANCE, rng) and \
+                            level[j + 2, i + 3] == '.' and level[j - 1, i + 2] == '.' and \
+                            level[j + 1, i + 2] == '.':
+                        level[j, i + 2] = '3'
+                        level[j - 1, i + 2] = '6'
+                        level[j + 1, i + 2] = '8'
+                        level[j, i + 1] = ' '
+                        level[j - 1, i + 1] = '1'
+                        level[j + 1, i + 1] = '5'
                     else:
-                        level[i][j] = level[i][j - 1] = level[i][j + 1] = '3'
-                        if level[i][j + 2] == ' ':
-                            level[i][j + 1] = '9'
-                        if level[i][j - 2] == ' ':
-                            level[i][j - 1] = '0'
-
-            elif level[i][j] == 'l':     # ДВЕРЬ СЛЕВА
-                if j == 0 or level[i][j - 1] != 'r':
-                    if level[i + 2][j + 2] == '.' and level[i + 1][j + 1] == '.' and \
-                            (j == 0 or level[i][j - 1] != 'F') and \
-                            true_with_chance(SHORT_BLOCK_CHANCE, seed, user_seed):
-                        level[i - 1][j] = '-'
-                        level[i + 1][j] = '0'
-                        level[i][j] = ' '
-
-                        if true_with_chance(LONG_BLOCK_CHANCE, seed, user_seed) and \
-                                level[i][j + 3] == '.':
-                            level[i][j + 2] = '5'
-                            level[i - 1][j + 2] = '2'
-                            level[i + 1][j + 2] = '8'
-                            level[i][j + 1] = ' '
-                            level[i - 1][j + 1] = '7'
-                            level[i + 1][j + 1] = '3'
-                        else:
-                            level[i][j + 1] = '5'
-                            level[i - 1][j + 1] = '2'
-                            level[i + 1][j + 1] = '8'
+                        level[j, i + 1] = '3'
+                        level[j - 1, i + 1] = '6'
+                        level[j + 1, i + 1] = '8'
+                else:
+                    level[j, i] = level[j - 1, i] = level[j + 1, i] = '3'
+                    if level[j + 2, i] == ' ':
+                        level[j + 1, i] = '9'
+                    if level[j - 2, i] == ' ':
+                        level[j - 1, i] = '0'
+
+        elif door == 'l':     # ДВЕРЬ СЛЕВА
+            if j == 0 or level[j - 1, i] != 'r':
+                if level[j + 2, i + 2] == '.' and level[j + 1, i + 1] == '.' and \
+                        (j == 0 or level[j - 1, i] != 'F') and \
+                        true_with_chance(SHORT_BLOCK_CHANCE, rng):
+                    level[j, i - 1] = '-'
+                    level[j, i + 1] = '0'
+                    level[j, i] = ' '
+
+                    if true_with_chance(LONG_BLOCK_CHANCE, rng) and \
+                            level[j + 3, i] == '.':
+                        level[j + 2, i] = '5'
+                        level[j + 2, i - 1] = '2'
+                        level[j + 2, i + 1] = '8'
+                        level[j + 1, i] = ' '
+                        level[j + 1, i - 1] = '7'
+                        level[j + 1, i + 1] = '3'
                     else:
-                        level[i][j] = level[i - 1][j] = level[i + 1][j] = '5'
-                        if level[i + 2][j] == ' ':
-                            level[i + 1][j] = '-'
-                        if level[i - 2][j] == ' ':
-                            level[i - 1][j] = '0'
-
-            elif level[i][j] == 'b':     # ДВЕРЬ СНИЗУ
-                if i + 1 >= len(level) or level[i + 1][j] != 't':
-                    if level[i - 2][j] == level[i - 2][j + 2] == '.' and level[i][j + 2] != ' ' and \
-                            (i + 1 == len(level) or level[i + 1][j] != 'F') and \
-                            true_with_chance(SHORT_BLOCK_CHANCE, seed, user_seed):
-                        level[i][j + 1] = '-'
-                        level[i][j - 1] = '='
-                        level[i][j] = ' '
-
-                        if true_with_chance(LONG_BLOCK_CHANCE, seed, user_seed) and \
-                                level[i - 3][j + 2] == '.':
-                            level[i - 2][j] = '7'
-                            level[i - 2][j - 1] = '4'
-                            level[i - 2][j + 1] = '2'
-                            level[i - 1][j] = ' '
-                            level[i - 1][j - 1] = '1'
-                            level[i - 1][j + 1] = '5'
-                        else:
-                            level[i - 1][j] = '7'
-                            level[i - 1][j - 1] = '4'
-                            level[i - 1][j + 1] = '2'
+                        level[j + 1, i] = '5'
+                        level[j + 1, i - 1] = '2'
+                        level[j + 1, i + 1] = '8'
+                else:
+                    level[j, i] = level[j, i - 1] = level[j, i + 1] = '5'
+                    if level[j, i + 2] == ' ':
+                        level[j, i + 1] = '-'
+                    if level[j, i - 2] == ' ':
+                        level[j, i - 1] = '0'
+
+        elif door == 'b':     # ДВЕРЬ СНИЗУ
+            if i + 1 < level.height and level[j, i + 1] == 't':
+                rooms_graph.connect((j, i), (j, i + 1))
+            else:
+                if level[j, i - 2] == level[j + 2, i - 2] == '.' and level[j + 2, i] != ' ' and \
+                        (i + 1 == level.height or level[j, i + 1] != 'F') and \
+                        true_with_chance(SHORT_BLOCK_CHANCE, rng):
+                    level[j + 1, i] = '-'
+                    level[j - 1, i] = '='
+                    level[j, i] = ' '
+
+                    if true_with_chance(LONG_BLOCK_CHANCE, rng) and \
+                            level[j + 2, i - 3] == '.':
+                        level[j, i - 2] = '7'
+                        level[j - 1, i - 2] = '4'
+                        level[j + 1, i - 2] = '2'
+                        level[j, i - 1] = ' '
+                        level[j - 1, i - 1] = '1'
+                        level[j + 1, i - 1] = '5'
                     else:
-                        level[i][j] = level[i][j - 1] = level[i][j + 1] = '7'
-                        if level[i][j + 2] == ' ':
-                            level[i][j + 1] = '='
-                        if level[i][j - 2] == ' ':
-                            level[i][j - 1] = '-'
+                        level[j, i - 1] = '7'
+                        level[j - 1, i - 1] = '4'
+                        level[j + 1, i - 1] = '2'
+                else:
+                    level[j, i] = level[j - 1, i] = level[j + 1, i] = '7'
+                    if level[j + 2, i] == ' ':
+                        level[j + 1, i] = '='
+                    if level[j - 2, i] == ' ':
+                        level[j - 1, i] = '-'
 
-    # Возвращаем созданный уровень и сид
-    return [''.join(i) for i in level], seed
+    # Возвращаем созданный уровень, сид и граф комнат
+    return level, seed, rooms_graph
 
 
-def initialise_level(level_map, level, all_sprites, tiles_group, furniture_group, barriers_group, enemies_group,
-                     doors_group, torches_group, end_of_level, monster_seed, boxes_seed, player):
+class LevelPregenerator:
+    """
+    Класс генерирует карту следующего уровня (generate_new_level) в фоновом потоке,
+    пока игрок проходит текущий. При переходе по лестнице карта уже готова,
+    и остаётся только создать объекты (initialise_level)
+    """
+    def __init__(self):
+        self.result = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        self.result = generate_new_level()
+
+    def get(self) -> (LevelGrid, int, RoomsGraph):
+        """
+        Метод возвращает сгенерированный уровень (если генерация ещё идёт, ждёт её окончания)
+        :return: Уровень, его сид и граф комнат (как в generate_new_level)
+        """
+        self.thread.join()
+        return self.result
+
+
+def initialise_level(level_map, rooms_graph, level, all_sprites, tiles_group, furniture_group, barriers_group,
+                     enemies_group, doors_group, torches_group, end_of_level, seed,
+                     destroyed_monsters, destroyed_objects, player):
     """
     Функция для инициализации уровня
-    Проходит по переданной ей карте уровня и на каждый символ карты создает тайл и что-то на нем, если есть
-    Если передается сид, монстры будут такие, как записано в сиде
-    Разные тайлы пола, предметов на уровне (бочек, коробок) будут всегда одинаковые
-
-    :param level_map: Уровень
+    Создаёт (или перемещает) игрока на начальную лестницу и устанавливает функцию,
+    создающую объекты комнат. Сами объекты комнаты создаются позже (см. build_room),
+    когда игрок подходит к комнате, поэтому инициализация не проходит по всей карте.
+    Монстры, ящики и сундуки выбираются генераторами по сиду уровня и положению комнаты,
+    поэтому по одному сиду они всегда одинаковые. Уничтоженные объекты (см. DestroyedObjects) не создаются
+
+    :param level_map: Уровень (LevelGrid)
+    :param rooms_graph: Граф комнат уровня (из generate_new_level)
     :param level: Номер уровня, нужен для расчета сложности
     :param all_sprites: Группа со всеми спрайтами
     :param tiles_group: Группа со спрайтами плиток пола
     :param furniture_group: Группа со спрайтами ящиков на уровне
-    :param barriers_group: Группа для спрайтов с тайлами, сквозь которые нельзя ходить
+    :param barriers_group: Группа (SpatialGroup) для спрайтов с тайлами, сквозь которые нельзя ходить
     :param enemies_group: Группа врагов
     :param doors_group: Группа дверей
     :param torches_group: Группа с факелами
     :param end_of_level: Группа тайла лестницы вниз, при касании с которым произойдет переход на следующий уровень
-    :param monster_seed: Сид, по которому будут расставлены монстры
-    :param boxes_seed: Сид, по которому будут расставлены бочки
+    :param seed: Сид уровня (тот же, что и в generate_new_level)
+    :param destroyed_monsters: Убитые монстры из сохранения (None - новый уровень)
+    :param destroyed_objects: Разбитые ящики и двери, открытые сундуки из сохранения (None - новый уровень)
     :param player: Если он передан, просто перемещаем его на новое место, а иначе создаем нового
 
     :return player: Игрок, размещённый в нужном месте
-    :return monster_seed: Враги, размещённые в нужном месте
-    :return boxes_seed: Ящики, размещённые или нет в нужном месте
+    :return destroyed_monsters: Битовая карта убитых монстров (в неё монстры запишут свою смерть)
+    :return destroyed_objects: Битовая карта разбитых ящиков и дверей, открытых сундуков
     """
-    new_monster_seed = []
-    new_boxes_seed = []
-    level_map = [list(i) for i in level_map]
+    if destroyed_monsters is None:
+        destroyed_monsters = DestroyedObjects()
+    if destroyed_objects is None:
+        destroyed_objects = DestroyedObjects()
 
     # Установка общих физических объектов для всех сущностей
     Entity.set_global_groups(barriers_group, all_sprites)
@@ -1357,78 +1539,121 @@ def initialise_level(level_map, level, all_sprites, tiles_group, furniture_group
     Spell.set_global_collisions_group(barriers_group)
     Spell.set_global_breaking_group(doors_group, furniture_group)
 
-    for y in range(len(level_map)):
-        for x in range(len(level_map[y])):
-            if level_map[y][x] in 'PMF.BCrbltT':    # объединим те, в которых надо спавнить пол
+    # Начальная лестница (ИГРОК) на уровне одна
+    index = level_map.codes.index(b'P')
+    x, y = index % level_map.width, index // level_map.width
+    # Помещаем игрока в центр тайла лестницы
+    if not player:
+        player = Player(x * TILE_SIZE + TILE_SIZE * 0.5,
+                        y * TILE_SIZE + TILE_SIZE * 0.5, level, all_sprites)
+        for _ in range(1):
+            player.add_assistant(PlayerAssistant(-10000, -10000, player, all_sprites))
+    else:
+        player.start_position = (x + 0.5) * TILE_SIZE, (y + 0.5) * TILE_SIZE
+        player.rect.center = (x + 0.5) * TILE_SIZE, (y + 0.5) * TILE_SIZE
+
+    # Объекты комнат создаются при приближении игрока (см. RoomsGraph.build_rooms)
+    rooms_graph.set_builder(lambda room: build_room(
+        room, level_map, seed, level, destroyed_monsters, destroyed_objects, all_sprites, tiles_group,
+        furniture_group, barriers_group, enemies_group, doors_group, torches_group, end_of_level))
+
+    # Поле направлений к игроку для монстров (строится от клетки игрока при обновлении)
+    Entity.set_global_flow_field(FlowField(level_map, barriers_group))
+
+    # вернем игрока и битовые карты уничтоженных объектов
+    return player, destroyed_monsters, destroyed_objects
+
+
+def level_monster_types(level_map, rooms_graph, seed, level) -> set:
+    """
+    Функция находит типы монстров уровня (без создания самих монстров).
+    Типы выбираются теми же генераторами и в том же порядке, что и в build_room,
+    поэтому совпадают с монстрами, которые появятся в комнатах
+    :param level_map: Уровень (LevelGrid)
+    :param rooms_graph: Граф комнат уровня
+    :param seed: Сид уровня
+    :param level: Номер уровня
+    :return: Множество типов монстров
+    """
+    monster_types = set()
+    monster_code = ord('M')
+    for room in rooms_graph.rooms:
+        monsters_random = seeded_random(seed, f'monsters {room.rect.x} {room.rect.y}')
+        for y in range(room.rect.top, room.rect.bottom):
+            row = y * level_map.width
+            for index in range(row + room.rect.left, row + room.rect.right):
+                if level_map.codes[index] == monster_code:
+                    monster_types.add(random_monster_type(level, monsters_random))
+    return monster_types
+
+
+def build_room(room, level_map, seed, level, destroyed_monsters, destroyed_objects, all_sprites, tiles_group,
+               furniture_group, barriers_group, enemies_group, doors_group, torches_group, end_of_level) -> list:
+    """
+    Функция проходит по тайлам одной комнаты и создаёт её объекты:
+    тайлы, ящики, сундуки, двери, факела и монстров.
+    Случайные решения берутся из генераторов комнаты (по сиду уровня и положению комнаты),
+    поэтому не зависят от того, в каком порядке создаются комнаты
+    :param room: Комната (Room)
+    :param level_map: Уровень (LevelGrid)
+    :param seed: Сид уровня
+    :param level: Номер уровня
+    :param destroyed_monsters: Убитые монстры уровня (в них монстры запишут свою смерть)
+    :param destroyed_objects: Уничтоженные объекты уровня (в них ящики, сундуки и двери запишут своё разрушение)
+    Остальные параметры - группы, как в initialise_level
+    :return: Созданные тайлы пола и стен (для запекания в статичный слой)
+    """
+    monsters_random = seeded_random(seed, f'monsters {room.rect.x} {room.rect.y}')
+    boxes_random = seeded_random(seed, f'boxes {room.rect.x} {room.rect.y}')
+    tiles = []
+    for y in range(room.rect.top, room.rect.bottom):
+        for x in range(room.rect.left, room.rect.right):
+            # Номер тайла на карте, он же номер объекта в битовых картах уничтоженных
+            index = y * level_map.width + x
+            code = level_map.codes[index]
+            if code == LevelGrid.EMPTY:
+                continue
+            cell = chr(code)
+            if LevelGrid.IS_FLOOR[code]:    # объединим те, в которых надо спавнить пол
                 if true_with_chance(CRACKED_FLOOR_CHANCE):
-                    Tile(choice(['.0', '.1', '.2', '.3']), x, y, all_sprites, tiles_group)
+                    tiles.append(Tile(choice(['.0', '.1', '.2', '.3']), x, y, all_sprites, tiles_group))
                 else:
-                    Tile('.', x, y, all_sprites, tiles_group)
-
-                if level_map[y][x] == 'P':    # ИГРОК
-                    # Помещаем игрока в центр текущего тайла
-                    if not player:
-                        player = Player(x * TILE_SIZE + TILE_SIZE * 0.5,
-                                        y * TILE_SIZE + TILE_SIZE * 0.5, level, all_sprites)
-                        for _ in range(1):
-                            player.add_assistant(PlayerAssistant(-10000, -10000, player, all_sprites))
-                    else:
-                        player.start_position = (x + 0.5) * TILE_SIZE, (y + 0.5) * TILE_SIZE
-                        player.rect.center = (x + 0.5) * TILE_SIZE, (y + 0.5) * TILE_SIZE
-                    Tile(level_map[y][x], x, y, all_sprites, tiles_group)
+                    tiles.append(Tile('.', x, y, all_sprites, tiles_group))
 
-                elif level_map[y][x] == 'M':    # МОНСТР
-                    random_monster(x, y, level, all_sprites, enemies_group, new_monster_seed, monster_seed)
+                if cell == 'P':    # НАЧАЛЬНАЯ ЛЕСТНИЦА
+                    tiles.append(Tile(cell, x, y, all_sprites, tiles_group))
 
-                elif level_map[y][x] == 'B':    # МЕБЕЛЬ (бочки)
-                    if boxes_seed:
-                        n = int(boxes_seed.pop(0))
-                    else:
-                        n = randint(0, 3)
-                    index = len(new_boxes_seed)
-
-                    if n == 1:
-                        Furniture('B1', x, y, new_boxes_seed, index, all_sprites, furniture_group, barriers_group)
-                    elif n == 2:
-                        Furniture('B2', x, y, new_boxes_seed, index, all_sprites, furniture_group, barriers_group)
-                    elif n == 3:
-                        Furniture('B3', x, y, new_boxes_seed, index, all_sprites, furniture_group, barriers_group)
-                    new_boxes_seed.append(str(n))
-
-                elif level_map[y][x] == 'C':    # СУНДУКИ
-                    if boxes_seed:
-                        n = int(boxes_seed.pop(0))
-                    else:
-                        n = [randint(1, 3), 4][true_with_chance(80)]
-                    index = len(new_boxes_seed)
+                elif cell == 'M':    # МОНСТР
+                    n = random_monster_type(level, monsters_random)
+                    if index not in destroyed_monsters:
+                        spawn_monster(n, x, y, level, destroyed_monsters, index, all_sprites, enemies_group)
 
+                elif cell in 'BC':    # МЕБЕЛЬ (бочки) И СУНДУКИ
+                    if cell == 'B':
+                        n = boxes_random.randint(0, 3)
+                    else:
+                        n = [boxes_random.randint(1, 3), 4][true_with_chance(80, boxes_random)]
+                    if index in destroyed_objects:
+                        continue
                     if n == 4:
-                        Chest(x, y, new_boxes_seed, index, all_sprites, barriers_group)
-                    elif n == 1:
-                        Furniture('B1', x, y, new_boxes_seed, index,
-                                  all_sprites, furniture_group, barriers_group)
-                    elif n == 2:
-                        Furniture('B2', x, y, new_boxes_seed, index,
-                                  all_sprites, furniture_group, barriers_group)
-                    elif n == 3:
-                        Furniture('B3', x, y, new_boxes_seed, index,
-                                  all_sprites, furniture_group, barriers_group)
-                    new_boxes_seed.append(str(n))
-
-                elif level_map[y][x] in 'ltT':    # ДВЕРИ И ФАКЕЛА
-                    if level_map[y][x] == 'l':
-                        Door(x - 0.5, y, all_sprites, doors_group)
-                    elif level_map[y][x] == 't':
-                        Door(x, y - 0.5, all_sprites, doors_group)
-                    elif level_map[y][x] == 'T':
-                        Torch(x + 0.12, y, all_sprites, torches_group)
-
-            elif level_map[y][x] in '1234567890-=':
-                Tile(level_map[y][x], x, y, all_sprites, barriers_group)
-            elif level_map[y][x] == 'E':
-                Tile('E', x, y, all_sprites, tiles_group, end_of_level)
-            elif level_map[y][x] != ' ':
-                Tile(level_map[y][x], x, y, all_sprites, tiles_group)
-
-    # вернем игрока и сид монстров
-    return player, new_monster_seed, new_boxes_seed
+                        Chest(x, y, destroyed_objects, index, all_sprites, barriers_group)
+                    elif n in (1, 2, 3):
+                        Furniture(f'B{n}', x, y, destroyed_objects, index, all_sprites,
+                                  furniture_group, barriers_group)
+
+                elif cell == 'l':    # ДВЕРИ И ФАКЕЛА
+                    if index not in destroyed_objects:
+                        Door(x - 0.5, y, destroyed_objects, index, all_sprites, doors_group)
+                elif cell == 't':
+                    if index not in destroyed_objects:
+                        Door(x, y - 0.5, destroyed_objects, index, all_sprites, doors_group)
+                elif cell == 'T':
+                    Torch(x + 0.12, y, all_sprites, torches_group)
+
+            elif LevelGrid.IS_WALL[code]:
+                tiles.append(Tile(cell, x, y, all_sprites, barriers_group))
+            elif cell == 'E':
+                tiles.append(Tile('E', x, y, all_sprites, tiles_group, end_of_level))
+            else:
+                tiles.append(Tile(cell, x, y, all_sprites, tiles_group))
+    return tiles
@@ -3,6 +3,13 @@ import sys
 
 import pygame
 
+# Ресурсы модулей загружаются при первом использовании (см. assets.py),
+# поэтому модули можно импортировать до инициализации pygame и экрана
+import game
+import saves
+from profiler import frame_profiler
+from UI import start_screen
+
 
 if __name__ == '__main__':
     sys.path.append(os.curdir)
@@ -12,11 +19,6 @@ if __name__ == '__main__':
     # Экран (будет использоваться везде далее)
     screen = pygame.display.set_mode(flags=pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF,
                                      vsync=False)
-    # Эти модули нужно импортировать именно тут, т.к. в них происходят действия,
-    # возможные только после инициализации pygame, экрана и mixer'а
-    # (например, загрузка картинок, звуков)
-    import game
-    from UI import start_screen
     '''
     code - это переменная с последним кодом, полученным после выполнения
     какого-либо меню (включая игровой процесс). 
@@ -31,6 +33,8 @@ if __name__ == '__main__':
     2 - запуск игрового процесса с начала (т.е. во время игры без выхода в 
     меню начинается новая игра, этот код напрямую связан с меню паузы, где и находится
     кнопка "начать заного")
+    3 - быстрая загрузка (игровой процесс запускается заново с последнего сохранения,
+    без начального экрана)
     
     Информация о кодах других меню (паузы и конца игры) находятся в их описании 
     возвращаемого значения функции запуска
@@ -38,30 +42,31 @@ if __name__ == '__main__':
     code = -1
     while code != 0:
         # Вызов начального экрана
-        if code != 2:
+        if code not in (2, 3):
             code = start_screen.execute(screen)
         # Дополнительная проверка, т.к. после начального экрана code мог
         # стать кодом для закрытия игры
         if code != 0:
-            # Сид сохранения. Будет загружен с файла сохранения, если он есть
-            seed = None
+            # Данные сохранения. Будут загружены с файла сохранения, если он есть
+            save_data = None
             # Номер уровня с которого начнётся игра
             # (тоже будет загруден с файла сохранения, если он есть)
             level_number = 1
-            # Если файл сохранения сушествует, считываем его
-            if os.path.isfile("data\\save.txt") and code != 2:
-                with open('data\\save.txt', 'r', encoding="utf-8") as file:
-                    seed = file.read()
-                # Дополнительная проверка нужна, т.к. файл может существовать
-                # без данных (например, когда игрок умирает, прогресс стирается)
-                if seed:
-                    # Если данные есть, то из них выделяется номер уровня и
-                    # сид с информацией о игроке, его помошнике/помошниках, уровне и т.д.
-                    data = seed.split('\n')
-                    seed, level_number = '\n'.join(data[:-1]), int(data[-1])
+            if code != 2:
+                # Дожидаемся записи последнего сохранения, т.к. оно пишется в фоне
+                saves.save_writer.wait()
+                # Файла может не быть, или он может быть без данных
+                # (например, когда игрок умирает, прогресс стирается)
+                save_data = saves.load_save()
+                if save_data:
+                    level_number = save_data.level_number
             # Запуск игрового процесса c получением кода его выполнения
             # (описание и назначение см. выше)
-            code = game.play(screen, level_number=level_number, user_seed=seed)
+            code = game.play(screen, level_number=level_number, save_data=save_data)
+    # Дожидаемся записи сохранения (поток записи фоновый и завершится вместе с игрой)
+    saves.save_writer.wait()
+    # Дописывание файла профилировщика (если он записывался)
+    frame_profiler.close()
     # Закрытие pygame и mixer'а
     pygame.quit()
     pygame.mixer.quit()
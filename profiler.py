@@ -0,0 +1,209 @@
+import csv
+import json
+from time import perf_counter
+
+import pygame
+
+from assets import AssetManager
+from config import PROFILER_OVERLAY, PROFILER_TRACE_PATH
+
+
+class FrameProfiler:
+    """
+    Профилировщик кадра по фазам игрового цикла.
+    Игровой цикл отмечает конец каждой фазы вызовом mark, временем фазы считается
+    время от предыдущей отметки (или от начала кадра). Кроме времени можно записать
+    счётчики (количество сущностей, заклинаний, спрайтов и т.п.).
+    Средние значения выводятся поверх игры (оверлей), а все кадры можно записать в файл:
+    .csv - таблица с кадром в каждой строке, .json - трейс для chrome://tracing или Perfetto.
+    Если оверлей выключен и файла нет, то отметки ничего не делают
+    """
+    # Фазы игрового цикла (в порядке отметок в game.py) и счётчики кадра.
+    # Из них состоят колонки .csv, поэтому новые отметки и счётчики нужно добавлять сюда
+    PHASES = ('input', 'player', 'rooms', 'enemies', 'assistants', 'spells', 'doors_torches', 'camera',
+              'draw_static', 'draw_sprites', 'upscale', 'draw_bars', 'draw_damages', 'draw_ui', 'tick', 'flip')
+    COUNTERS = ('n_sprites', 'n_enemies', 'n_assistants', 'n_spells', 'n_all_sprites', 'quality_level')
+    # Как часто обновляется текст оверлея (мс)
+    OVERLAY_UPDATE_TIME = 500
+    OVERLAY_TEXT_COLOR = (240, 240, 240)
+    OVERLAY_BACKGROUND = (0, 0, 0, 160)
+
+    def __init__(self, overlay: bool = False, trace_path: str = None):
+        """
+        :param overlay: Выводить ли оверлей сразу
+        :param trace_path: Путь к файлу для записи кадров (None - не записывать)
+        """
+        self.overlay = overlay
+        self.trace_path = trace_path
+        self.trace_file = None
+        self.csv_writer = None
+        self.first_trace_frame = 0
+        # Номер кадра (сквозной для всех запусков игрового процесса)
+        self.frame_number = 0
+        # Фазы текущего кадра: (фаза, начало, конец) и его счётчики
+        self.phases = []
+        self.counters = {}
+        self.frame_start = self.last_mark = perf_counter()
+        # Суммы и максимумы времени фаз (мс) с последнего обновления оверлея
+        self.totals = {}
+        self.maximums = {}
+        self.totals_frames = 0
+        self.last_overlay_update = 0
+        self.overlay_image = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.overlay or self.trace_path is not None
+
+    def toggle_overlay(self) -> None:
+        """
+        Метод включает или выключает оверлей
+        """
+        self.overlay = not self.overlay
+        self.totals.clear()
+        self.maximums.clear()
+        self.totals_frames = 0
+        self.overlay_image = None
+
+    def begin_frame(self) -> None:
+        """
+        Метод отмечает начало кадра
+        """
+        if not self.enabled:
+            return
+        self.phases = []
+        self.counters = {}
+        self.frame_start = self.last_mark = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """
+        Метод отмечает конец фазы кадра
+        :param phase: Название фазы
+        """
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.phases.append((phase, self.last_mark, now))
+        self.last_mark = now
+
+    def count(self, name: str, value: int) -> None:
+        """
+        Метод записывает счётчик текущего кадра
+        :param name: Название счётчика
+        :param value: Значение
+        """
+        if self.enabled:
+            self.counters[name] = value
+
+    def end_frame(self) -> None:
+        """
+        Метод завершает кадр: учитывает его в оверлее и записывает в файл
+        """
+        if not self.enabled:
+            return
+        self.frame_number += 1
+        if self.trace_path is not None:
+            self.write_frame()
+        if not self.overlay:
+            return
+        for phase, start, end in self.phases:
+            duration = (end - start) * 1000
+            self.totals[phase] = self.totals.get(phase, 0) + duration
+            self.maximums[phase] = max(self.maximums.get(phase, 0), duration)
+        self.totals_frames += 1
+        ticks = pygame.time.get_ticks()
+        if ticks - self.last_overlay_update >= FrameProfiler.OVERLAY_UPDATE_TIME:
+            self.last_overlay_update = ticks
+            self.update_overlay()
+
+    def update_overlay(self) -> None:
+        """
+        Метод перерисовывает текст оверлея: среднее и максимальное время
+        каждой фазы с прошлого обновления и счётчики последнего кадра
+        """
+        if not self.totals_frames:
+            return
+        rows = [('фаза', 'сред', 'макс')]
+        for phase, total in self.totals.items():
+            rows.append((phase, f'{total / self.totals_frames:.2f}', f'{self.maximums[phase]:.2f}'))
+        rows.append(('всего', f'{sum(self.totals.values()) / self.totals_frames:.2f}', ''))
+        for name, value in self.counters.items():
+            rows.append((name, str(value), ''))
+        self.totals.clear()
+        self.maximums.clear()
+        self.totals_frames = 0
+
+        # Текст выводится колонками (шрифт не моноширинный)
+        font = AssetManager.font(18)
+        cells = [[font.render(cell, True, FrameProfiler.OVERLAY_TEXT_COLOR) for cell in row] for row in rows]
+        widths = [max(row[i].get_width() for row in cells) + 10 for i in range(3)]
+        line_height = font.get_linesize()
+        self.overlay_image = pygame.surface.Surface((sum(widths) + 10, line_height * len(rows) + 10),
+                                                    pygame.SRCALPHA)
+        self.overlay_image.fill(FrameProfiler.OVERLAY_BACKGROUND)
+        for i, row in enumerate(cells):
+            x = 5
+            for width, cell in zip(widths, row):
+                self.overlay_image.blit(cell, (x, 5 + i * line_height))
+                x += width
+
+    def draw(self, screen: pygame.surface.Surface, position: tuple) -> None:
+        """
+        Отрисовка оверлея
+        :param screen: Экран
+        :param position: Позиция правого верхнего угла оверлея
+        """
+        if self.overlay and self.overlay_image:
+            rect = self.overlay_image.get_rect(topright=position)
+            screen.blit(self.overlay_image, rect)
+
+    def write_frame(self) -> None:
+        """
+        Метод дописывает кадр в файл (файл открывается при записи первого кадра)
+        """
+        is_trace = self.trace_path.endswith('.json')
+        if self.trace_file is None:
+            self.trace_file = open(self.trace_path, 'w', newline='', encoding='utf-8')
+            self.first_trace_frame = self.frame_number
+            if is_trace:
+                # Формат массива событий (закрывающая скобка дописывается в close,
+                # но трейс читается и без неё, если игра закрылась аварийно)
+                self.trace_file.write('[')
+            else:
+                # Колонки известны заранее: фаза, которой не было в первом кадре, не потеряется,
+                # а незнакомая фаза или счётчик вызовут ошибку, а не пропадут из файла
+                columns = ('frame',) + FrameProfiler.PHASES + FrameProfiler.COUNTERS
+                self.csv_writer = csv.DictWriter(self.trace_file, columns, restval='')
+                self.csv_writer.writeheader()
+        if is_trace:
+            # Время в трейсе в микросекундах: кадр целиком и его фазы вложены друг в друга
+            events = [{'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                       'ts': self.frame_start * 1e6, 'dur': (self.last_mark - self.frame_start) * 1e6,
+                       'args': {'frame': self.frame_number}}]
+            for phase, start, end in self.phases:
+                events.append({'name': phase, 'ph': 'X', 'pid': 0, 'tid': 0,
+                               'ts': start * 1e6, 'dur': (end - start) * 1e6})
+            if self.counters:
+                events.append({'name': 'counters', 'ph': 'C', 'pid': 0, 'tid': 0,
+                               'ts': self.frame_start * 1e6, 'args': self.counters})
+            separator = '\n' if self.frame_number == self.first_trace_frame else ',\n'
+            self.trace_file.write(separator + ',\n'.join(json.dumps(event) for event in events))
+        else:
+            row = {phase: round((end - start) * 1000, 3) for phase, start, end in self.phases}
+            row.update(self.counters)
+            row['frame'] = self.frame_number
+            self.csv_writer.writerow(row)
+
+    def close(self) -> None:
+        """
+        Метод закрывает файл с кадрами (нужно перед выходом из игры)
+        """
+        if self.trace_file is None:
+            return
+        if self.trace_path.endswith('.json'):
+            self.trace_file.write('\n]\n')
+        self.trace_file.close()
+        self.trace_file = None
+
+
+frame_profiler = FrameProfiler(PROFILER_OVERLAY, PROFILER_TRACE_PATH)
@@ -0,0 +1,325 @@
+import os
+import struct
+import sys
+import threading
+from queue import Queue
+
+from engine import DestroyedObjects
+from entities.base_entities import Entity
+from entities.enemies import Demon, GreenSlime, DirtySlime, Zombie, FireWizard, VoidWizard
+from entities.items import GroundItem
+from entities.spells import Spell, FireSpell, IceSpell, PoisonSpell, VoidSpell, FlashSpell
+
+
+# Путь к файлу сохранения
+SAVE_PATH = os.path.join('data', 'save.dat')
+# Сигнатура и версия формата (при изменении формата версия увеличивается,
+# а сохранения другой версии не загружаются)
+SAVE_MAGIC = b'PXSV'
+SAVE_VERSION = 2
+
+# Заголовок: сигнатура, версия, номер уровня, сид уровня
+HEADER = struct.Struct('<4sHHQ')
+# Длина битовой карты уничтоженных объектов (сами байты идут следом)
+BITMAP_SIZE = struct.Struct('<H')
+# Количество записей в списке (комнат, монстров, предметов, заклинаний)
+COUNT = struct.Struct('<H')
+# Номер созданной комнаты уровня
+ROOM = struct.Struct('<H')
+# Игрок: смещение от начала уровня, уровень, здоровье, мана, деньги, количество асистентов
+PLAYER = struct.Struct('<ffHffIB')
+# Асистент: позиция, здоровье, мана, длина имени в байтах (имя в utf-8 идёт следом)
+ASSISTANT = struct.Struct('<ffffB')
+# Монстр: тип, номер тайла на карте (-1 у призванных), уровень, позиция, точка спавна,
+# здоровье, полное здоровье, время эффектов льда и яда
+MONSTER = struct.Struct('<BiHffffffff')
+# Предмет на полу: тип, количество, позиция
+ITEM = struct.Struct('<BIff')
+# Заклинание в полёте: тип, цель (0 - враги, 1 - игрок и асистенты), позиция, точка назначения,
+# множитель урона, номер списка кадров и кадр анимации
+SPELL = struct.Struct('<BBfffffBB')
+
+# Типы объектов в записях (номер в кортеже)
+MONSTER_TYPES = (Demon, GreenSlime, DirtySlime, Zombie, FireWizard, VoidWizard)
+ITEM_TYPES = ('meat', 'money')
+SPELL_TYPES = (FireSpell, IceSpell, PoisonSpell, VoidSpell, FlashSpell)
+
+
+class SaveData:
+    """
+    Данные сохранения, прочитанные из файла (см. pack_save)
+    """
+    def __init__(self, level_number: int, level_seed: int, destroyed_monsters: DestroyedObjects,
+                 destroyed_objects: DestroyedObjects, built_rooms: list, player: tuple,
+                 assistants: list, monsters: list, items: list, spells: list):
+        self.level_number = level_number
+        self.level_seed = level_seed
+        self.destroyed_monsters = destroyed_monsters
+        self.destroyed_objects = destroyed_objects
+        # Номера созданных комнат уровня
+        self.built_rooms = built_rooms
+        # (dx, dy, уровень, здоровье, мана, деньги)
+        self.player = player
+        # Список из (x, y, здоровье, мана, имя)
+        self.assistants = assistants
+        # Списки записей (см. MONSTER, ITEM, SPELL)
+        self.monsters = monsters
+        self.items = items
+        self.spells = spells
+
+
+def pack_save(level_number: int, level_seed: int, rooms_graph, destroyed_monsters: DestroyedObjects,
+              destroyed_objects: DestroyedObjects, player, enemies_group) -> bytes:
+    """
+    Функция упаковывает полное состояние игры в бинарный формат сохранения:
+    кроме сида и уничтоженных объектов записываются созданные комнаты,
+    живые монстры, предметы на полу и летящие заклинания
+    :param level_number: Номер уровня
+    :param level_seed: Сид уровня
+    :param rooms_graph: Граф комнат уровня
+    :param destroyed_monsters: Битовая карта убитых монстров
+    :param destroyed_objects: Битовая карта уничтоженных ящиков и дверей, открытых сундуков
+    :param player: Игрок (вместе с ним сохраняются его асистенты)
+    :param enemies_group: Группа врагов
+    :return: Байты сохранения
+    """
+    parts = [HEADER.pack(SAVE_MAGIC, SAVE_VERSION, level_number, level_seed)]
+    for bitmap in (destroyed_monsters, destroyed_objects):
+        parts.append(BITMAP_SIZE.pack(len(bitmap.bits)))
+        parts.append(bytes(bitmap.bits))
+
+    built_rooms = [i for i, room in enumerate(rooms_graph.rooms) if room.built]
+    parts.append(COUNT.pack(len(built_rooms)))
+    parts += [ROOM.pack(i) for i in built_rooms]
+
+    dx = player.rect.centerx - player.start_position[0]
+    dy = player.rect.centery - player.start_position[1]
+    parts.append(PLAYER.pack(dx, dy, player.level, player.health, player.mana,
+                             player.money, len(player.assistants)))
+    for assistant in player.assistants:
+        name = assistant.name.encode('utf-8')[:255]
+        parts.append(ASSISTANT.pack(*assistant.rect.center, assistant.health, assistant.mana, len(name)))
+        parts.append(name)
+
+    # Умирающие монстры уже отмечены в битовой карте
+    monsters = [monster for monster in enemies_group if monster.alive and type(monster) in MONSTER_TYPES]
+    parts.append(COUNT.pack(len(monsters)))
+    for monster in monsters:
+        index = monster.index_on_level if monster.destroyed_objects is not None else -1
+        parts.append(MONSTER.pack(MONSTER_TYPES.index(type(monster)), index, monster.level,
+                                  *monster.rect.center, *monster.start_position, monster.health,
+                                  monster.full_health, monster.ice_buff, monster.poison_buff))
+
+    parts.append(COUNT.pack(len(GroundItem.sprites_group)))
+    for item in GroundItem.sprites_group:
+        parts.append(ITEM.pack(ITEM_TYPES.index(item.type), item.count, *item.rect.center))
+
+    # Телепорт и заклинания асистента на себя не сохраняются (они мгновенные)
+    spells = []
+    for spell in Entity.spells_group:
+        if type(spell) not in SPELL_TYPES:
+            continue
+        if spell.object_group is enemies_group:
+            target = 0
+        elif player in spell.object_group:
+            target = 1
+        else:
+            continue
+        spells.append(SPELL.pack(SPELL_TYPES.index(type(spell)), target, *spell.rect.center, *spell.point,
+                                 spell.damage / spell.__class__.damage, spell.cur_list, spell.cur_frame))
+    parts.append(COUNT.pack(len(spells)))
+    parts += spells
+    return b''.join(parts)
+
+
+def unpack_records(record: struct.Struct, data: bytes, offset: int) -> (list, int):
+    """
+    Функция распаковывает список записей, перед которым записано их количество
+    :param record: Формат записи
+    :param data: Байты сохранения
+    :param offset: Смещение начала списка
+    :return: Список записей и смещение после него
+    """
+    count, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    records = [record.unpack_from(data, offset + i * record.size) for i in range(count)]
+    return records, offset + count * record.size
+
+
+def unpack_save(data: bytes):
+    """
+    Функция распаковывает байты сохранения (см. pack_save)
+    :param data: Байты сохранения
+    :return: SaveData или None, если сохранения нет, оно повреждено или другой версии
+    """
+    if len(data) < HEADER.size:
+        return None
+    magic, version, level_number, level_seed = HEADER.unpack_from(data)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        return None
+
+    try:
+        offset = HEADER.size
+        bitmaps = []
+        for _ in range(2):
+            size, = BITMAP_SIZE.unpack_from(data, offset)
+            offset += BITMAP_SIZE.size
+            bitmaps.append(DestroyedObjects(data[offset:offset + size]))
+            offset += size
+
+        built_rooms, offset = unpack_records(ROOM, data, offset)
+
+        *player, assistants_count = PLAYER.unpack_from(data, offset)
+        offset += PLAYER.size
+        assistants = []
+        for _ in range(assistants_count):
+            *assistant, name_size = ASSISTANT.unpack_from(data, offset)
+            offset += ASSISTANT.size
+            name = data[offset:offset + name_size].decode('utf-8')
+            offset += name_size
+            assistants.append((*assistant, name))
+
+        monsters, offset = unpack_records(MONSTER, data, offset)
+        items, offset = unpack_records(ITEM, data, offset)
+        spells, offset = unpack_records(SPELL, data, offset)
+    except (struct.error, UnicodeDecodeError):
+        return None
+    return SaveData(level_number, level_seed, *bitmaps, [i for i, in built_rooms], tuple(player),
+                    assistants, monsters, items, spells)
+
+
+def restore_world(save_data: SaveData, rooms_graph, player, enemies_group, all_sprites) -> list:
+    """
+    Функция восстанавливает состояние уровня из сохранения: создаёт комнаты,
+    которые были созданы, переносит в них состояние монстров, а также
+    создаёт призванных монстров, предметы на полу и летящие заклинания.
+    Уровень и игрок к этому моменту уже должны быть созданы (см. initialise_level)
+    :param save_data: Данные сохранения
+    :param rooms_graph: Граф комнат уровня
+    :param player: Игрок
+    :param enemies_group: Группа врагов
+    :param all_sprites: Группа со всеми спрайтами
+    :return: Созданные тайлы (для запекания в статичный слой)
+    """
+    tiles = rooms_graph.build([rooms_graph.rooms[i] for i in save_data.built_rooms])
+
+    # Монстры созданных комнат появились на своих местах, а записи только обновляют их состояние
+    spawned = {monster.index_on_level: monster for monster in enemies_group}
+    for n, index, level, x, y, start_x, start_y, health, full_health, ice_buff, poison_buff in save_data.monsters:
+        monster = spawned.get(index)
+        if monster is None:
+            # Призванный монстр (у него нет места на карте)
+            monster = MONSTER_TYPES[n](x, y, level, None, all_sprites, enemies_group)
+        monster.rect.center = x, y
+        monster.collider.update(x, y)
+        monster.start_position = start_x, start_y
+        monster.health, monster.full_health = health, full_health
+        monster.ice_buff, monster.poison_buff = ice_buff, poison_buff
+
+    for n, count, x, y in save_data.items:
+        GroundItem(ITEM_TYPES[n], count, x, y, all_sprites)
+
+    for n, target, x, y, point_x, point_y, extra_damage, cur_list, cur_frame in save_data.spells:
+        if target == 0:
+            object_group = enemies_group
+        else:
+            object_group = list(enemies_group) + [player] + list(player.assistants)
+        spell = SPELL_TYPES[n](x, y, point_x, point_y, extra_damage, object_group,
+                               Entity.spells_group, all_sprites)
+        # Заклинание создаётся в начале полёта, поэтому его состояние выставляется вручную
+        spell.point = point_x, point_y
+        spell.cur_list, spell.cur_frame = cur_list, cur_frame
+        if cur_list:
+            spell.image = spell.__class__.frames[cur_list][cur_frame]
+        else:
+            spell.image = spell.frames[0][cur_frame]
+        spell.rect = spell.image.get_rect(center=(x, y))
+        spell.collider.update(x, y)
+    return tiles
+
+
+def load_save():
+    """
+    Функция читает файл сохранения
+    :return: SaveData или None, если сохранения нет
+    """
+    if not os.path.isfile(SAVE_PATH):
+        return None
+    with open(SAVE_PATH, 'rb') as file:
+        return unpack_save(file.read())
+
+
+class SaveWriter:
+    """
+    Класс записывает сохранения в фоновом потоке, чтобы игра не ждала диск.
+    Запись идёт во временный файл, который затем заменяет файл сохранения,
+    поэтому при падении во время записи старое сохранение остаётся целым.
+    Если сохранения приходят быстрее, чем пишутся, записывается только последнее
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.queue = Queue()
+        self.thread = None
+        # Последняя ошибка записи (None, если последнее сохранение записалось)
+        self.error = None
+
+    def write(self, data: bytes) -> None:
+        """
+        Метод ставит сохранение в очередь на запись
+        :param data: Байты сохранения (пустые байты стирают прогресс)
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.queue.put(data)
+
+    def wait(self) -> None:
+        """
+        Метод ждёт, пока все сохранения из очереди будут записаны
+        (нужно перед выходом из игры, т.к. поток фоновый)
+        """
+        if self.thread is not None:
+            self.queue.join()
+
+    def run(self) -> None:
+        while True:
+            data = self.queue.get()
+            # Пропускаем устаревшие сохранения, если в очереди есть более новые
+            skipped = 0
+            while not self.queue.empty():
+                data = self.queue.get()
+                skipped += 1
+            # Ошибка диска (нет места, нет прав и т.п.) не должна останавливать поток,
+            # иначе следующие сохранения не запишутся, а wait будет ждать вечно
+            try:
+                self.write_file(data)
+                self.error = None
+            except OSError as error:
+                self.error = error
+                print(f'Не удалось записать сохранение {self.path}: {error}', file=sys.stderr)
+            finally:
+                for _ in range(skipped + 1):
+                    self.queue.task_done()
+
+    def write_file(self, data: bytes) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+
+# Общий писатель сохранений для всей игры
+save_writer = SaveWriter(SAVE_PATH)
+
+
+def save(data: bytes) -> None:
+    """
+    Функция записывает сохранение в фоне (см. SaveWriter)
+    :param data: Байты сохранения (см. pack_save)
+    """
+    save_writer.write(data)
@@ -0,0 +1,64 @@
+import os
+import sys
+from random import seed
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pygame
+
+from config import CONTROLS, TILE_SIZE
+
+
+def test_exit_to_menu_keeps_monsters_and_items(monkeypatch):
+    """
+    Выход в меню из паузы должен сохранять монстров и предметы на полу
+    (сохранение пишется до очистки групп со спрайтами)
+    """
+    # Пути к ресурсам относительные, а путь к шрифту записан через '\\'
+    monkeypatch.chdir(ROOT)
+    font = pygame.font.Font
+    monkeypatch.setattr(pygame.font, 'Font', lambda path, size: font(path.replace('\\', '/'), size))
+    pygame.init()
+    pygame.mixer.init(44100, -16, 12, 64)
+    screen = pygame.display.set_mode((1280, 720))
+    seed(1)
+
+    import game
+    from entities.base_entities import Entity
+    from entities.enemies import Monster
+    from entities.items import GroundItem
+    from saves import unpack_save
+
+    saves = []
+    monkeypatch.setattr(game, 'save', saves.append)
+    # Через несколько кадров нажимается пауза
+    frames = []
+    get_events = pygame.event.get
+
+    def get_events_with_pause(*args, **kwargs):
+        frames.append(None)
+        events = get_events(*args, **kwargs)
+        if len(frames) == 10:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=CONTROLS['KEYBOARD_PAUSE']))
+        return events
+    monkeypatch.setattr(pygame.event, 'get', get_events_with_pause)
+    # В меню паузы на полу лежит предмет, а затем выбирается выход в меню
+    expected = {}
+
+    def exit_to_menu(_):
+        player = Entity.player
+        GroundItem('money', 10, player.rect.centerx + TILE_SIZE * 10, player.rect.centery, Entity.all_sprites)
+        expected['monsters'] = sum(1 for sprite in Entity.entities_group
+                                   if isinstance(sprite, Monster) and sprite.alive)
+        expected['items'] = len(GroundItem.sprites_group)
+        return -1
+    monkeypatch.setattr(game.game_menu, 'execute', exit_to_menu)
+
+    assert game.play(screen) == -1
+    data = unpack_save(saves[-1])
+    assert expected['monsters'] > 0
+    assert len(data.monsters) == expected['monsters']
+    assert len(data.items) == expected['items'] == 1